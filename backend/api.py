@@ -4,12 +4,16 @@ from typing import List, Optional, Dict
 import uuid
 import threading
 from datetime import datetime, timedelta
-from backend.sheets import (
+from backend.storage import (
     get_kindergartens,
+    get_kindergarten,
+    get_kindergarten_by_login,
     get_kindergarten_master,
     get_classes_for_kindergarten,
     get_class_master,
     get_orders_for_month,
+    get_order_totals,
+    get_orders_with_totals,
     batch_save_orders,
     update_class_counts,
     update_kindergarten_master,
@@ -19,7 +23,7 @@ from backend.sheets import (
     backup_orders_for_class_change,
     restore_orders_from_class_change,
     delete_orders_backup,
-    get_system_settings,
+    get_settings,
     update_system_settings
 )
 from fastapi import File, UploadFile
@@ -28,6 +32,7 @@ import shutil
 import os
 from backend.menu_parser import parse_menu_excel
 from backend.menu_generator import save_menu_master, generate_kondate_excel
+from backend.sheets_gate import SheetsUnavailableError, sheets_priority, PRIORITY_NOTIFICATION
 
 
 router = APIRouter()
@@ -118,11 +123,7 @@ def login(creds: LoginRequest):
         input_login_id = str(creds.login_id).strip()
         input_password = str(creds.password).strip()
         
-        user = None
-        for u in kindergartens:
-            if u.login_id == input_login_id:
-                user = u
-                break
+        user = get_kindergarten_by_login(input_login_id)
         
         if not user:
             print(f"[DEBUG] User {input_login_id} not found")
@@ -154,8 +155,8 @@ def login(creds: LoginRequest):
             
         print(f"[DEBUG] Password mismatch for {input_login_id}")
         raise HTTPException(status_code=401, detail="Invalid credentials (Password mismatch)")
-    except HTTPException as he:
-        raise he
+    except (HTTPException, SheetsUnavailableError):
+        raise
     except Exception as e:
         import traceback
         print(f"[ERROR] Login Exception: {e}")
@@ -167,8 +168,7 @@ def get_masters(kindergarten_id: str, date: Optional[str] = None):
     my_classes = get_classes_for_kindergarten(kindergarten_id, date)
     print(f"[DEBUG] Found {len(my_classes)} classes for {kindergarten_id} on {date}")
     # Also return fresh services so client always has the latest meal type options
-    kindergartens = get_kindergartens()
-    kg = next((k for k in kindergartens if k.kindergarten_id == kindergarten_id), None)
+    kg = get_kindergarten(kindergarten_id)
     return {
         "classes": [c.model_dump() for c in my_classes],
         "services": kg.services if kg else [],
@@ -259,8 +259,8 @@ def update_kindergarten_classes(kindergarten_id: str, request: ClassListUpdateRe
         def _notify_classes():
             try:
                 from backend.notifications import send_change_notification
-                kindergartens = get_kindergartens()
-                kg = next((k for k in kindergartens if k.kindergarten_id == kindergarten_id), None)
+                with sheets_priority(PRIORITY_NOTIFICATION):
+                    kg = get_kindergarten(kindergarten_id)
                 lines = [
                     f"{c.class_name}: 園児 {c.default_student_count}名 / "
                     f"アレルギー {c.default_allergy_count}名 / "
@@ -286,6 +286,8 @@ def update_kindergarten_classes(kindergarten_id: str, request: ClassListUpdateRe
         threading.Thread(target=_notify_classes, daemon=True).start()
 
         return {"status": "success", "message": "Classes updated", "scheduled_date": scheduled_date}
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         print(f"[CRITICAL ERROR] {str(e)}")
         import traceback
@@ -342,8 +344,8 @@ def create_order(order: OrderItem):
     def _notify():
         try:
             from backend.notifications import queue_order_notification
-            kindergartens = get_kindergartens()
-            kg = next((k for k in kindergartens if k.kindergarten_id == order_snapshot["kindergarten_id"]), None)
+            with sheets_priority(PRIORITY_NOTIFICATION):
+                kg = get_kindergarten(order_snapshot["kindergarten_id"])
 
             def _fmt_change(label: str, prev, curr: int) -> str:
                 if prev is not None and prev != curr:
@@ -400,8 +402,8 @@ def create_orders_bulk(orders: List[OrderItem]):
         def _notify_bulk():
             try:
                 from backend.notifications import send_change_notification
-                kindergartens = get_kindergartens()
-                kg = next((k for k in kindergartens if k.kindergarten_id == first["kindergarten_id"]), None)
+                with sheets_priority(PRIORITY_NOTIFICATION):
+                    kg = get_kindergarten(first["kindergarten_id"])
                 send_change_notification(
                     action=f"{date_obj.year}年{date_obj.month}月分 月次申請",
                     kindergarten_name=kg.name if kg else first["kindergarten_id"],
@@ -496,8 +498,8 @@ def update_order_defaults(request: ClasslessDefaultUpdateRequest):
         def _notify_defaults():
             try:
                 from backend.notifications import send_change_notification
-                kindergartens = get_kindergartens()
-                kg = next((k for k in kindergartens if k.kindergarten_id == kid_id), None)
+                with sheets_priority(PRIORITY_NOTIFICATION):
+                    kg = get_kindergarten(kid_id)
                 period = (f"{snap['from_date']}〜{snap['to_date']}" if snap['to_date']
                           else f"{snap['from_date']} 以降（ずっと）")
                 details = (
@@ -522,6 +524,8 @@ def update_order_defaults(request: ClasslessDefaultUpdateRequest):
         threading.Thread(target=_notify_defaults, daemon=True).start()
 
         return {"status": "success", "updated": len(to_update)}
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -658,14 +662,7 @@ def generate_menu_file(req: MenuGenerationRequest):
     Generates the specific Kondate for a Kindergarten.
     """
     try:
-        masters = get_kindergarten_master()
-        kindergarten = None
-        if masters:
-            for k in masters:
-                if k.kindergarten_id == req.kindergarten_id:
-                     kindergarten = k
-                     break
-        
+        kindergarten = get_kindergarten(req.kindergarten_id)
         if not kindergarten:
             raise HTTPException(status_code=404, detail="Kindergarten not found")
 
@@ -696,6 +693,8 @@ def generate_menu_file(req: MenuGenerationRequest):
             media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
 
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         print(f"Error generating menu: {e}")
         import traceback
@@ -713,7 +712,7 @@ def list_kindergartens():
 @router.post("/admin/kindergartens/{kindergarten_id}/update")
 def update_kindergarten(kindergarten_id: str, data: dict):
     """Update general kindergarten master data."""
-    from backend.sheets import update_kindergarten_master
+    from backend.storage import update_kindergarten_master
     data['kindergarten_id'] = kindergarten_id
     success = update_kindergarten_master(data)
     if not success:
@@ -758,15 +757,30 @@ def delete_pending_change(kindergarten_id: str, date: str):
 def get_admin_orders(year: int, month: int):
     """Get orders + classes for all kindergartens for a given month (admin view)."""
     kindergartens = get_kindergarten_master()
+    try:
+        orders, totals = get_orders_with_totals(["kindergarten_id"], year, month)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    orders_by_kid: Dict[str, list] = {}
+    for o in orders:
+        orders_by_kid.setdefault(o.kindergarten_id, []).append(o)
+    totals_by_kid = {t["kindergarten_id"]: t for t in totals}
     result = []
     for k in kindergartens:
-        orders = get_orders_for_month(k.kindergarten_id, year, month)
+        orders = orders_by_kid.get(k.kindergarten_id, [])
         classes = get_classes_for_kindergarten(k.kindergarten_id)
+        totals = totals_by_kid.get(k.kindergarten_id, {})
         result.append({
             "kindergarten_id": k.kindergarten_id,
             "name": k.name,
             "classes": [c.model_dump() for c in classes],
             "orders": [o.model_dump() for o in orders],
+            "totals": {
+                "student": totals.get("student_count", 0),
+                "allergy": totals.get("allergy_count", 0),
+                "teacher": totals.get("teacher_count", 0),
+                "grand_total": totals.get("total", 0),
+            },
             "classless_student_count": k.classless_student_count,
             "classless_allergy_count": k.classless_allergy_count,
             "classless_teacher_count": k.classless_teacher_count,
@@ -777,23 +791,26 @@ def get_admin_orders(year: int, month: int):
 def get_daily_orders(date: str):
     """Get all kindergartens' orders for a specific date (YYYY-MM-DD)."""
     try:
-        year, month, _ = date.split("-")
-        year, month = int(year), int(month)
+        orders, totals = get_orders_with_totals(["kindergarten_id"], date=date)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD.")
 
     all_k = get_kindergarten_master()
+    orders_by_kid: Dict[str, list] = {}
+    for o in orders:
+        orders_by_kid.setdefault(o.kindergarten_id, []).append(o)
+    totals_by_kid = {t["kindergarten_id"]: t for t in totals}
     result = []
     grand_total = 0
 
     for k in all_k:
-        month_orders = get_orders_for_month(k.kindergarten_id, year, month)
-        day_orders = [o for o in month_orders if o.date == date]
+        day_orders = orders_by_kid.get(k.kindergarten_id, [])
+        totals = totals_by_kid.get(k.kindergarten_id, {})
 
-        total_student = sum(o.student_count for o in day_orders)
-        total_allergy = sum(o.allergy_count for o in day_orders)
-        total_teacher = sum(o.teacher_count for o in day_orders)
-        grand = total_student + total_allergy + total_teacher
+        total_student = totals.get("student_count", 0)
+        total_allergy = totals.get("allergy_count", 0)
+        total_teacher = totals.get("teacher_count", 0)
+        grand = totals.get("total", 0)
 
         grand_total += grand
         result.append({
@@ -823,11 +840,23 @@ def get_daily_orders(date: str):
 
     return {"date": date, "kindergartens": result, "grand_total": grand_total}
 
+@router.get("/admin/order-totals")
+def get_admin_order_totals(by: str = "kindergarten_id", year: Optional[int] = None,
+                           month: Optional[int] = None, date: Optional[str] = None):
+    """Order counts summed per group, e.g. ?by=area,meal_type&year=2026&month=4 for
+    month totals or ?by=month,kindergarten_id for a billing rollup over all orders.
+    Dimensions: date, month, kindergarten_id, area, meal_type, class_name."""
+    dims = [d.strip() for d in by.split(",") if d.strip()]
+    try:
+        totals = get_order_totals(dims, year, month, date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"by": dims, "totals": totals}
+
 @router.get("/admin/kindergartens/{kindergarten_id}/print/{year}/{month}")
 def get_kindergarten_print_data(kindergarten_id: str, year: int, month: int):
     """Get orders + classes + basic counts for a single kindergarten (for single-kinder print view)."""
-    all_k = get_kindergarten_master()
-    k = next((kg for kg in all_k if kg.kindergarten_id == kindergarten_id), None)
+    k = get_kindergarten(kindergarten_id)
     if not k:
         raise HTTPException(status_code=404, detail="Kindergarten not found")
     orders = get_orders_for_month(kindergarten_id, year, month)
@@ -864,7 +893,7 @@ def get_system_info():
         print(f"Error getting system info: {e}")
         
     # Merge with Admin settings
-    settings = get_system_settings() or {}
+    settings = get_settings()
 
     from backend.notifications import (
         DEFAULT_ADMIN_TEMPLATE_SUBJECT, DEFAULT_ADMIN_TEMPLATE_BODY,
@@ -874,26 +903,38 @@ def get_system_info():
     return {
         "service_account_email": email,
         "drive_folder_config": folder_status,
-        "admin_emails": settings.get("admin_emails", ""),
-        "reminder_days": settings.get("reminder_days", "5,3"),
-        "email_template_admin_subject": settings.get("email_template_admin_subject", DEFAULT_ADMIN_TEMPLATE_SUBJECT),
-        "email_template_admin_body": settings.get("email_template_admin_body", DEFAULT_ADMIN_TEMPLATE_BODY),
-        "email_template_customer_subject": settings.get("email_template_customer_subject", DEFAULT_CUSTOMER_TEMPLATE_SUBJECT),
-        "email_template_customer_body": settings.get("email_template_customer_body", DEFAULT_CUSTOMER_TEMPLATE_BODY),
-        "monthly_common_item": settings.get("monthly_common_item", ""),
-        "monthly_common_year_month": settings.get("monthly_common_year_month", ""),
+        "admin_emails": ",".join(settings.admin_emails),
+        "reminder_days": ",".join(str(d) for d in settings.reminder_days),
+        "email_template_admin_subject": settings.email_template_admin_subject or DEFAULT_ADMIN_TEMPLATE_SUBJECT,
+        "email_template_admin_body": settings.email_template_admin_body or DEFAULT_ADMIN_TEMPLATE_BODY,
+        "email_template_customer_subject": settings.email_template_customer_subject or DEFAULT_CUSTOMER_TEMPLATE_SUBJECT,
+        "email_template_customer_body": settings.email_template_customer_body or DEFAULT_CUSTOMER_TEMPLATE_BODY,
+        "monthly_common_item": settings.monthly_common_item,
+        "monthly_common_year_month": settings.monthly_common_year_month,
     }
 
+@router.get("/admin/cache-stats")
+def get_cache_stats():
+    """Entries and hit/miss/eviction counters of the in-memory caches, per key family."""
+    from backend.cache import all_stats
+    return {"caches": all_stats()}
+
+@router.get("/admin/connection-stats")
+def get_connection_stats():
+    """Sheets connection setup / token refresh counts and latencies."""
+    from backend.sheets import connection_stats
+    return {"sheets": connection_stats()}
+
 @router.get("/admin/monthly-common")
 def get_monthly_common():
     """Get all monthly common items as a list."""
-    from backend.sheets import get_monthly_common_items
+    from backend.storage import get_monthly_common_items
     return {"items": get_monthly_common_items()}
 
 @router.post("/admin/monthly-common")
 def update_monthly_common(data: Dict):
     """Upsert monthly common item for a specific year_month."""
-    from backend.sheets import update_monthly_common_item
+    from backend.storage import update_monthly_common_item
     item = data.get("item", "")
     year_month = data.get("year_month", "")
     success = update_monthly_common_item(item, year_month)
@@ -904,7 +945,7 @@ def update_monthly_common(data: Dict):
 @router.delete("/admin/monthly-common/{year_month}")
 def delete_monthly_common(year_month: str):
     """Delete monthly common item for a specific year_month."""
-    from backend.sheets import delete_monthly_common_item
+    from backend.storage import delete_monthly_common_item
     success = delete_monthly_common_item(year_month)
     if not success:
         raise HTTPException(status_code=500, detail="Failed to delete monthly common item")
@@ -948,5 +989,7 @@ def run_reminders_check():
         from backend.notifications import check_and_send_reminders
         check_and_send_reminders()
         return {"status": "success", "message": "Check completed. See notifications.log for results."}
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,158 @@
+"""Bounded in-memory cache with LRU eviction, tag invalidation and hit/miss stats.
+
+Entries carry tags; invalidate(tag) drops exactly the entries holding that tag
+through a tag -> keys index (no scan of every key), and bumps a per-tag version
+so work started before the invalidation can tell its result is outdated.
+Counters are kept per namespace (a key's family, e.g. one per sheet) and every
+cache created here is listed by all_stats() for the admin endpoint.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+
+_registry: Dict[str, "Cache"] = {}
+
+_COUNTERS = ("hits", "stale_hits", "misses", "evictions", "invalidations", "renewals")
+
+
+class Entry:
+    __slots__ = ("data", "stored", "tags", "generation", "loader", "max_age", "source")
+
+    def __init__(self, data, tags: frozenset, generation: int, loader, max_age: float, source):
+        self.data = data
+        self.stored = time.time()
+        self.tags = tags
+        self.generation = generation  # unique per store, increasing
+        self.loader = loader  # how to reload it; opaque to the cache
+        self.max_age = max_age
+        self.source = source  # version of the source the data was read from, if known
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.stored
+
+
+class Cache:
+    def __init__(self, name: str, max_entries: int, max_age: float,
+                 namespace: Callable[[str], str] = lambda key: key):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_age = max_age  # default age past which lookup() drops an entry
+        self.namespace = namespace
+        self.lock = threading.RLock()
+        self._entries: "OrderedDict[str, Entry]" = OrderedDict()
+        self._tagged: Dict[str, set] = {}  # tag -> keys
+        self._versions: Dict[str, int] = {}  # tag -> times invalidated
+        self._epoch = 0  # times cleared
+        self._generation = 0
+        self._stats: Dict[str, Dict[str, int]] = {}
+        _registry[name] = self
+
+    def _count(self, key: str, counter: str, n: int = 1):
+        ns = self._stats.setdefault(self.namespace(key), dict.fromkeys(_COUNTERS, 0))
+        ns[counter] += n
+
+    def lookup(self, key: str) -> Optional[Entry]:
+        """The entry for key (now most recently used), or None if missing or past max_age.
+        Counts a hit or a miss; see also count_stale()."""
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.age >= entry.max_age:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self._count(key, "misses")
+                return None
+            self._entries.move_to_end(key)
+            self._count(key, "hits")
+            return entry
+
+    def count_stale(self, key: str):
+        """Reclassify the last hit on key as served-while-stale."""
+        with self.lock:
+            self._count(key, "hits", -1)
+            self._count(key, "stale_hits")
+
+    def peek(self, key: str) -> Optional[Entry]:
+        """The entry for key without touching LRU order or counters."""
+        with self.lock:
+            return self._entries.get(key)
+
+    def store(self, key: str, data, tags: Iterable[str] = (), loader=None,
+              max_age: Optional[float] = None, source=None) -> Entry:
+        with self.lock:
+            if key in self._entries:
+                self._remove(key)
+            self._generation += 1
+            entry = Entry(data, frozenset(tags) | {key}, self._generation, loader,
+                          self.max_age if max_age is None else max_age, source)
+            self._entries[key] = entry
+            for tag in entry.tags:
+                self._tagged.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._count(oldest, "evictions")
+            return entry
+
+    def renew(self, key: str, entry: Entry) -> bool:
+        """Restart the age of an entry known to be still current (if it was not replaced meanwhile)."""
+        with self.lock:
+            if self._entries.get(key) is not entry:
+                return False
+            entry.stored = time.time()
+            self._count(key, "renewals")
+            return True
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        for tag in entry.tags:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+    def invalidate(self, *tags: str) -> int:
+        """Drop every entry holding any of the tags. Returns how many were dropped."""
+        with self.lock:
+            keys = set()
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+                keys |= self._tagged.get(tag, set())
+            for key in keys:
+                self._remove(key)
+                self._count(key, "invalidations")
+            return len(keys)
+
+    def clear(self):
+        with self.lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._tagged.clear()
+
+    def version(self, tags: Iterable[str]) -> tuple:
+        """Changes whenever any of the tags is invalidated or the cache is cleared."""
+        with self.lock:
+            return (self._epoch,) + tuple(self._versions.get(t, 0) for t in sorted(tags))
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            sizes: Dict[str, int] = {}
+            for key in self._entries:
+                ns = self.namespace(key)
+                sizes[ns] = sizes.get(ns, 0) + 1
+            namespaces = {}
+            for ns in sorted(set(self._stats) | set(sizes)):
+                counters = dict(self._stats.get(ns, dict.fromkeys(_COUNTERS, 0)))
+                lookups = counters["hits"] + counters["stale_hits"] + counters["misses"]
+                counters["entries"] = sizes.get(ns, 0)
+                counters["hit_rate"] = round((counters["hits"] + counters["stale_hits"]) / lookups, 3) if lookups else None
+                namespaces[ns] = counters
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "namespaces": namespaces}
+
+
+def all_stats() -> Dict[str, Dict[str, Any]]:
+    """stats() of every cache, by name."""
+    return {name: cache.stats() for name, cache in sorted(_registry.items())}
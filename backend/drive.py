@@ -39,6 +39,19 @@ def get_drive_service():
         
     return build('drive', 'v3', credentials=creds)
 
+_version_service = None
+
+def get_file_version(file_id: str) -> Optional[str]:
+    """Drive `version` of a file, which increases on every change to it (ours or
+    someone editing by hand). One metadata request; no file content is read."""
+    global _version_service
+    if _version_service is None:
+        _version_service = get_drive_service()
+        if _version_service is None:
+            return None
+    meta = _version_service.files().get(fileId=file_id, fields="version,modifiedTime", supportsAllDrives=True).execute()
+    return str(meta.get("version") or meta.get("modifiedTime") or "") or None
+
 # Additional Env Var for Shared Folder
 DRIVE_FOLDER_ID = os.getenv("DRIVE_FOLDER_ID")
 
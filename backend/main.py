@@ -1,15 +1,32 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from backend.api import router
-from backend.scheduler import create_scheduler
+from backend.scheduler import create_scheduler, refresh_cache
+from backend import storage
+from backend.sheets_gate import SheetsUnavailableError
 import os
+import threading
 
 app = FastAPI(title="Kindergarten Lunch Order API")
 
+@app.exception_handler(SheetsUnavailableError)
+async def sheets_unavailable_handler(request: Request, exc: SheetsUnavailableError):
+    # Quota exhausted / Google errors: tell the client to retry instead of returning empty data
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Google Sheets is busy. Please retry shortly."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 _scheduler = create_scheduler()
 
 @app.on_event("startup")
 async def startup_event():
+    # Sheets: replay queued saves and restore the cache snapshot; the warmup below revalidates it
+    storage.startup()
+    # Warm the cache with one bulk read without holding up startup
+    threading.Thread(target=refresh_cache, daemon=True).start()
     _scheduler.start()
     print("[SCHEDULER] スケジューラーを起動しました（毎朝8:00 月次リマインダー）。")
 
@@ -17,6 +34,8 @@ async def startup_event():
 async def shutdown_event():
     _scheduler.shutdown()
     print("[SCHEDULER] スケジューラーを停止しました。")
+    # Sheets: write out order saves still waiting in the write-behind queue
+    storage.shutdown()
 
 # CORS Setup
 origins = [
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field, field_validator, ConfigDict
+from pydantic import BaseModel, Field, field_validator, model_validator, ConfigDict
 import datetime
+import re
 from typing import Optional, Any, Dict, List
 
 # --- Helper for dynamic column mapping ---
@@ -118,6 +119,64 @@ class OrderData(BaseModel):
         except:
             return 0
 
+# admin_settings key of a month's common item: "monthly_common_2026-04"
+MONTHLY_COMMON_PREFIX = "monthly_common_"
+
+
+class SystemSettings(BaseModel):
+    """Typed view of the admin_settings key/value pairs."""
+    model_config = ConfigDict(extra='ignore')
+
+    admin_emails: List[str] = Field(default_factory=list)
+    reminder_days: List[int] = Field(default_factory=lambda: [5, 3])
+    # Empty: use the built-in template (backend.notifications)
+    email_template_admin_subject: str = ""
+    email_template_admin_body: str = ""
+    email_template_customer_subject: str = ""
+    email_template_customer_body: str = ""
+    # Single-item keys from before items were stored per month
+    monthly_common_item: str = ""
+    monthly_common_year_month: str = ""
+    # "YYYY-MM" -> common item, from the monthly_common_YYYY-MM keys
+    monthly_common: Dict[str, str] = Field(default_factory=dict)
+
+    @model_validator(mode='before')
+    def collect_monthly_common(cls, data):
+        if isinstance(data, dict) and "monthly_common" not in data:
+            data = {**data, "monthly_common": {
+                key[len(MONTHLY_COMMON_PREFIX):]: str(val) for key, val in data.items()
+                if str(key).startswith(MONTHLY_COMMON_PREFIX) and val not in ("", None)
+                and re.match(r"^\d{4}-\d{2}$", str(key)[len(MONTHLY_COMMON_PREFIX):])
+            }}
+        return data
+
+    @field_validator('admin_emails', mode='before')
+    def parse_emails(cls, v):
+        if isinstance(v, str):
+            return [e.strip() for e in v.split(",") if e.strip()]
+        return v
+
+    @field_validator('reminder_days', mode='before')
+    def parse_days(cls, v):
+        if isinstance(v, int):
+            return [v]
+        if isinstance(v, str):
+            try:
+                return [int(d.strip()) for d in v.split(",") if d.strip()]
+            except ValueError:
+                return [5, 3]
+        return v
+
+    @field_validator('email_template_admin_subject', 'email_template_admin_body',
+                     'email_template_customer_subject', 'email_template_customer_body',
+                     'monthly_common_item', 'monthly_common_year_month', mode='before')
+    def parse_template(cls, v):
+        return "" if v is None else str(v)
+
+    def monthly_common_items(self) -> List[Dict]:
+        """[{"year_month", "item"}] of every month, newest first."""
+        return [{"year_month": ym, "item": item} for ym, item in sorted(self.monthly_common.items(), reverse=True)]
+
 
 # --- Menu Generation Models ---
 from typing import List, Dict
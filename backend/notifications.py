@@ -3,7 +3,8 @@ import datetime
 import threading
 import requests
 from typing import List, Optional
-from backend.sheets import get_system_settings, get_kindergartens, get_orders_for_month
+from backend.storage import get_settings, get_kindergartens, read_order_columns
+from backend.sheets_gate import sheets_priority, PRIORITY_NOTIFICATION
 
 # --- Batching: group order notifications within a time window ---
 _order_buffer = {}   # key: (kindergarten_id, date) -> dict
@@ -181,7 +182,8 @@ def send_change_notification(
     1. All admin emails
     2. The kindergarten's contact email (if available)
     """
-    settings = get_system_settings()
+    with sheets_priority(PRIORITY_NOTIFICATION):
+        settings = get_settings()
     timestamp = datetime.datetime.now().strftime("%Y/%m/%d %H:%M")
 
     variables = {
@@ -196,11 +198,10 @@ def send_change_notification(
     }
 
     # --- Admin notification ---
-    admin_emails_str = settings.get("admin_emails", "")
-    admin_emails = [e.strip() for e in admin_emails_str.split(",") if e.strip()]
+    admin_emails = settings.admin_emails
 
-    admin_subject_tmpl = settings.get("email_template_admin_subject", DEFAULT_ADMIN_TEMPLATE_SUBJECT)
-    admin_body_tmpl = settings.get("email_template_admin_body", DEFAULT_ADMIN_TEMPLATE_BODY)
+    admin_subject_tmpl = settings.email_template_admin_subject or DEFAULT_ADMIN_TEMPLATE_SUBJECT
+    admin_body_tmpl = settings.email_template_admin_body or DEFAULT_ADMIN_TEMPLATE_BODY
 
     admin_subject = _format_template(admin_subject_tmpl, variables)
     admin_body = _format_template(admin_body_tmpl, variables)
@@ -213,8 +214,8 @@ def send_change_notification(
 
     # --- Customer (kindergarten) notification ---
     if contact_email:
-        customer_subject_tmpl = settings.get("email_template_customer_subject", DEFAULT_CUSTOMER_TEMPLATE_SUBJECT)
-        customer_body_tmpl = settings.get("email_template_customer_body", DEFAULT_CUSTOMER_TEMPLATE_BODY)
+        customer_subject_tmpl = settings.email_template_customer_subject or DEFAULT_CUSTOMER_TEMPLATE_SUBJECT
+        customer_body_tmpl = settings.email_template_customer_body or DEFAULT_CUSTOMER_TEMPLATE_BODY
 
         customer_subject = _format_template(customer_subject_tmpl, variables)
         customer_body = _format_template(customer_body_tmpl, variables)
@@ -226,9 +227,8 @@ def send_change_notification(
 
 def send_admin_notification(action_type: str, kindergarten_name: str, details: str):
     """Legacy: Sends an immediate notification to all registered admins."""
-    settings = get_system_settings()
-    admin_emails = settings.get("admin_emails", "").split(",")
-    admin_emails = [e.strip() for e in admin_emails if e.strip()]
+    with sheets_priority(PRIORITY_NOTIFICATION):
+        admin_emails = get_settings().admin_emails
 
     if not admin_emails:
         print("[WARNING] No admin emails configured for notifications.")
@@ -251,12 +251,8 @@ def send_admin_notification(action_type: str, kindergarten_name: str, details: s
 
 def check_and_send_reminders():
     """Checks all kindergartens and sends reminders for monthly submissions."""
-    settings = get_system_settings()
-    reminder_days_str = settings.get("reminder_days", "5,3")
-    try:
-        reminder_days = [int(d.strip()) for d in reminder_days_str.split(",") if d.strip()]
-    except:
-        reminder_days = [5, 3]
+    with sheets_priority(PRIORITY_NOTIFICATION):
+        reminder_days = get_settings().reminder_days
 
     now = datetime.datetime.now()
     target_year = now.year
@@ -270,13 +266,15 @@ def check_and_send_reminders():
         print(f"[REMINDER] No reminder scheduled for today ({days_until_deadline} days until deadline).")
         return
 
-    kindergartens = get_kindergartens()
-    for k in kindergartens:
-        next_month = (target_month % 12) + 1
-        next_year = target_year if next_month > target_month else target_year + 1
+    next_month = (target_month % 12) + 1
+    next_year = target_year if next_month > target_month else target_year + 1
 
-        orders = get_orders_for_month(k.kindergarten_id, next_year, next_month)
-        if not orders:
+    with sheets_priority(PRIORITY_NOTIFICATION):
+        kindergartens = get_kindergartens()
+        # Only whether each kindergarten has orders matters: read one column of one month
+        ordered = {str(r["kindergarten_id"]) for r in read_order_columns(["kindergarten_id"], next_year, next_month)}
+    for k in kindergartens:
+        if k.kindergarten_id not in ordered:
             subject = f"【ママミレリマインド】{next_month}月分のご注文が未完了です"
             body = f"""{k.name} {k.contact_name} 様
 
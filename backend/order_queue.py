@@ -0,0 +1,163 @@
+"""Coalescing write-behind queue.
+
+Rows submitted within a short window are merged by key (last write wins) and
+handed to the writer in one call. A submit only returns after the rows are
+appended to an on-disk journal (fsync'd), so queued writes survive a restart;
+recover() replays the journal on startup. Failed flushes stay queued and are
+retried, except rows the writer rejects permanently (is_permanent(error)):
+those are moved to a dead-letter journal next to the queue journal and logged.
+on_written runs after each successful flush, outside the flush lock.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+RETRY_SECONDS = 30
+
+
+class WriteBehindQueue:
+    def __init__(self, writer: Callable[[List[Dict]], None], journal_path: str,
+                 window: float = 2.0, key: str = "order_id",
+                 on_written: Optional[Callable[[List[Dict]], None]] = None,
+                 is_permanent: Callable[[Exception], bool] = lambda e: False):
+        self.writer = writer
+        self.journal_path = journal_path
+        self.window = window
+        self.key = key
+        self.on_written = on_written
+        self.is_permanent = is_permanent
+        self._pending: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def _schedule(self, delay: float):
+        # Caller holds self._lock. The window is not extended by later submits,
+        # so a steady stream of edits still flushes every `window` seconds.
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def submit(self, rows: List[Dict]):
+        """Durably queue rows; raises if the journal cannot be written."""
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.journal_path)), exist_ok=True)
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            for row in rows:
+                self._pending[str(row[self.key])] = row
+            self._schedule(self.window)
+
+    def pending(self) -> List[Dict]:
+        with self._lock:
+            return list(self._pending.values())
+
+    def _rewrite_journal(self):
+        # Caller holds self._lock
+        tmp = self.journal_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for row in self._pending.values():
+                f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.journal_path)
+
+    @property
+    def dead_letter_path(self) -> str:
+        return os.path.splitext(self.journal_path)[0] + ".dead.jsonl"
+
+    def _dead_letter(self, rows: List[Dict], error: Exception):
+        # Caller holds self._flush_lock
+        failed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            for row in rows:
+                entry = {"failed_at": failed_at, "error": str(error), "row": row}
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        keys = ", ".join(str(row[self.key]) for row in rows)
+        print(f"[QUEUE] Rejected rows moved to {self.dead_letter_path}: {keys}: {error}")
+
+    def _write(self, rows: List[Dict], rejected: List[Dict]) -> List[Dict]:
+        """Write rows and return those written; rejected rows are dead-lettered
+        and added to `rejected`. Raises on a retryable failure.
+
+        When the batch is rejected, the rows are written one at a time so a
+        single bad row does not hold back the rest.
+        """
+        try:
+            self.writer(rows)
+            return rows
+        except Exception as e:
+            if not self.is_permanent(e):
+                raise
+            if len(rows) == 1:
+                self._dead_letter(rows, e)
+                rejected.extend(rows)
+                return []
+        return [row for one in rows for row in self._write([one], rejected)]
+
+    def _drop(self, rows: List[Dict]):
+        # Caller holds self._lock
+        for row in rows:
+            k = str(row[self.key])
+            # Keep rows that were overwritten while we were writing
+            if self._pending.get(k) is row:
+                del self._pending[k]
+        self._rewrite_journal()
+
+    def flush(self) -> bool:
+        """Write everything queued so far. Returns False if it has to be retried."""
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                batch = dict(self._pending)
+            if not batch:
+                return True
+            rejected: List[Dict] = []
+            try:
+                written = self._write(list(batch.values()), rejected)
+            except Exception as e:
+                print(f"[QUEUE] Flush of {len(batch)} rows failed, retrying in {RETRY_SECONDS}s: {e}")
+                with self._lock:
+                    if rejected:
+                        self._drop(rejected)
+                    self._schedule(RETRY_SECONDS)
+                return False
+            with self._lock:
+                self._drop(list(batch.values()))
+                if self._pending:
+                    self._schedule(self.window)
+        if written and self.on_written:
+            try:
+                self.on_written(written)
+            except Exception as e:
+                print(f"[QUEUE] on_written hook failed: {e}")
+        return True
+
+    def recover(self) -> int:
+        """Reload rows left in the journal by a previous process and schedule a flush."""
+        if not os.path.exists(self.journal_path):
+            return 0
+        with self._lock:
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue  # torn final line from a crash mid-write
+                    self._pending[str(row[self.key])] = row
+            if self._pending:
+                self._schedule(0)
+            return len(self._pending)
@@ -2,6 +2,9 @@ import datetime
 import jpholiday
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
+# Shorter than the 5 minute data TTL so the cache is refreshed before it expires
+CACHE_REFRESH_MINUTES = 4
+
 
 def get_monthly_reminder_date(year: int, month: int) -> datetime.date:
     """25日、または土日・祝日の場合は次の平日を返す。"""
@@ -13,8 +16,9 @@ def get_monthly_reminder_date(year: int, month: int) -> datetime.date:
 
 def run_monthly_reminder():
     """当日がリマインダー送信日であれば、未入力の園にメールを送信する。"""
-    from backend.sheets import get_kindergartens, get_orders_for_month
+    from backend.storage import get_kindergartens, read_order_columns
     from backend.notifications import _send_email
+    from backend.sheets_gate import sheets_priority, PRIORITY_NOTIFICATION
 
     now = datetime.datetime.now()
     today = now.date()
@@ -26,12 +30,14 @@ def run_monthly_reminder():
 
     print(f"[SCHEDULER] {now.year}年{now.month}月分のリマインダーメールを送信します...")
 
-    kindergartens = get_kindergartens()
+    with sheets_priority(PRIORITY_NOTIFICATION):
+        kindergartens = get_kindergartens()
+        # 注文の有無だけ分かればよいので園IDの列だけを当月分読む
+        ordered = {str(r["kindergarten_id"]) for r in read_order_columns(["kindergarten_id"], now.year, now.month)}
     sent_count = 0
 
     for k in kindergartens:
-        orders = get_orders_for_month(k.kindergarten_id, now.year, now.month)
-        if not orders:
+        if k.kindergarten_id not in ordered:
             subject = f"【ママミレ】{now.month}月分のご注文入力のお願い"
             body = f"""{k.name} {k.contact_name or 'ご担当者'} 様
 
@@ -55,8 +61,20 @@ def run_monthly_reminder():
     print(f"[SCHEDULER] 完了。{sent_count}件送信しました。")
 
 
+def refresh_cache():
+    """マスタ・注文シートを一括取得してキャッシュを更新する（TTL切れ前に先読み）。"""
+    from backend.storage import prefetch_all
+    from backend.sheets_gate import sheets_priority, SheetsUnavailableError, PRIORITY_REFRESH
+
+    with sheets_priority(PRIORITY_REFRESH):
+        try:
+            prefetch_all()
+        except SheetsUnavailableError as e:
+            print(f"[SCHEDULER] キャッシュ更新をスキップしました: {e}")
+
+
 def create_scheduler() -> AsyncIOScheduler:
-    """毎朝8時に月次リマインダーを実行するスケジューラーを作成して返す。"""
+    """毎朝8時の月次リマインダーと定期キャッシュ更新のスケジューラーを作成して返す。"""
     scheduler = AsyncIOScheduler(timezone="Asia/Tokyo")
     scheduler.add_job(
         run_monthly_reminder,
@@ -67,4 +85,12 @@ def create_scheduler() -> AsyncIOScheduler:
         name='月次リマインダーメール（毎朝8時）',
         replace_existing=True,
     )
+    scheduler.add_job(
+        refresh_cache,
+        trigger='interval',
+        minutes=CACHE_REFRESH_MINUTES,
+        id='cache_refresh',
+        name='キャッシュ定期更新',
+        replace_existing=True,
+    )
     return scheduler
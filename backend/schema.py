@@ -0,0 +1,72 @@
+"""Column layout shared by the storage backends.
+
+The Google Sheets headers and the SQLite columns are the same names, so both
+backend.sheets and backend.sqlite_store (and the test doubles) take them from
+here. Importing this module needs nothing beyond backend.models.
+"""
+from typing import Dict
+from backend.models import KindergartenMaster
+
+# KindergartenMaster field -> 'kindergartens' sheet column
+KINDERGARTEN_COLUMNS = {
+    "name": "name",
+    "login_id": "login_id", "password": "password",
+    "service_mon": "mon", "service_tue": "tue", "service_wed": "wed",
+    "service_thu": "thu", "service_fri": "fri", "service_sat": "sat", "service_sun": "sun",
+    "has_soup": "has_soup", "has_no_rice": "has_no_rice", "curry_trigger": "curry_trigger",
+    "plan_type": "plan_type",
+    "contact_name": "contact_name", "contact_email": "contact_email",
+    "icon_url": "icon_url",
+    "classless_student_count": "classless_student_count",
+    "classless_allergy_count": "classless_allergy_count",
+    "classless_teacher_count": "classless_teacher_count",
+    "address": "address",
+    "area": "area",
+}
+
+CLASS_HEADERS = [
+    "kindergarten_id", "class_name", "grade", "floor",
+    "default_student_count", "default_allergy_count", "default_teacher_count", "effective_from",
+]
+
+ORDER_HEADERS = [
+    "order_id", "date", "kindergarten_id", "class_name", "meal_type",
+    "student_count", "allergy_count", "teacher_count", "memo", "updated_at", "submitted_by",
+]
+
+# 'orders_change_backup': counts before and after a class change
+BACKUP_HEADERS = [
+    "kindergarten_id", "snapshot_date", "date", "class_name",
+    "orig_student", "orig_allergy", "orig_teacher",
+    "applied_student", "applied_allergy", "applied_teacher",
+]
+
+
+def kindergarten_from_record(r: Dict) -> KindergartenMaster:
+    """Build a KindergartenMaster from one 'kindergartens' row (sheet or SQLite)."""
+    return KindergartenMaster(**{
+        "kindergarten_id": str(r.get("kindergarten_id", "")).strip(),
+        "name": str(r.get("name", "")).strip(),
+        "login_id": str(r.get("login_id", "")).strip(),
+        "password": str(r.get("password", "")).strip(),
+        "service_mon": bool(r.get("mon", 1)),
+        "service_tue": bool(r.get("tue", 1)),
+        "service_wed": bool(r.get("wed", 1)),
+        "service_thu": bool(r.get("thu", 1)),
+        "service_fri": bool(r.get("fri", 1)),
+        "service_sat": bool(r.get("sat", 0)),
+        "service_sun": bool(r.get("sun", 0)),
+        "services": [s.strip() for s in str(r.get("services", "")).split(",") if s.strip()],
+        "has_soup": bool(r.get("has_soup", False)),
+        "has_no_rice": bool(r.get("has_no_rice", False)),
+        "curry_trigger": str(r.get("curry_trigger", "")),
+        "contact_name": str(r.get("contact_name", "")),
+        "contact_email": str(r.get("contact_email", "")),
+        "icon_url": str(r.get("icon_url", "")),
+        "classless_student_count": r.get("classless_student_count", 0),
+        "classless_allergy_count": r.get("classless_allergy_count", 0),
+        "classless_teacher_count": r.get("classless_teacher_count", 0),
+        "plan_type": str(r.get("plan_type", "")),
+        "address": str(r.get("address", "")),
+        "area": str(r.get("area", "")),
+    })
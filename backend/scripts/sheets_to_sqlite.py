@@ -0,0 +1,53 @@
+import os
+import sys
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.sheets import get_db_connection, ORDERS_BACKUP_SHEET, ORDERS_LAYOUT, _get_order_partitions
+from backend.sqlite_store import SQLiteBackend
+
+# Sheet name -> SQLite table (same name, same headers)
+SHEETS = ["kindergartens", "classes", "orders", "admin_settings", ORDERS_BACKUP_SHEET]
+
+
+def copy_sheets_to_sqlite(path=None):
+    """Copy every sheet into a local SQLite file for offline use (STORAGE_BACKEND=sqlite)."""
+    wb = get_db_connection()
+    if not wb:
+        print("Failed to connect to spreadsheet")
+        return
+
+    db = SQLiteBackend(path)
+    conn = db._conn
+    sources = [(name, name) for name in SHEETS]
+    if ORDERS_LAYOUT == "monthly":
+        # Every monthly orders sheet goes into the one orders table
+        sources.remove(("orders", "orders"))
+        sources += [(title, "orders") for _, title in sorted(_get_order_partitions(wb).items())]
+    cleared = set()
+    for name, table in sources:
+        try:
+            values = wb.worksheet(name).get_all_values()
+        except Exception as e:
+            print(f"- {name}: skipped ({e})")
+            continue
+        if not values:
+            continue
+        table_cols = [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+        headers = [h for h in values[0] if h in table_cols]
+        idx = [values[0].index(h) for h in headers]
+        rows = [[row[i] if i < len(row) else "" for i in idx] for row in values[1:] if any(row)]
+        with conn:
+            if table not in cleared:
+                conn.execute(f"DELETE FROM {table}")
+                cleared.add(table)
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(headers)}) VALUES ({', '.join('?' * len(headers))})",
+                rows)
+        print(f"- {name}: {len(rows)} rows")
+    print(f"Done: {db.path}")
+
+
+if __name__ == "__main__":
+    copy_sheets_to_sqlite(sys.argv[1] if len(sys.argv) > 1 else None)
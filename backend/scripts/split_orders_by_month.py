@@ -0,0 +1,87 @@
+"""Split the flat 'orders' sheet into one sheet per month.
+
+Usage: python backend/scripts/split_orders_by_month.py [--overwrite]
+
+Stop the app first (or at least make sure nobody saves orders): orders saved
+to 'orders' after they were copied would not reach the month sheets. The
+script re-reads 'orders' when it is done and refuses to finish if it changed;
+run it again with --overwrite in that case. Only then set ORDERS_LAYOUT=monthly.
+"""
+import os
+import re
+import sys
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from gspread.utils import numericise_all
+
+from backend.sheets import get_db_connection, order_partition
+
+YEAR_MONTH = re.compile(r"^\d{4}-\d{2}$")
+
+
+def _typed(headers, row):
+    """Counts as numbers, like the app writes them; everything else as read."""
+    return [numericise_all([v])[0] if h.endswith("_count") else v for h, v in zip(headers, row)] + row[len(headers):]
+
+
+def split_orders_by_month(wb=None, overwrite=False):
+    """Copy the flat 'orders' sheet into one sheet per month (orders_2026_03, ...).
+
+    The 'orders' sheet itself is left untouched as a backup. Months that
+    already have a sheet are skipped unless overwrite=True. Once done, set
+    ORDERS_LAYOUT=monthly so the app reads and writes the monthly sheets.
+    Returns {sheet title: rows written}, or {} if 'orders' changed while it
+    was being copied (the month sheets may then miss rows; run again with
+    overwrite=True).
+    """
+    wb = wb or get_db_connection()
+    if not wb:
+        print("Failed to connect to spreadsheet")
+        return {}
+
+    orders = wb.worksheet("orders")
+    values = orders.get_all_values()
+    if not values:
+        print("'orders' is empty, nothing to split")
+        return {}
+    headers = values[0]
+    date_idx = headers.index("date")
+
+    months = {}
+    for i, row in enumerate(values[1:]):
+        if not any(row):
+            continue
+        ym = str(row[date_idx])[:7] if date_idx < len(row) else ""
+        if not YEAR_MONTH.match(ym):
+            print(f"- row {i + 2}: skipped, invalid date {row[date_idx] if date_idx < len(row) else ''!r}")
+            continue
+        months.setdefault(ym, []).append(_typed(headers, row))
+
+    existing = {ws.title: ws for ws in wb.worksheets()}
+    written = {}
+    for ym, rows in sorted(months.items()):
+        title = order_partition(ym)
+        ws = existing.get(title)
+        if ws is not None:
+            if not overwrite:
+                print(f"- {title}: already exists, skipped (use --overwrite to replace)")
+                continue
+            ws.clear()
+        else:
+            ws = wb.add_worksheet(title=title, rows=len(rows) + 500, cols=len(headers))
+        ws.batch_update([{'range': 'A1', 'values': [headers] + rows}])
+        written[title] = len(rows)
+        print(f"- {title}: {len(rows)} rows")
+
+    if orders.get_all_values() != values:
+        print("[WARNING] 'orders' changed during the split; do NOT set ORDERS_LAYOUT=monthly yet. "
+              "Stop the app and run again with --overwrite.")
+        return {}
+    print(f"Done: {sum(written.values())} rows in {len(written)} sheets. Now set ORDERS_LAYOUT=monthly.")
+    return written
+
+
+if __name__ == "__main__":
+    split_orders_by_month(overwrite="--overwrite" in sys.argv[1:])
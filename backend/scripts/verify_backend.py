@@ -5,7 +5,8 @@ from backend.sheets import (
     get_kindergartens,
     get_classes_for_kindergarten,
     get_orders_for_month,
-    batch_save_orders
+    batch_save_orders,
+    flush_order_queue
 )
 
 load_dotenv()
@@ -48,7 +49,7 @@ def verify():
         "memo": "Verification Test"
     }
     print("- Testing batch_save_orders...")
-    success = batch_save_orders([test_order])
+    success = batch_save_orders([test_order]) and flush_order_queue()
     print(f"  - Success: {success}")
 
     if success:
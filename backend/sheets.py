@@ -1,76 +1,1055 @@
+import bisect
+import sys
+from array import array
 import gspread
+import numpy as np
+from google.auth.transport.requests import AuthorizedSession, Request
+from gspread.utils import convert_credentials, fill_gaps, numericise_all, to_records
+from requests.adapters import HTTPAdapter
 from oauth2client.service_account import ServiceAccountCredentials
 import os
 import json
+import re
 import time
 import threading
-from datetime import datetime
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from types import MappingProxyType
 from dotenv import load_dotenv
-from typing import List, Dict, Optional, Any
-from backend.models import KindergartenMaster, ClassMaster, OrderData, normalize_key
+from typing import List, Dict, Iterable, Optional, Any, Tuple
+from backend import order_totals
+from backend.cache import Cache
+from backend.models import (
+    KindergartenMaster, ClassMaster, OrderData, SystemSettings, MONTHLY_COMMON_PREFIX, normalize_key,
+)
+from backend.order_queue import WriteBehindQueue
+from backend.schema import BACKUP_HEADERS, KINDERGARTEN_COLUMNS, ORDER_HEADERS, kindergarten_from_record
+from backend.sheets_gate import (
+    GatedHTTPClient, SheetsUnavailableError, sheets_priority, PRIORITY_NOTIFICATION, PRIORITY_REFRESH,
+)
 
 load_dotenv(override=True)
 
 # ---------------------------------------------------------------------------
 # In-memory TTL cache
 # ---------------------------------------------------------------------------
-_cache: dict = {}
-_cache_lock = threading.Lock()
-_DATA_TTL = 300  # 5 minutes
+_DATA_TTL = 300  # 5 minutes; older entries are served while one background refresh runs
+_HARD_TTL = int(os.getenv("CACHE_HARD_TTL", "3600"))  # never served past this age
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
 
+
+def _cache_namespace(key: str) -> str:
+    """Key family for cache stats: "ord_m_2026-04" -> "ord_m"."""
+    return re.sub(r"_\d{4}-\d{2}", "", key)
+
+
+# Tags the per-month order entries are stored with, so each family can be dropped at once
+ORDER_WINDOW_TAG = "ord_m"
+ORDER_PARTITION_TAG = "ord_p"
+
+
+_cache = Cache("sheets", CACHE_MAX_ENTRIES, _DATA_TTL, namespace=_cache_namespace)
+_cache_lock = _cache.lock
+_refreshing: set = set()  # keys with a background refresh in flight
+
+# Change detection: the spreadsheet's Drive version is checked (one metadata
+# request, no cells read) at most every CHANGE_PROBE_SECONDS. Entries remember
+# the version they were read at; while it is unchanged a stale entry is
+# renewed instead of re-read.
+CHANGE_PROBE_SECONDS = float(os.getenv("CHANGE_PROBE_SECONDS", "30"))
+_probe = {"version": None, "checked": 0.0}
+_probe_lock = threading.Lock()
+
+
+def _spreadsheet_version() -> Optional[str]:
+    """Current Drive version of the spreadsheet, or None when it cannot be checked."""
+    with _probe_lock:
+        if time.time() - _probe["checked"] < CHANGE_PROBE_SECONDS:
+            return _probe["version"]
+        try:
+            from backend.drive import get_file_version
+            version = get_file_version(os.getenv("SPREADSHEET_ID"))
+        except Exception as e:
+            print(f"[CACHE] Change probe failed: {e}")
+            version = None
+        _probe.update(version=version, checked=time.time())
+        return version
+
+# The spreadsheet is opened once and the client kept: its access token is
+# refreshed by a background thread before it expires, so requests never wait
+# for authorization after startup.
 _wb_instance = None
-_wb_ts: float = 0.0
-_wb_lock = threading.Lock()
-_WB_TTL = 1800  # 30 minutes
+_wb_creds = None
+_wb_lock = threading.Lock()  # held only while the first connection is made
+_wb_failed_at: float = 0.0
+_wb_unavailable = False  # the failure was Sheets being unavailable, not missing config
+CONNECT_RETRY_SECONDS = 30  # after a failed connect, callers get None until then
+TOKEN_REFRESH_MARGIN = 600  # refresh this many seconds before the token expires
+# Keep-alive connections to Google; FastAPI runs sync endpoints on up to 40 threads
+SHEETS_HTTP_POOL_SIZE = int(os.getenv("SHEETS_HTTP_POOL_SIZE", "40"))
+_connection_stats = {
+    "connects": 0, "connect_failures": 0, "last_connect_seconds": None,
+    "token_refreshes": 0, "token_refresh_failures": 0, "last_token_refresh_seconds": None,
+}
+
+
+def _dcache_entry(key: str):
+    """Cache entry of key, or None when missing or expired.
+
+    Stale-while-revalidate: past _DATA_TTL an entry that has a loader (see
+    _cached) is still returned, up to _HARD_TTL, and one background refresh
+    is started to replace it, so requests do not wait on Sheets.
+    """
+    entry = _cache.lookup(key)
+    if entry is None:
+        return None
+    if entry.age >= _DATA_TTL:  # only entries with a loader are kept this long
+        _cache.count_stale(key)
+        with _cache_lock:
+            if key not in _refreshing:
+                _refreshing.add(key)
+                version = _cache.version(entry.tags)
+                threading.Thread(target=_revalidate, args=(key, entry, version), daemon=True).start()
+    return entry
 
 
 def _dcache_get(key: str):
-    with _cache_lock:
-        entry = _cache.get(key)
-        if entry and (time.time() - entry[1]) < _DATA_TTL:
-            return entry[0]
-        _cache.pop(key, None)
-    return None
+    """Cached value, or None when missing or expired (see _dcache_entry)."""
+    entry = _dcache_entry(key)
+    return entry.data if entry is not None else None
+
+
+def _dcache_set(key: str, data, loader: Optional[tuple] = None, source: Optional[str] = None,
+                tags: Iterable[str] = ()):
+    """Cache data under key. loader is the (fetch, lock) to refresh it with;
+    source the spreadsheet version the data is at least as new as. The entry
+    is dropped by _dcache_bust() of its key or of any of the tags."""
+    entry = _cache.store(key, data, tags, loader, _HARD_TTL if loader else _DATA_TTL, source)
+    if isinstance(data, _OrderIndex):
+        # A save submitted after the index was built put its rows into the
+        # entry this one replaces: apply the queue again now that it is visible
+        data.put(_pending_orders(key))
+    return entry
+
+
+def _dcache_bust(*tags: str):
+    """Drop the entries of the given keys or key families (all entries if none given)."""
+    if tags:
+        _cache.invalidate(*tags)
+    else:
+        _cache.clear()
 
 
-def _dcache_set(key: str, data):
-    with _cache_lock:
-        _cache[key] = (data, time.time())
+class _Flight:
+    """One in-progress load of a cache key, shared by concurrent misses."""
 
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
 
-def _dcache_bust(*prefixes: str):
-    with _cache_lock:
-        to_del = [k for k in list(_cache) if any(k.startswith(p) for p in prefixes)]
-        for k in to_del:
-            del _cache[k]
+
+_flights: Dict[str, _Flight] = {}
+
+
+def _load(key: str, fetch, lock=None, tags: Iterable[str] = ()):
+    """fetch() and cache the result (with tags), returning its entry; under `lock` so e.g. an
+    orders write cannot land between the read and the new value replacing the old one.
+
+    Single-flight: while one caller fetches a key, concurrent misses wait for
+    it and share its result (or error) instead of each reading the sheet.
+    `lock` is taken before the flight is joined, so a caller already holding
+    it (an orders flush) never waits on a fetch that needs it.
+    """
+    with lock or nullcontext():
+        with _cache_lock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                entry = _cache.peek(key)  # loaded while we waited for `lock`
+                if entry is not None and entry.age < entry.max_age:
+                    return entry
+                flight = _flights[key] = _Flight()
+        if leader:
+            try:
+                # Last known version, no probe: an older one only costs a re-read later
+                source = _probe["version"]
+                flight.result = _dcache_set(key, fetch(), (fetch, lock), source, tags)
+                return flight.result
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                with _cache_lock:
+                    del _flights[key]
+                flight.done.set()
+    flight.done.wait()
+    if flight.error is not None:
+        raise flight.error
+    return flight.result
+
+
+def _cached_entry(key: str, fetch, lock=None, tags: Iterable[str] = ()):
+    """Cache entry of key, loaded with fetch() on a miss. fetch is also kept
+    to refresh the entry in the background once it goes stale."""
+    return _dcache_entry(key) or _load(key, fetch, lock, tags)
+
+
+def _cached(key: str, fetch, lock=None, tags: Iterable[str] = ()):
+    """Cached value of key (see _cached_entry)."""
+    return _cached_entry(key, fetch, lock, tags).data
+
+
+def _revalidate(key: str, entry, version: tuple):
+    try:
+        source = _spreadsheet_version()
+        if source is not None and source == entry.source:
+            _cache.renew(key, entry)  # spreadsheet unchanged since it was read
+            return
+        fetch, lock = entry.loader
+        with sheets_priority(PRIORITY_REFRESH), lock or nullcontext():
+            data = fetch()
+            with _cache_lock:
+                # Dropped by a write meanwhile: the data may predate it
+                if _cache.version(entry.tags) == version:
+                    _dcache_set(key, data, entry.loader, source, entry.tags)
+    except Exception as e:
+        print(f"[CACHE] Background refresh of {key} failed: {e}")
+    finally:
+        with _cache_lock:
+            _refreshing.discard(key)
 
 
 def _get_sheet_records(wb, sheet_name: str, cache_key: str) -> list:
-    cached = _dcache_get(cache_key)
-    if cached is not None:
-        return cached
-    ws = wb.worksheet(sheet_name)
-    records = ws.get_all_records()
-    _dcache_set(cache_key, records)
-    return records
+    return _cached(cache_key, *_sheet_loader(wb, sheet_name, cache_key))
+
+
+def _get_sheet_models(wb, sheet_name: str, cache_key: str, build):
+    """build(records) for a sheet's cached records, e.g. validated models.
+
+    Cached per generation of cache_key, so validation runs once each time the
+    sheet is (re)loaded instead of on every request.
+    """
+    # Records and generation from the same entry, so a reload in between
+    # cannot pair the old records with the new generation
+    entry = _cached_entry(cache_key, *_sheet_loader(wb, sheet_name, cache_key))
+    records, generation = entry.data, entry.generation
+    cached = _dcache_get(f"{cache_key}:models")
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    models = build(records)
+    _dcache_set(f"{cache_key}:models", (generation, models), tags={cache_key})  # dropped along with the records
+    return models
+
+
+def _extend_month_rows(month_rows: Dict[str, List[int]], date: str, row: int):
+    window = month_rows.get(date[:7])
+    if window is None:
+        month_rows[date[:7]] = [row, row]
+    else:
+        window[0] = min(window[0], row)
+        window[1] = max(window[1], row)
+
+
+class _StringTable:
+    """Each distinct string kept once (sys.intern'd) and referred to by an int code."""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            value = sys.intern(value)
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+# Fields stored by _OrderIndex: text as string-table codes (None: required), counts as ints
+_ORDER_TEXT = {"kindergarten_id": None, "date": None, "class_name": None,
+               "meal_type": "通常", "memo": "", "updated_at": "", "submitted_by": ""}
+_ORDER_COUNTS = ("student_count", "allergy_count", "teacher_count")
+
+
+def _count(v) -> int:
+    # Same rules as OrderData.parse_int
+    if v == "": return 0
+    try:
+        return int(v)
+    except:
+        return 0
+
+
+class _OrderIndex:
+    """Orders partitioned by month -> kindergarten and by date.
+
+    Built in a single pass over the 'orders' sheet values, so every reader is a
+    dict lookup instead of a scan of the whole sheet. Also keeps the header row
+    and each order's sheet row as last seen, so saves can address rows without
+    re-reading the sheet; rows can be deleted or sorted by hand, so _write_rows
+    checks the ids in those rows before writing to them.
+
+    Orders are held column-wise in int arrays, text as codes into one string
+    table (dates, kindergarten ids, class names and timestamps repeat across
+    thousands of rows), and the groups hold positions into those arrays: about
+    50 bytes per order instead of a model object each. OrderData is only built
+    for the rows a reader returns. order_id is not stored when it has the usual
+    "{date}_{kindergarten_id}_{class_name}" form.
+    """
+
+    def __init__(self, values: List[List], first_row: int = 2):
+        # first_row: sheet row of values[1] (a month window starts mid-sheet)
+        self.headers: List[str] = list(values[0]) if values else []
+        self.strings = _StringTable()
+        self.columns: Dict[str, array] = {f: array("i") for f in (*_ORDER_TEXT, *_ORDER_COUNTS)}
+        self.sheet_rows = array("i")  # 1-based sheet row per position, 0 while only queued
+        self.months: Dict[str, Dict[int, array]] = {}  # "YYYY-MM" -> kindergarten code -> positions
+        self.dates: Dict[int, array] = {}  # date code -> positions
+        self.custom_ids: Dict[str, int] = {}  # order_id -> position, for ids not of the usual form
+        self._custom_pos: Dict[int, str] = {}
+        self._loose_rows: Dict[str, int] = {}  # order_id -> sheet row of rows not held (skipped ones)
+        self.month_rows: Dict[str, List[int]] = {}  # "YYYY-MM" -> [first, last] sheet row
+        self.row_count = max(len(values) - 1, 0)  # data rows in the sheet, including skipped ones
+        self._lock = threading.RLock()
+
+        cols = {h: i for i, h in enumerate(self.headers)}
+        layout = self._layout(cols)
+        id_col, date_col = cols.get("order_id"), cols.get("date")
+        for i, row in enumerate(values[1:]):
+            sheet_row = i + first_row
+            if date_col is not None and date_col < len(row) and row[date_col]:
+                _extend_month_rows(self.month_rows, str(row[date_col]), sheet_row)
+            try:
+                self._append(*self._encode(row, layout), sheet_row)
+            except Exception as row_err:
+                print(f"[WARNING] Skipping orders row {sheet_row}: {row_err}")
+                if id_col is not None and id_col < len(row) and row[id_col]:
+                    self._loose_rows[str(row[id_col])] = sheet_row
+
+    @staticmethod
+    def _layout(cols: Dict[str, int]) -> tuple:
+        """How to read rows whose fields sit at cols (field -> index)."""
+        required = [(f, cols.get(f, 1 << 30)) for f in ["order_id"] + [f for f, d in _ORDER_TEXT.items() if d is None]]
+        min_len = max(c for _, c in required) + 1
+        text = [(cols.get(f, -1), default) for f, default in _ORDER_TEXT.items()]
+        counts = [cols.get(f, -1) for f in _ORDER_COUNTS]
+        return required, min_len, text, counts, cols.get("order_id")
+
+    def _encode(self, row: List, layout: tuple) -> tuple:
+        """(order_id, [text codes..., counts...]) of one row."""
+        required, min_len, text, counts, id_col = layout
+        n = len(row)
+        if n < min_len:
+            raise ValueError(f"missing {', '.join(f for f, c in required if c >= n)}")
+        codes, code = self.strings.codes, self.strings.code
+        encoded = []
+        for c, default in text:
+            v = str(row[c]) if 0 <= c < n else default
+            k = codes.get(v)
+            encoded.append(code(v) if k is None else k)
+        for c in counts:
+            encoded.append(_count(row[c]) if 0 <= c < n else 0)
+        return str(row[id_col]), encoded
+
+    def _append(self, oid: str, encoded: List[int], sheet_row: int = 0) -> int:
+        pos = len(self.sheet_rows)
+        for column, value in zip(self.columns.values(), encoded):
+            column.append(value)
+        self.sheet_rows.append(sheet_row)
+        kid, date, cls = encoded[:3]
+        s = self.strings.values
+        if oid != f"{s[date]}_{s[kid]}_{s[cls]}":
+            self.custom_ids[oid] = pos
+            self._custom_pos[pos] = oid
+        self._link(pos, kid, date)
+        return pos
+
+    def _link(self, pos: int, kid: int, date: int):
+        self.months.setdefault(self.strings.values[date][:7], {}).setdefault(kid, array("i")).append(pos)
+        group = self.dates.get(date)
+        if group is None:
+            group = self.dates[date] = array("i")
+        group.append(pos)
+
+    def _find(self, order_id: str, date: str, kindergarten_id: str, class_name: str) -> Optional[int]:
+        """Position of an order_id, or None. Usual ids are looked up among the
+        kindergarten's orders of that month; duplicates resolve to the last row."""
+        if order_id in self.custom_ids:
+            return self.custom_ids[order_id]
+        if order_id != f"{date}_{kindergarten_id}_{class_name}":
+            return None
+        codes = self.strings.codes
+        kid, day, cls = codes.get(kindergarten_id), codes.get(date), codes.get(class_name)
+        if kid is None or day is None or cls is None:
+            return None
+        dates, classes = self.columns["date"], self.columns["class_name"]
+        for pos in reversed(self.months.get(date[:7], {}).get(kid, ())):
+            if dates[pos] == day and classes[pos] == cls and pos not in self._custom_pos:
+                return pos
+        return None
+
+    def put(self, orders: List[OrderData]):
+        """Write-through: insert or replace orders by order_id."""
+        layout = self._layout({f: i for i, f in enumerate(OrderData.model_fields)})
+        with self._lock:
+            for order in orders:
+                oid, encoded = self._encode(list(order.model_dump().values()), layout)
+                pos = self._find(oid, order.date, order.kindergarten_id, order.class_name)
+                if pos is None:
+                    self._append(oid, encoded)
+                    continue
+                kid, date = self.columns["kindergarten_id"][pos], self.columns["date"][pos]
+                if (kid, date) != tuple(encoded[:2]):
+                    self.months[self.strings.values[date][:7]][kid].remove(pos)
+                    self.dates[date].remove(pos)
+                    self._link(pos, *encoded[:2])
+                for column, value in zip(self.columns.values(), encoded):
+                    column[pos] = value
+
+    def _find_order(self, order: Dict) -> Optional[int]:
+        return self._find(str(order.get("order_id")), str(order.get("date", "")),
+                          str(order.get("kindergarten_id", "")), str(order.get("class_name", "")))
+
+    def row_of(self, order: Dict) -> Optional[int]:
+        """1-based sheet row holding an order, or None if it is not in the sheet."""
+        with self._lock:
+            pos = self._find_order(order)
+            if pos is not None and self.sheet_rows[pos]:
+                return self.sheet_rows[pos]
+            return self._loose_rows.get(str(order.get("order_id")))
+
+    def record_appended(self, orders: List[Dict], first_row: Optional[int] = None):
+        """Record the sheet rows of orders just appended to the sheet: after
+        the last row held, or from first_row on (a month window, which does
+        not end at the end of the sheet)."""
+        with self._lock:
+            for i, order in enumerate(orders):
+                if first_row is None:
+                    self.row_count += 1
+                    row = self.row_count + 1
+                else:
+                    row = first_row + i
+                pos = self._find_order(order)
+                if pos is None:
+                    self._loose_rows[str(order["order_id"])] = row
+                else:
+                    self.sheet_rows[pos] = row
+                _extend_month_rows(self.month_rows, str(order.get("date", "")), row)
+
+    def _records(self, positions, fields) -> List[Dict]:
+        s, custom = self.strings.values, self._custom_pos
+        kid, date, cls = (self.columns[f] for f in ("kindergarten_id", "date", "class_name"))
+        getters = []
+        for f in fields:
+            if f == "order_id":
+                getters.append((f, lambda p: custom.get(p) or f"{s[date[p]]}_{s[kid[p]]}_{s[cls[p]]}"))
+            elif f in _ORDER_TEXT:
+                getters.append((f, lambda p, c=self.columns[f]: s[c[p]]))
+            elif f in self.columns:
+                getters.append((f, self.columns[f].__getitem__))
+            else:
+                getters.append((f, lambda p: ""))
+        return [{f: get(p) for f, get in getters} for p in positions]
+
+    def _orders(self, positions) -> List[OrderData]:
+        s, custom = self.strings.values, self._custom_pos
+        kid, date, cls, meal, memo, updated, by, students, allergies, teachers = self.columns.values()
+        orders = []
+        for p in positions:
+            d, k, c = s[date[p]], s[kid[p]], s[cls[p]]
+            orders.append(OrderData(
+                order_id=custom.get(p) or f"{d}_{k}_{c}", kindergarten_id=k, date=d, class_name=c,
+                meal_type=s[meal[p]], student_count=students[p], allergy_count=allergies[p],
+                teacher_count=teachers[p], memo=s[memo[p]], updated_at=s[updated[p]], submitted_by=s[by[p]],
+            ))
+        return orders
+
+    def _positions(self, year_month: Optional[str] = None) -> List[int]:
+        months = self.months.values() if year_month is None else [self.months.get(year_month, {})]
+        return [pos for by_kid in months for group in by_kid.values() for pos in group]
+
+    def select(self, year_month: Optional[str] = None) -> List[OrderData]:
+        """All orders, or those of one "YYYY-MM" month."""
+        with self._lock:
+            return self._orders(self._positions(year_month))
+
+    def project(self, fields: List[str], year_month: Optional[str] = None) -> List[Dict]:
+        """Like select, as plain dicts of just the given fields."""
+        with self._lock:
+            return self._records(self._positions(year_month), fields)
+
+    def totals(self, by: List[str], year_month: Optional[str] = None, date: Optional[str] = None,
+               areas: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """order_totals.group_totals over all orders, one month's or one date's."""
+        with self._lock:
+            if date is not None:
+                groups = [self.dates.get(self.strings.codes.get(date), array("i"))]
+            else:
+                months = self.months.values() if year_month is None else [self.months.get(year_month, {})]
+                groups = [group for by_kid in months for group in by_kid.values()]
+            positions = np.concatenate([np.frombuffer(g, dtype=np.intc) for g in groups] or [np.zeros(0, np.intc)])
+            # Fancy indexing copies, so no view keeps the arrays' buffers exported
+            # (an exported array.array cannot grow)
+            codes = {f: np.frombuffer(self.columns[f], dtype=np.intc)[positions] for f in order_totals.SOURCE_FIELDS}
+            counts = {f: np.frombuffer(self.columns[f], dtype=np.intc)[positions] for f in _ORDER_COUNTS}
+        return order_totals.group_totals(self.strings.values, codes, counts, by, areas)
+
+    def orders_with_totals(self, by: List[str], year_month: Optional[str] = None, date: Optional[str] = None,
+                           areas: Optional[Dict[str, str]] = None) -> Tuple[List[OrderData], List[Dict]]:
+        """One month's or one date's orders and their totals, taken under one
+        hold of the lock so a save landing in between cannot split them."""
+        with self._lock:
+            if date is not None:
+                orders = self.for_date(date)
+            else:
+                orders = [o for group in self.months.get(year_month, {}).values() for o in self._orders(group)]
+            return orders, self.totals(by, year_month=year_month, date=date, areas=areas)
+
+    def for_month(self, kindergarten_id: str, year: int, month: int) -> List[OrderData]:
+        with self._lock:
+            kid = self.strings.codes.get(str(kindergarten_id))
+            return self._orders(self.months.get(f"{year}-{month:02d}", {}).get(kid, ()))
+
+    def for_date(self, date: str) -> List[OrderData]:
+        with self._lock:
+            return self._orders(self.dates.get(self.strings.codes.get(date), ()))
+
+    def month_by_kindergarten(self, year: int, month: int) -> Dict[str, List[OrderData]]:
+        with self._lock:
+            by_kid = self.months.get(f"{year}-{month:02d}", {})
+            return {self.strings.values[kid]: self._orders(group) for kid, group in by_kid.items() if group}
+
+
+def _pending_orders(cache_key: str) -> List[OrderData]:
+    """Saves still waiting in the write-behind queue (so not in the sheet yet)
+    that belong in the order index cached under cache_key."""
+    ym = cache_key.rsplit("_", 1)[1] if cache_key.startswith(("ord_m_", "ord_p_")) else ""
+    return [OrderData(**r) for r in _order_queue.pending() if str(r.get("date", "")).startswith(ym)]
+
+
+def _build_order_index(values: List[List[str]]) -> _OrderIndex:
+    index = _OrderIndex(values)
+    index.put(_pending_orders("ord_raw"))
+    return index
+
+
+def _get_order_index(wb) -> _OrderIndex:
+    return _cached("ord_raw", *_sheet_loader(wb, "orders", "ord_raw"))
+
+
+# "flat": every order in the 'orders' sheet. "monthly": one sheet per month
+# (orders_2026_03, ...), created by scripts/split_orders_by_month.py
+ORDERS_LAYOUT = os.getenv("ORDERS_LAYOUT", "flat").strip().lower()
+_PARTITION_RE = re.compile(r"^orders_(\d{4})_(\d{2})$")
+_YEAR_MONTH_RE = re.compile(r"^\d{4}-\d{2}$")
+
+
+def order_partition(year_month: str) -> str:
+    """Sheet holding one month's orders: "2026-03" -> "orders_2026_03"."""
+    return f"orders_{year_month[:4]}_{year_month[5:7]}"
+
+
+def _partitions_fetch(wb):
+    def fetch():
+        parts = {}
+        for ws in wb.worksheets():
+            m = _PARTITION_RE.match(ws.title)
+            if m:
+                parts[f"{m.group(1)}-{m.group(2)}"] = ws.title
+        return parts
+    return fetch
+
+
+def _get_order_partitions(wb) -> Dict[str, str]:
+    """"YYYY-MM" -> title of every existing monthly orders sheet."""
+    return _cached("ord_parts", _partitions_fetch(wb))
+
+
+def _build_partition_index(year_month: str, values: List[List[str]]) -> _OrderIndex:
+    index = _OrderIndex(values or [ORDER_HEADERS])
+    index.put(_pending_orders(f"ord_p_{year_month}"))
+    return index
+
+
+def _get_partition_index(wb, year_month: str) -> _OrderIndex:
+    """Index of one monthly orders sheet (empty if the month has no sheet yet)."""
+    return _cached(f"ord_p_{year_month}", *_sheet_loader(wb, order_partition(year_month), f"ord_p_{year_month}"),
+                   tags={ORDER_PARTITION_TAG})
+
+
+def _sheet_loader(wb, title: str, cache_key: str) -> tuple:
+    """(fetch, lock) that loads a sheet's cache entry: records for master
+    sheets, an _OrderIndex for order sheets (under _orders_lock, so an append
+    cannot land between the read and the new row map replacing the old one)."""
+    if cache_key == "ord_raw":
+        return lambda: _build_order_index(_worksheet(wb, title).get_all_values()), _orders_lock
+    if cache_key.startswith("ord_p_"):
+        ym = cache_key[len("ord_p_"):]
+        def fetch():
+            values = []
+            if ym in _get_order_partitions(wb):
+                values = _worksheet(wb, title).get_all_values()
+            return _build_partition_index(ym, values)
+        return fetch, _orders_lock
+    if cache_key.startswith("ord_m_"):
+        return _month_window_fetch(wb, cache_key[len("ord_m_"):]), _orders_lock
+    return lambda: _worksheet(wb, title).get_all_records(), None
+
+
+def _get_partition_sheet(wb, year_month: str):
+    """Worksheet for a month's orders, created with the header row if missing."""
+    parts = _get_order_partitions(wb)
+    title = order_partition(year_month)
+    if year_month in parts:
+        return _worksheet(wb, title)
+    ws = wb.add_worksheet(title=title, rows=1000, cols=len(ORDER_HEADERS))
+    ws.batch_update([{'range': 'A1', 'values': [ORDER_HEADERS]}])
+    parts[year_month] = title
+    print(f"[INFO] Created orders sheet {title}")
+    return ws
+
+
+def _worksheet(wb, title: str):
+    """Worksheet handle (with its sheet id), cached per workbook: wb.worksheet()
+    is a metadata request, so this saves one round trip per operation."""
+    cached = _dcache_get(f"ws:{title}")
+    if cached is not None and cached[0] is wb:
+        return cached[1]
+    ws = wb.worksheet(title)
+    _dcache_set(f"ws:{title}", (wb, ws))
+    return ws
+
+
+def _sheet_headers(wb, title: str, records: Optional[List[Dict]] = None) -> List[str]:
+    """Header row of a sheet, cached like its handle. Pass freshly read records
+    to check the cached headers against their keys (re-read if they differ)."""
+    cached = _dcache_get(f"hdr:{title}")
+    if cached is not None and cached[0] is wb and (not records or list(records[0]) == cached[1]):
+        return list(cached[1])
+    headers = _worksheet(wb, title).row_values(1)
+    _set_sheet_headers(wb, title, headers)
+    return list(headers)
+
+
+def _set_sheet_headers(wb, title: str, headers: List[str]):
+    """Record a sheet's header row after columns were added to it."""
+    _dcache_set(f"hdr:{title}", (wb, list(headers)))
+
+
+def _column_letter(col: int) -> str:
+    return re.sub(r"\d", "", gspread.utils.rowcol_to_a1(1, col))
+
+
+def _get_order_headers(ws) -> List[str]:
+    index = _dcache_get("ord_raw")
+    if index is not None:
+        return index.headers
+    return _cached("ord_hdr", lambda: ws.row_values(1))
+
+
+def _get_order_month_rows(ws, headers: List[str]) -> Dict[str, List[int]]:
+    """"YYYY-MM" -> [first, last] sheet row. Taken from the loaded index, or
+    built from a read of the date column alone."""
+    index = _dcache_get("ord_raw")
+    if index is not None:
+        return index.month_rows
+    def fetch():
+        col = _column_letter(headers.index("date") + 1)
+        dates = ws.batch_get([f"{col}2:{col}"], major_dimension="COLUMNS")[0]
+        month_rows: Dict[str, List[int]] = {}
+        for i, d in enumerate(dates[0] if dates else []):
+            if d:
+                _extend_month_rows(month_rows, str(d), i + 2)
+        return month_rows
+    return _cached("ord_months", fetch)
+
+
+def _get_month_orders(wb, year: int, month: int) -> _OrderIndex:
+    """Index holding at least the given month: its monthly sheet, or in the flat
+    layout the full order index when it is loaded, otherwise one read of just
+    that month's row window."""
+    ym = f"{year}-{month:02d}"
+    if ORDERS_LAYOUT == "monthly":
+        return _get_partition_index(wb, ym)
+    index = _dcache_get("ord_raw")
+    if index is not None:
+        return index
+    return _cached(f"ord_m_{ym}", *_sheet_loader(wb, "orders", f"ord_m_{ym}"), tags={ORDER_WINDOW_TAG})
+
+
+def _month_window_fetch(wb, year_month: str):
+    """fetch() for one month's row window of the flat orders sheet."""
+    def fetch():
+        ws = _worksheet(wb, "orders")
+        headers = _get_order_headers(ws)
+        window = _get_order_month_rows(ws, headers).get(year_month)
+        block = []
+        if window:
+            block = ws.batch_get([f"A{window[0]}:{_column_letter(len(headers))}{window[1]}"])[0]
+        return _build_month_window(year_month, headers, block, window[0] if window else 2)
+    return fetch
+
+
+def _build_month_window(year_month: str, headers: List[str], block: List[List[str]], first_row: int) -> _OrderIndex:
+    # The window can include rows of other months; readers only ask for this one
+    values = [headers] + (fill_gaps(block, cols=len(headers)) if block else [])
+    index = _OrderIndex(values, first_row=first_row)
+    index.put(_pending_orders(f"ord_m_{year_month}"))
+    return index
+
+
+def read_order_columns(columns: List[str], year: Optional[int] = None, month: Optional[int] = None) -> List[Dict]:
+    """Read only some columns of the orders sheet, optionally only one month.
+
+    order_id and date are always included. Served from the cached order index
+    when it is loaded; otherwise a single batch_get of just those columns,
+    limited to the month's row window, so e.g. a count of who has ordered does
+    not download memo/updated_at/submitted_by or other months.
+    """
+    try:
+        wb = get_db_connection()
+        if not wb: return []
+        wanted = list(dict.fromkeys(["order_id", "date"] + list(columns)))
+        ym = f"{year}-{month:02d}" if year and month else None
+
+        if ORDERS_LAYOUT == "monthly":
+            # A month is a sheet of its own, so its index is already the bounded read
+            months = [ym] if ym else sorted(_get_order_partitions(wb))
+            return [r for m in months for r in _get_partition_index(wb, m).project(wanted, m)]
+
+        index = _dcache_get("ord_raw")
+        if index is not None:
+            return index.project(wanted, ym)
+
+        ws = _worksheet(wb, "orders")
+        headers = _get_order_headers(ws)
+        wanted = [c for c in wanted if c in headers]
+        first, last = 2, ""
+        if ym:
+            window = _get_order_month_rows(ws, headers).get(ym)
+            if window:
+                first, last = window
+        rows: Dict[str, Dict] = {}
+        if last or not ym:
+            ranges = []
+            for c in wanted:
+                letter = _column_letter(headers.index(c) + 1)
+                ranges.append(f"{letter}{first}:{letter}{last}")
+            data = {}
+            for c, value_range in zip(wanted, ws.batch_get(ranges, major_dimension="COLUMNS")):
+                data[c] = numericise_all(value_range[0]) if value_range else []
+            for i in range(max(len(v) for v in data.values())):
+                r = {c: (data[c][i] if i < len(data[c]) else "") for c in wanted}
+                if r["order_id"] and (not ym or str(r["date"]).startswith(ym)):
+                    rows[str(r["order_id"])] = r
+        # Saves still waiting in the write-behind queue are not in the sheet yet
+        for p in _order_queue.pending():
+            if not ym or str(p.get("date", "")).startswith(ym):
+                rows[str(p["order_id"])] = {c: p.get(c, "") for c in wanted}
+        return list(rows.values())
+    except SheetsUnavailableError:
+        raise
+    except Exception as e:
+        print(f"Error in read_order_columns: {e}")
+        return []
+
+
+def _entry_from_values(key: str, values: List[List[str]], first_row: int = 2):
+    """Cache value of a prefetched sheet, built from its raw values (a month
+    window's values are its header row and the rows from first_row on)."""
+    if key.startswith("ord_m_"):
+        return _build_month_window(key[len("ord_m_"):], values[0], values[1:], first_row)
+    if key == "ord_raw":
+        return _build_order_index(fill_gaps(values) if values else [])
+    if key.startswith("ord_p_"):
+        return _build_partition_index(key[len("ord_p_"):], fill_gaps(values) if values else [])
+    return _records_from_values(values)
+
+
+def _records_from_values(values: List[List[str]]) -> List[Dict]:
+    """Same records get_all_records() would build from a sheet's raw values."""
+    if not values:
+        return []
+    rows = fill_gaps(values)
+    return to_records(rows[0], [numericise_all(row) for row in rows[1:]])
+
+
+# sheet -> cache key, in the order they are requested from values_batch_get
+PREFETCH_SHEETS = {
+    "kindergartens": "kg",
+    "classes": "cls_raw",
+    "orders": "ord_raw",
+    "admin_settings": "settings",
+}
+
+
+# Months around today (last month .. two ahead) whose sheets are prefetched in
+# the monthly layout, and whose orders are kept in the on-disk snapshot
+PREFETCH_MONTHS = range(-1, 3)
+
+
+def _prefetch_months() -> List[str]:
+    now = datetime.now()
+    months = []
+    for offset in PREFETCH_MONTHS:
+        y, m = divmod(now.year * 12 + now.month - 1 + offset, 12)
+        months.append(f"{y}-{m + 1:02d}")
+    return months
+
+
+def prefetch_all() -> bool:
+    """Load every master sheet in a single values_batch_get request and fill
+    the cache for all of them. Used for startup warmup and periodic refresh;
+    skipped when everything is cached and the spreadsheet has not changed."""
+    try:
+        source = _spreadsheet_version()
+        wb = get_db_connection()
+        if not wb: return False
+        sheets = dict(PREFETCH_SHEETS)
+        tags: Dict[str, List[str]] = {}
+        if ORDERS_LAYOUT == "monthly":
+            del sheets["orders"]
+            parts = _get_order_partitions(wb)
+            for ym in _prefetch_months():
+                if ym in parts:
+                    sheets[parts[ym]] = f"ord_p_{ym}"
+                    tags[f"ord_p_{ym}"] = [ORDER_PARTITION_TAG]
+        entries = {key: _cache.peek(key) for key in sheets.values()}
+        if source is not None and all(e is not None and e.source == source for e in entries.values()):
+            for key, entry in entries.items():
+                _cache.renew(key, entry)
+            return True
+        snapshot = {}
+        # Hold the orders lock so an append cannot land between the read and
+        # the new row map replacing the old one
+        with _orders_lock:
+            try:
+                response = wb.values_batch_get(list(sheets))
+            except gspread.exceptions.APIError as e:
+                # One missing sheet fails the whole request: retry with those that
+                # exist and leave the missing ones to their readers (which create them)
+                titles = {ws.title for ws in wb.worksheets()}
+                missing = [title for title in sheets if title not in titles]
+                if e.code != 400 or not missing:
+                    raise
+                print(f"[WARNING] prefetch_all: sheets not found, skipped: {', '.join(missing)}")
+                for title in missing:
+                    del sheets[title]
+                response = wb.values_batch_get(list(sheets)) if sheets else {}
+            for (title, key), value_range in zip(sheets.items(), response.get("valueRanges", [])):
+                values = value_range.get("values", [])
+                _dcache_set(key, _entry_from_values(key, values), _sheet_loader(wb, title, key), source, tags.get(key, ()))
+                if key == "ord_raw":
+                    snapshot.update(_snapshot_month_windows(title, values))
+                else:
+                    snapshot[key] = [title, values, 2, tags.get(key, [])]
+        _save_snapshot(snapshot, parts if ORDERS_LAYOUT == "monthly" else None, source)
+        return True
+    except SheetsUnavailableError:
+        raise
+    except Exception as e:
+        print(f"Error in prefetch_all: {e}")
+        return False
 
 # ---------------------------------------------------------------------------
+# On-disk snapshot of the prefetched sheets
+#
+# Every prefetch that downloads the sheets also writes their raw values to
+# CACHE_SNAPSHOT_FILE. On startup load_cache_snapshot() rebuilds the cache
+# from it (records and order indexes) before any request comes in; the
+# entries start out stale, so the first reads are answered at once from the
+# snapshot while the usual background refresh revalidates them.
+#
+# Only what a cold start needs is kept: the master sheets without their
+# credential columns, and the orders of the PREFETCH_MONTHS (in the flat
+# layout as month windows, not the whole history). The file is readable by
+# its owner only.
+# ---------------------------------------------------------------------------
+CACHE_SNAPSHOT_FILE = os.getenv("CACHE_SNAPSHOT_FILE", os.path.join(os.path.dirname(__file__), '..', 'data', 'sheets_cache.json'))
+CACHE_SNAPSHOT_MAX_AGE = int(os.getenv("CACHE_SNAPSHOT_MAX_AGE", str(24 * 3600)))  # older snapshots are ignored
+_SNAPSHOT_FORMAT = 3  # bump when the stored layout changes; other formats are ignored
+_SNAPSHOT_SECRET_COLUMNS = {"password"}  # never written to the snapshot
+_snapshot_restored = False
+# cache key -> the entry restored without its secret columns, while it is still cached
+_snapshot_redacted: Dict[str, Any] = {}
+
+
+def _snapshot_month_windows(title: str, values: List[List[str]]) -> Dict[str, list]:
+    """{ord_m_ key: [title, header row + window rows, first row, tags]} of
+    the flat orders sheet, for the PREFETCH_MONTHS."""
+    if not values or "date" not in values[0]:
+        return {}
+    col = values[0].index("date")
+    month_rows: Dict[str, List[int]] = {}
+    for i, row in enumerate(values[1:]):
+        if col < len(row) and row[col]:
+            _extend_month_rows(month_rows, str(row[col]), i + 2)
+    windows = {}
+    for ym in _prefetch_months():
+        window = month_rows.get(ym)
+        if window:
+            windows[f"ord_m_{ym}"] = [title, [values[0]] + values[window[0] - 1:window[1]], window[0], [ORDER_WINDOW_TAG]]
+    return windows
+
+
+def _redact(values: List[List[str]]) -> List[List[str]]:
+    """values without the _SNAPSHOT_SECRET_COLUMNS."""
+    if not values:
+        return values
+    keep = [i for i, h in enumerate(values[0]) if h not in _SNAPSHOT_SECRET_COLUMNS]
+    if len(keep) == len(values[0]):
+        return values
+    return [[row[i] for i in keep if i < len(row)] for row in values]
+
+
+def _save_snapshot(sheets: Dict[str, list], parts: Optional[Dict[str, str]], source: Optional[str]):
+    """Write {cache key: [title, raw values, first row, tags]} of a prefetch
+    to CACHE_SNAPSHOT_FILE (atomically), without the secret columns."""
+    redacted = []
+    for key, sheet in sheets.items():
+        values = _redact(sheet[1])
+        if values is not sheet[1]:
+            sheets[key] = [sheet[0], values] + sheet[2:]
+            redacted.append(key)
+    snapshot = {
+        "format": _SNAPSHOT_FORMAT,
+        "spreadsheet_id": os.getenv("SPREADSHEET_ID"),
+        "layout": ORDERS_LAYOUT,
+        "saved_at": time.time(),
+        "source": source,
+        "sheets": sheets,
+        "redacted": redacted,
+        "partitions": parts,
+    }
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(CACHE_SNAPSHOT_FILE)), exist_ok=True)
+        tmp = CACHE_SNAPSHOT_FILE + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.chmod(tmp, 0o600)  # a leftover .tmp keeps its old mode
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, CACHE_SNAPSHOT_FILE)
+    except Exception as e:
+        print(f"[WARNING] Could not write cache snapshot: {e}")
+
+
+def load_cache_snapshot() -> int:
+    """Fill the cache from the last snapshot. Call once at startup, after
+    recover_order_queue() so queued saves are overlaid on the order indexes.
+    Returns the number of sheets restored."""
+    global _snapshot_restored
+    if not os.path.exists(CACHE_SNAPSHOT_FILE):
+        return 0
+    try:
+        with open(CACHE_SNAPSHOT_FILE, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        if (snapshot.get("format") != _SNAPSHOT_FORMAT
+                or snapshot.get("spreadsheet_id") != os.getenv("SPREADSHEET_ID")
+                or snapshot.get("layout") != ORDERS_LAYOUT):
+            print("[CACHE] Ignoring cache snapshot of another spreadsheet or format")
+            return 0
+        age = time.time() - snapshot["saved_at"]
+        if age > CACHE_SNAPSHOT_MAX_AGE:
+            print(f"[CACHE] Ignoring cache snapshot from {age / 3600:.1f}h ago")
+            return 0
+        # Connects on first use, so restored entries do not wait for it
+        wb = _DeferredWorkbook()
+        source = snapshot.get("source")
+        restored = {}
+        with _orders_lock:
+            if snapshot.get("partitions") is not None:
+                restored["ord_parts"] = _dcache_set("ord_parts", snapshot["partitions"], (_partitions_fetch(wb), None), source)
+            for key, (title, values, first_row, tags) in snapshot["sheets"].items():
+                restored[key] = _dcache_set(key, _entry_from_values(key, values, first_row),
+                                            _sheet_loader(wb, title, key), source, tags)
+        stale = time.time() - _DATA_TTL
+        for entry in restored.values():
+            entry.stored = stale  # revalidated on first use
+        for key in snapshot["redacted"]:
+            _snapshot_redacted[key] = restored[key]
+        _snapshot_restored = True
+        print(f"[CACHE] Restored {len(restored)} sheets from snapshot ({age:.0f}s old)")
+        return len(restored)
+    except Exception as e:
+        print(f"[WARNING] Could not load cache snapshot: {e}")
+        return 0
+
+
+class _DeferredWorkbook:
+    """Workbook that connects on first use. Handed out by get_db_connection()
+    after a snapshot restore until the first connection is made, so requests
+    answered from the cache never wait for authorization."""
+
+    def __getattr__(self, name):
+        wb = _connect()
+        if wb is None:
+            raise ConnectionError("No spreadsheet connection")
+        return getattr(wb, name)
 
 
 def get_db_connection():
-    """Connect to Google Sheets and return the workbook object (cached 30 min)."""
-    global _wb_instance, _wb_ts
+    """The workbook object, or None when Sheets is not configured. Right after
+    a snapshot restore this is a _DeferredWorkbook until the first connection
+    is made."""
+    wb = _wb_instance
+    if wb is not None:
+        return wb
+    if _snapshot_restored:
+        return _DeferredWorkbook()
+    return _connect()
+
+
+def connection_stats() -> Dict[str, Any]:
+    """Connection setup and token refresh counts and latencies (seconds)."""
+    stats = dict(_connection_stats)
+    creds = _wb_creds
+    stats["connected"] = _wb_instance is not None
+    stats["token_expires_in"] = round(_token_expires_in(creds)) if creds is not None and creds.expiry else None
+    return stats
+
+
+def _token_expires_in(creds) -> float:
+    # google-auth keeps expiry as naive UTC
+    return (creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+
+
+def _keep_token_fresh(creds):
+    """Background thread: refresh the access token TOKEN_REFRESH_MARGIN before it expires."""
+    http = Request()  # one keep-alive session for the token endpoint
+    while True:
+        wait = _token_expires_in(creds) - TOKEN_REFRESH_MARGIN if creds.expiry else 0
+        time.sleep(max(wait, 5))
+        started = time.perf_counter()
+        try:
+            creds.refresh(http)
+            _connection_stats["token_refreshes"] += 1
+            _connection_stats["last_token_refresh_seconds"] = round(time.perf_counter() - started, 3)
+        except Exception as e:
+            _connection_stats["token_refresh_failures"] += 1
+            print(f"[WARNING] Token refresh failed, retrying in {CONNECT_RETRY_SECONDS}s: {e}")
+            time.sleep(CONNECT_RETRY_SECONDS)
+
+
+def _connect():
+    """Open the spreadsheet, once; later calls return the same workbook."""
+    global _wb_instance, _wb_creds, _wb_failed_at, _wb_unavailable
     with _wb_lock:
-        if _wb_instance is not None and (time.time() - _wb_ts) < _WB_TTL:
+        if _wb_instance is not None:
             return _wb_instance
+        if time.time() - _wb_failed_at < CONNECT_RETRY_SECONDS:
+            if _wb_unavailable:
+                raise SheetsUnavailableError("Spreadsheet connection failed recently", retry_after=CONNECT_RETRY_SECONDS)
+            return None
+        _wb_failed_at = time.time()  # cleared on success
+        _wb_unavailable = False
+        started = time.perf_counter()
 
         scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
         creds = None
 
-        # Reload env just in case
-        load_dotenv()
         spreadsheet_id = os.getenv("SPREADSHEET_ID")
-        print(f"DEBUG: Using spreadsheet_id=[{spreadsheet_id}]")
         credentials_file = "lunch-order-app-484107-7b748f233fe2.json"
 
         # 1. Try environment variable (for Railway/Cloud)
@@ -90,30 +1069,43 @@ def get_db_connection():
             print("Warning: No Google Credentials found.")
             return None
 
-        client = gspread.authorize(creds)
         if not spreadsheet_id:
             print("Warning: SPREADSHEET_ID not set in .env")
             return None
 
+        creds = convert_credentials(creds)
+        session = AuthorizedSession(creds)
+        session.mount("https://", HTTPAdapter(pool_maxsize=SHEETS_HTTP_POOL_SIZE))
+        client = gspread.authorize(creds, http_client=GatedHTTPClient, session=session)
         try:
             wb = client.open_by_key(spreadsheet_id)
-            _wb_instance = wb
-            _wb_ts = time.time()
-            return wb
+        except SheetsUnavailableError:
+            _connection_stats["connect_failures"] += 1
+            _wb_unavailable = True
+            raise
         except Exception as e:
+            _connection_stats["connect_failures"] += 1
             print(f"Error connecting to spreadsheet {spreadsheet_id}: {e}")
             return None
+        _connection_stats["connects"] += 1
+        _connection_stats["last_connect_seconds"] = round(time.perf_counter() - started, 3)
+        _wb_instance, _wb_creds = wb, creds
+        _wb_failed_at = 0.0
+        threading.Thread(target=_keep_token_fresh, args=(creds,), daemon=True).start()
+        print(f"[INFO] Connected to spreadsheet in {_connection_stats['last_connect_seconds']}s")
+        return wb
 
 # --- New Optimized Data Access ---
 
-def get_kindergartens() -> List[KindergartenMaster]:
-    """Fetch all kindergartens from the flat 'kindergartens' sheet."""
-    try:
-        wb = get_db_connection()
-        if not wb: return []
-        records = _get_sheet_records(wb, "kindergartens", "kg")
-        print(f"[DEBUG] get_kindergartens: {len(records)} raw records from sheet")
+class _KindergartenDirectory:
+    """Validated kindergartens with lookups by kindergarten_id and login_id.
+
+    Built once per 'kg' load and never modified afterwards; when an id or
+    login_id appears twice the first row wins.
+    """
 
+    def __init__(self, records: List[Dict]):
+        print(f"[DEBUG] get_kindergartens: {len(records)} raw records from sheet")
         results = []
         for i, r in enumerate(records):
             kid_id = str(r.get("kindergarten_id", "")).strip()
@@ -123,89 +1115,131 @@ def get_kindergartens() -> List[KindergartenMaster]:
                 print(f"[DEBUG] Skipping row {i+2}: kindergarten_id={kid_id!r} name={name!r}")
                 continue
             try:
-                data = {
-                    "kindergarten_id": kid_id,
-                    "name": name,
-                    "login_id": str(r.get("login_id", "")).strip(),
-                    "password": str(r.get("password", "")).strip(),
-                    "service_mon": bool(r.get("mon", 1)),
-                    "service_tue": bool(r.get("tue", 1)),
-                    "service_wed": bool(r.get("wed", 1)),
-                    "service_thu": bool(r.get("thu", 1)),
-                    "service_fri": bool(r.get("fri", 1)),
-                    "service_sat": bool(r.get("sat", 0)),
-                    "service_sun": bool(r.get("sun", 0)),
-                    "services": [s.strip() for s in str(r.get("services", "")).split(",") if s.strip()],
-                    "has_soup": bool(r.get("has_soup", False)),
-                    "has_no_rice": bool(r.get("has_no_rice", False)),
-                    "curry_trigger": str(r.get("curry_trigger", "")),
-                    "contact_name": str(r.get("contact_name", "")),
-                    "contact_email": str(r.get("contact_email", "")),
-                    "icon_url": str(r.get("icon_url", "")),
-                    "classless_student_count": r.get("classless_student_count", 0),
-                    "classless_allergy_count": r.get("classless_allergy_count", 0),
-                    "classless_teacher_count": r.get("classless_teacher_count", 0),
-                    "plan_type": str(r.get("plan_type", "")),
-                    "address": str(r.get("address", "")),
-                    "area": str(r.get("area", "")),
-                }
-                results.append(KindergartenMaster(**data))
+                results.append(kindergarten_from_record(r))
             except Exception as row_err:
                 print(f"[WARNING] Skipping row {i+2} (kindergarten_id={kid_id!r}): {row_err}")
         print(f"[DEBUG] get_kindergartens: returning {len(results)} valid records")
-        return results
+        by_id: Dict[str, KindergartenMaster] = {}
+        by_login: Dict[str, KindergartenMaster] = {}
+        for k in results:
+            by_id.setdefault(k.kindergarten_id, k)
+            if k.login_id:
+                by_login.setdefault(k.login_id, k)
+        self.all = tuple(results)
+        self.by_id = MappingProxyType(by_id)
+        self.by_login = MappingProxyType(by_login)
+
+
+def _get_kindergarten_directory(credentials: bool = False) -> Optional[_KindergartenDirectory]:
+    """The kindergartens directory. With credentials=True entries restored
+    from the snapshot, which has no passwords, are read from the sheet first."""
+    wb = get_db_connection()
+    if not wb: return None
+    restored = _snapshot_redacted.get("kg")
+    if credentials and restored is not None:
+        if _cache.peek("kg") is restored:
+            _dcache_bust("kg")
+        _snapshot_redacted.pop("kg", None)
+    return _get_sheet_models(wb, "kindergartens", "kg", _KindergartenDirectory)
+
+
+def get_kindergartens() -> List[KindergartenMaster]:
+    """Fetch all kindergartens from the flat 'kindergartens' sheet."""
+    try:
+        directory = _get_kindergarten_directory(credentials=True)
+        return list(directory.all) if directory else []
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         print(f"Error in get_kindergartens: {e}")
         import traceback
         traceback.print_exc()
         return []
 
+def get_kindergarten(kindergarten_id: str) -> Optional[KindergartenMaster]:
+    """Look up one kindergarten by kindergarten_id (None if unknown)."""
+    try:
+        directory = _get_kindergarten_directory()
+        return directory.by_id.get(str(kindergarten_id)) if directory else None
+    except SheetsUnavailableError:
+        raise
+    except Exception as e:
+        print(f"Error in get_kindergarten: {e}")
+        return None
+
+def get_kindergarten_by_login(login_id: str) -> Optional[KindergartenMaster]:
+    """Look up one kindergarten by its login_id (None if unknown)."""
+    try:
+        directory = _get_kindergarten_directory(credentials=True)
+        return directory.by_login.get(str(login_id).strip()) if directory else None
+    except SheetsUnavailableError:
+        raise
+    except Exception as e:
+        print(f"Error in get_kindergarten_by_login: {e}")
+        return None
+
+def _kindergarten_name(kindergarten_id: str) -> str:
+    k = get_kindergarten(kindergarten_id)
+    return k.name if k else kindergarten_id
+
+class _ClassIndex:
+    """Class snapshots per kindergarten, sorted by effective_from.
+
+    Built once per 'classes' load: kindergarten_id -> sorted snapshot dates
+    and, in parallel, the classes of each snapshot (deduplicated by
+    class_name). Finding the snapshot in effect on a date is a bisect.
+    """
+
+    def __init__(self, records: List[Dict]):
+        by_kid: Dict[str, Dict[str, Dict[str, ClassMaster]]] = {}
+        valid = []
+        for i, r in enumerate(records):
+            try:
+                c = ClassMaster(**r)
+            except Exception as row_err:
+                print(f"[WARNING] Skipping classes row {i+2}: {row_err}")
+                continue
+            valid.append(c)
+            by_kid.setdefault(c.kindergarten_id, {}).setdefault(c.effective_from, {})[c.class_name] = c
+        self.all = tuple(valid)  # every valid row, in sheet order
+        self.dates: Dict[str, List[str]] = {}
+        self.snapshots: Dict[str, List[List[ClassMaster]]] = {}
+        for kid, snaps in by_kid.items():
+            self.dates[kid] = sorted(snaps)
+            self.snapshots[kid] = [list(snaps[d].values()) for d in self.dates[kid]]
+
+    def at(self, kindergarten_id: str, base_date: Optional[str] = None) -> List[ClassMaster]:
+        """Snapshot in effect on base_date (latest one if None or empty)."""
+        dates = self.dates.get(str(kindergarten_id))
+        if not dates:
+            return []
+        i = len(dates) if not base_date else bisect.bisect_right(dates, base_date)
+        return list(self.snapshots[str(kindergarten_id)][i - 1]) if i else []
+
+    def after(self, kindergarten_id: str, date: str) -> List[tuple]:
+        """(effective_from, classes) of every snapshot starting after date."""
+        dates = self.dates.get(str(kindergarten_id), [])
+        i = bisect.bisect_right(dates, date)
+        return list(zip(dates[i:], self.snapshots.get(str(kindergarten_id), [])[i:]))
+
+
+def _get_class_index(wb) -> _ClassIndex:
+    return _get_sheet_models(wb, "classes", "cls_raw", _ClassIndex)
+
+
 def get_classes_for_kindergarten(kindergarten_id: str, base_date: Optional[str] = None) -> List[ClassMaster]:
-    """Fetch classes for a specific kindergarten from the flat 'classes' sheet."""
+    """Fetch classes for a specific kindergarten from the flat 'classes' sheet.
+
+    Snapshot-based versioning: returns ALL classes of the latest snapshot whose
+    effective_from is <= base_date (the latest snapshot if base_date is None).
+    This respects deletions: a class removed in a newer snapshot won't appear.
+    """
     try:
         wb = get_db_connection()
         if not wb: return []
-        records = _get_sheet_records(wb, "classes", "cls_raw")
-
-        # Filter by kindergarten_id
-        results = []
-        for r in records:
-            if str(r.get("kindergarten_id")) == str(kindergarten_id):
-                results.append(ClassMaster(**r))
-        
-        if not results: return []
-
-        if not base_date:
-            # Return LATEST SNAPSHOT (all classes matching the latest effective_from date)
-            # This handles deletions: if a class is removed, it won't be in the new snapshot.
-            if not results: return []
-            
-            latest_date = max(c.effective_from for c in results)
-            snapshot_classes = [c for c in results if c.effective_from == latest_date]
-            
-            # Deduplicate within the snapshot (just in case of duplicate rows)
-            grouped = {}
-            for c in snapshot_classes:
-                grouped[c.class_name] = c
-            
-            return list(grouped.values())
-
-        # Versioning logic (snapshot-based):
-        # Find the latest snapshot date that is <= base_date, then return ALL classes from that snapshot.
-        # This respects deletions: if a class was removed in a newer snapshot, it won't appear.
-        candidate_dates = set(c.effective_from for c in results if c.effective_from <= base_date)
-        if not candidate_dates:
-            return []
-        
-        latest_snapshot_date = max(candidate_dates)
-        snapshot_classes = [c for c in results if c.effective_from == latest_snapshot_date]
-        
-        # Deduplicate within the snapshot (just in case)
-        grouped = {}
-        for c in snapshot_classes:
-            grouped[c.class_name] = c
-        
-        return list(grouped.values())
+        return _get_class_index(wb).at(kindergarten_id, base_date)
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         print(f"Error in get_classes_for_kindergarten: {e}")
         return []
@@ -215,71 +1249,100 @@ def get_pending_class_snapshots(kindergarten_id: str) -> List[Dict]:
     try:
         wb = get_db_connection()
         if not wb: return []
-        records = _get_sheet_records(wb, "classes", "cls_raw")
-
         today = datetime.now().strftime("%Y-%m-%d")
-        
-        # Find all classes for this kindergarten with effective_from > today
-        future_classes = []
-        for r in records:
-            if str(r.get("kindergarten_id")) == str(kindergarten_id):
-                ef = str(r.get("effective_from", ""))
-                if ef > today:
-                    future_classes.append(ClassMaster(**r))
-        
-        if not future_classes:
-            return []
-        
-        # Group by effective_from date
-        snapshots = {}
-        for c in future_classes:
-            if c.effective_from not in snapshots:
-                snapshots[c.effective_from] = []
-            snapshots[c.effective_from].append(c.model_dump())
-        
         # Return as list of {date, classes}
-        return [{"date": d, "classes": cls} for d, cls in sorted(snapshots.items())]
+        return [
+            {"date": d, "classes": [c.model_dump() for c in classes]}
+            for d, classes in _get_class_index(wb).after(kindergarten_id, today)
+        ]
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         print(f"Error in get_pending_class_snapshots: {e}")
         return []
 
+def _cell_data(value) -> Dict:
+    """CellData for appendCells, stored like a RAW values write."""
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": "" if value is None else str(value)}}
+
+
+def _edit_rows(ws, delete_rows: List[int], append_rows: List[List] = (),
+               update_rows: Optional[Dict[int, List]] = None):
+    """Overwrite, delete (0-based indexes into get_all_values()) and append
+    rows in a single spreadsheets.batchUpdate, touching only those rows.
+
+    Updates run first, then deletes bottom-up with contiguous rows merged into
+    one deleteDimension, so no edit shifts the rows a later one refers to.
+    """
+    requests = []
+    for r, row in sorted((update_rows or {}).items()):
+        requests.append({"updateCells": {
+            "start": {"sheetId": ws.id, "rowIndex": r, "columnIndex": 0},
+            "rows": [{"values": [_cell_data(v) for v in row]}],
+            "fields": "userEnteredValue",
+        }})
+    runs: List[List[int]] = []
+    for r in sorted(set(delete_rows), reverse=True):
+        if runs and runs[-1][0] == r + 1:
+            runs[-1][0] = r
+        else:
+            runs.append([r, r + 1])
+    for start, end in runs:
+        requests.append({"deleteDimension": {"range": {
+            "sheetId": ws.id, "dimension": "ROWS", "startIndex": start, "endIndex": end}}})
+    if append_rows:
+        requests.append({"appendCells": {
+            "sheetId": ws.id,
+            "rows": [{"values": [_cell_data(v) for v in row]} for row in append_rows],
+            "fields": "userEnteredValue",
+        }})
+    if requests:
+        ws.spreadsheet.batch_update({"requests": requests})
+
+
+# Held from reading the classes sheet to writing it, so row numbers found by
+# one edit are not shifted by a concurrent one
+_classes_lock = threading.Lock()
+
+
 def delete_pending_class_snapshot(kindergarten_id: str, date: str) -> bool:
     """Delete a specific future-dated class snapshot for a kindergarten."""
     try:
         wb = get_db_connection()
         if not wb: return False
-        ws = wb.worksheet("classes")
-        all_rows = ws.get_all_values()
-        headers = all_rows[0]
-
-        kid_idx = headers.index("kindergarten_id")
-        ef_idx = headers.index("effective_from") if "effective_from" in headers else -1
-
-        new_rows = [headers]
-        for i, row in enumerate(all_rows):
-            if i == 0: continue
-            while len(row) < len(headers):
-                row.append("")
-            is_same_kid = str(row[kid_idx]) == str(kindergarten_id)
-            is_same_date = ef_idx >= 0 and str(row[ef_idx]) == date
-            if is_same_kid and is_same_date:
-                continue  # Remove this row
-            new_rows.append(row)
-
-        ws.clear()
-        ws.batch_update([{'range': 'A1', 'values': new_rows}])
-        _dcache_bust("cls_raw")
+        ws = _worksheet(wb, "classes")
+        with _classes_lock:
+            all_rows = ws.get_all_values()
+            headers = all_rows[0]
+
+            kid_idx = headers.index("kindergarten_id")
+            ef_idx = headers.index("effective_from") if "effective_from" in headers else -1
+
+            to_delete = []
+            for i, row in enumerate(all_rows):
+                if i == 0: continue
+                while len(row) < len(headers):
+                    row.append("")
+                is_same_kid = str(row[kid_idx]) == str(kindergarten_id)
+                is_same_date = ef_idx >= 0 and str(row[ef_idx]) == date
+                if is_same_kid and is_same_date:
+                    to_delete.append(i)  # Remove this row
+
+            _edit_rows(ws, to_delete)
+            _dcache_bust("cls_raw")
         return True
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         print(f"Error in delete_pending_class_snapshot: {e}")
         return False
 
 ORDERS_BACKUP_SHEET = "orders_change_backup"
-BACKUP_HEADERS = [
-    "kindergarten_id", "snapshot_date", "date", "class_name",
-    "orig_student", "orig_allergy", "orig_teacher",
-    "applied_student", "applied_allergy", "applied_teacher",
-]
+_backup_lock = threading.Lock()  # like _classes_lock, for ORDERS_BACKUP_SHEET
 
 def backup_orders_for_class_change(
     kindergarten_id: str,
@@ -292,8 +1355,8 @@ def backup_orders_for_class_change(
         wb = get_db_connection()
         if not wb: return False
         try:
-            ws = wb.worksheet(ORDERS_BACKUP_SHEET)
-        except:
+            ws = _worksheet(wb, ORDERS_BACKUP_SHEET)
+        except gspread.exceptions.WorksheetNotFound:
             ws = wb.add_worksheet(title=ORDERS_BACKUP_SHEET, rows=2000, cols=len(BACKUP_HEADERS))
             ws.batch_update([{'range': 'A1', 'values': [BACKUP_HEADERS]}])
 
@@ -316,6 +1379,8 @@ def backup_orders_for_class_change(
         if new_rows:
             ws.append_rows(new_rows)
         return True
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         print(f"Error in backup_orders_for_class_change: {e}")
         return False
@@ -328,8 +1393,8 @@ def restore_orders_from_class_change(kindergarten_id: str, snapshot_date: str) -
         wb = get_db_connection()
         if not wb: return False
         try:
-            bws = wb.worksheet(ORDERS_BACKUP_SHEET)
-        except:
+            bws = _worksheet(wb, ORDERS_BACKUP_SHEET)
+        except gspread.exceptions.WorksheetNotFound:
             return True  # No backup sheet — nothing to restore
 
         backup_records = bws.get_all_records()
@@ -379,6 +1444,8 @@ def restore_orders_from_class_change(kindergarten_id: str, snapshot_date: str) -
         if orders_to_restore:
             batch_save_orders(orders_to_restore)
         return True
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         print(f"Error in restore_orders_from_class_change: {e}")
         return False
@@ -390,24 +1457,26 @@ def delete_orders_backup(kindergarten_id: str, snapshot_date: str) -> bool:
         wb = get_db_connection()
         if not wb: return False
         try:
-            ws = wb.worksheet(ORDERS_BACKUP_SHEET)
-        except:
+            ws = _worksheet(wb, ORDERS_BACKUP_SHEET)
+        except gspread.exceptions.WorksheetNotFound:
             return True
 
-        all_rows = ws.get_all_values()
-        if len(all_rows) < 2:
-            return True
-        headers = all_rows[0]
-        kid_idx = headers.index("kindergarten_id")
-        snap_idx = headers.index("snapshot_date")
-
-        new_rows = [headers] + [
-            row for row in all_rows[1:]
-            if not (str(row[kid_idx]) == str(kindergarten_id) and str(row[snap_idx]) == str(snapshot_date))
-        ]
-        ws.clear()
-        ws.batch_update([{'range': 'A1', 'values': new_rows}])
+        with _backup_lock:
+            all_rows = ws.get_all_values()
+            if len(all_rows) < 2:
+                return True
+            headers = all_rows[0]
+            kid_idx = headers.index("kindergarten_id")
+            snap_idx = headers.index("snapshot_date")
+
+            to_delete = [
+                i for i, row in enumerate(all_rows) if i > 0
+                and str(row[kid_idx]) == str(kindergarten_id) and str(row[snap_idx]) == str(snapshot_date)
+            ]
+            _edit_rows(ws, to_delete)
         return True
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         print(f"Error in delete_orders_backup: {e}")
         return False
@@ -416,107 +1485,333 @@ def delete_orders_backup(kindergarten_id: str, snapshot_date: str) -> bool:
 def get_orders_for_month(kindergarten_id: str, year: int, month: int) -> List[OrderData]:
     """Fetch orders for a specific kindergarten and month from the flat 'orders' sheet."""
     try:
-        cache_key = f"ord_{kindergarten_id}_{year}_{month}"
-        cached = _dcache_get(cache_key)
-        if cached is not None:
-            return cached
+        wb = get_db_connection()
+        if not wb: return []
+        return _get_month_orders(wb, year, month).for_month(kindergarten_id, year, month)
+    except SheetsUnavailableError:
+        raise
+    except Exception as e:
+        print(f"Error in get_orders_for_month: {e}")
+        return []
+
+def get_orders_by_kindergarten(year: int, month: int) -> Dict[str, List[OrderData]]:
+    """Fetch one month of orders for every kindergarten, keyed by kindergarten_id."""
+    try:
+        wb = get_db_connection()
+        if not wb: return {}
+        return _get_month_orders(wb, year, month).month_by_kindergarten(year, month)
+    except SheetsUnavailableError:
+        raise
+    except Exception as e:
+        print(f"Error in get_orders_by_kindergarten: {e}")
+        return {}
 
+def get_orders_for_date(date: str) -> List[OrderData]:
+    """Fetch all kindergartens' orders for a single date (YYYY-MM-DD)."""
+    try:
         wb = get_db_connection()
         if not wb: return []
-        records = _get_sheet_records(wb, "orders", "ord_raw")
+        return _get_month_orders(wb, int(date[:4]), int(date[5:7])).for_date(date)
+    except SheetsUnavailableError:
+        raise
+    except Exception as e:
+        print(f"Error in get_orders_for_date: {e}")
+        return []
 
-        # Filter by kindergarten_id and month
-        month_prefix = f"{year}-{month:02d}"
-        results = []
-        for r in records:
-            if str(r.get("kindergarten_id")) == str(kindergarten_id):
-                order_date = str(r.get("date", ""))
-                if order_date.startswith(month_prefix):
-                    results.append(OrderData(**r))
-
-        _dcache_set(cache_key, results)
-        return results
+def get_order_totals(by: List[str], year: Optional[int] = None, month: Optional[int] = None,
+                     date: Optional[str] = None) -> List[Dict]:
+    """Order counts summed per group of `by` dimensions (see order_totals.DIMENSIONS),
+    over one date, one month, or every order. Raises ValueError for unknown
+    dimensions or a malformed date/year/month."""
+    by = order_totals.check_dimensions(by)
+    order_totals.check_period(year, month, date)
+    try:
+        wb = get_db_connection()
+        if not wb: return []
+        areas = _kindergarten_areas(by)
+        if date:
+            return _get_month_orders(wb, int(date[:4]), int(date[5:7])).totals(by, date=date, areas=areas)
+        if year and month:
+            ym = f"{year}-{month:02d}"
+            return _get_month_orders(wb, year, month).totals(by, year_month=ym, areas=areas)
+        if ORDERS_LAYOUT == "monthly":
+            # Each partition has its own string table, so merge the per-month results
+            return order_totals.merge_totals(
+                (_get_partition_index(wb, m).totals(by, year_month=m, areas=areas)
+                 for m in sorted(_get_order_partitions(wb))), by)
+        return _get_order_index(wb).totals(by, areas=areas)
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
-        print(f"Error in get_orders_for_month: {e}")
+        print(f"Error in get_order_totals: {e}")
         return []
 
-def batch_save_orders(orders: List[Dict]) -> bool:
-    """
-    Save multiple orders efficiently.
-    If order_id exists, update. If not, append.
-    """
+def get_orders_with_totals(by: List[str], year: Optional[int] = None, month: Optional[int] = None,
+                           date: Optional[str] = None) -> Tuple[List[OrderData], List[Dict]]:
+    """The orders of one date or one month with their totals per `by`, both
+    from the same order index, so the totals always add up the listed orders.
+    Raises ValueError like get_order_totals, or when no period is given."""
+    by = order_totals.check_dimensions(by)
+    order_totals.check_period(year, month, date)
+    if not date and month is None:
+        raise ValueError("Give a date, or year and month.")
     try:
         wb = get_db_connection()
-        if not wb: return False
-        ws = wb.worksheet("orders")
-        
-        all_rows = ws.get_all_values()
-        headers = all_rows[0]
-        id_col = headers.index("order_id") + 1
-        
-        # Map existing IDs to row indices
-        existing_ids = {row[id_col-1]: i+1 for i, row in enumerate(all_rows) if i > 0}
-        
-        updates = []
-        new_rows = []
-        
-        for order in orders:
-            # Add updated_at
-            order["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Construct row list
-            row_vals = []
-            for h in headers:
-                row_vals.append(order.get(h, ""))
-            
-            oid = order.get("order_id")
-            if oid in existing_ids:
-                row_idx = existing_ids[oid]
-                # Update entire row
-                range_label = f"A{row_idx}:{gspread.utils.rowcol_to_a1(row_idx, len(headers))}"
-                updates.append({'range': range_label, 'values': [row_vals]})
-            else:
-                new_rows.append(row_vals)
-                
+        if not wb: return [], []
+        areas = _kindergarten_areas(by)
+        if date:
+            index = _get_month_orders(wb, int(date[:4]), int(date[5:7]))
+            return index.orders_with_totals(by, date=date, areas=areas)
+        return _get_month_orders(wb, year, month).orders_with_totals(by, year_month=f"{year}-{month:02d}", areas=areas)
+    except SheetsUnavailableError:
+        raise
+    except Exception as e:
+        print(f"Error in get_orders_with_totals: {e}")
+        return [], []
+
+def _kindergarten_areas(by: List[str]) -> Optional[Dict[str, str]]:
+    """kindergarten_id -> area when totals are grouped by area."""
+    if "area" not in by:
+        return None
+    directory = _get_kindergarten_directory()
+    return {kid: k.area for kid, k in directory.by_id.items()} if directory else {}
+
+def _appended_start_row(response) -> Optional[int]:
+    """First row number written by append_rows, parsed from its response."""
+    try:
+        updated_range = response["updates"]["updatedRange"]
+        return gspread.utils.a1_to_rowcol(updated_range.split("!")[-1].split(":")[0])[0]
+    except Exception:
+        return None
+
+
+_orders_lock = threading.RLock()
+
+def _plan_rows(index: _OrderIndex, orders: List[Dict]) -> tuple:
+    """({sheet row: (order_id, row values)} for orders the index has a row for,
+    [(row values, order)] for the rest)."""
+    updates: Dict[int, tuple] = {}
+    appends = []
+    for order in orders:
+        row_vals = [order.get(h, "") for h in index.headers]
+        row_idx = index.row_of(order)
+        if row_idx:
+            updates[row_idx] = (str(order.get("order_id")), row_vals)
+        else:
+            appends.append((row_vals, order))
+    return updates, appends
+
+
+def _rows_hold_ids(ws, headers: List[str], expected: Dict[int, str], column: str = "order_id") -> bool:
+    """Whether each sheet row still holds the expected id (order_id, or the
+    given column): one batch_get of just those cells of the id column."""
+    if column not in headers:
+        return False
+    letter = _column_letter(headers.index(column) + 1)
+    runs: List[List[int]] = []
+    for r in sorted(expected):
+        if runs and runs[-1][1] == r - 1:
+            runs[-1][1] = r
+        else:
+            runs.append([r, r])
+    blocks = list(ws.batch_get([f"{letter}{a}:{letter}{b}" for a, b in runs]))
+    if len(blocks) != len(runs):
+        return False
+    for (a, b), block in zip(runs, blocks):
+        for r in range(a, b + 1):
+            cells = block[r - a] if r - a < len(block) else []
+            if str(cells[0] if cells else "") != expected[r]:
+                return False
+    return True
+
+
+def _load_for_write(cache_key: str, load) -> tuple:
+    """(load(), whether it was read from the sheet just now rather than cached)."""
+    entry = _cache.peek(cache_key)
+    fresh = entry is None or entry.age >= entry.max_age
+    return load(), fresh
+
+
+def _write_rows(ws, orders: List[Dict], cache_key: str, load, loaded: Optional[tuple] = None):
+    """One batch_update for rows the index already knows, one append_rows for
+    the rest. load() returns the index cached under cache_key, reading the
+    sheet (or just a month's rows) when it is not cached. Caller holds
+    _orders_lock.
+
+    Rows taken from a cached index are checked first: if any no longer holds
+    its order (rows deleted, inserted or sorted by hand), the index is
+    dropped, loaded again and the rows are looked up again. An index just
+    read needs no check. loaded: _load_for_write() result, if already taken."""
+    index, fresh = loaded or _load_for_write(cache_key, load)
+    updates, appends = _plan_rows(index, orders)
+    if updates and not fresh and not _rows_hold_ids(ws, index.headers, {r: oid for r, (oid, _) in updates.items()}):
+        print(f"[INFO] {ws.title} rows moved since the row map was loaded, reloading it")
+        _dcache_bust(cache_key, "ord_months")
+        index = load()
+        updates, appends = _plan_rows(index, orders)
+
+    headers = index.headers
+    updates = [{'range': f"A{r}:{gspread.utils.rowcol_to_a1(r, len(headers))}", 'values': [row_vals]}
+               for r, (_, row_vals) in sorted(updates.items())]
+    new_rows = [row_vals for row_vals, _ in appends]
+    new_orders = [order for _, order in appends]
+
+    try:
         # Perform updates in batch
         if updates:
             ws.batch_update(updates)
 
         # Append new rows in one go
         if new_rows:
-            ws.append_rows(new_rows)
+            _dcache_bust("ord_months")
+            response = ws.append_rows(new_rows)
+            start = _appended_start_row(response)
+            if cache_key.startswith("ord_m_") and start is not None:
+                # A month window does not know where the sheet ends: take the rows written
+                index.record_appended(new_orders, start)
+            elif start is None or start != index.row_count + 2:
+                # Rows were added or removed behind our back: rebuild the map on next use
+                print(f"[INFO] {ws.title} row map is stale, reloading on next access")
+                _dcache_bust(cache_key)
+            else:
+                index.record_appended(new_orders)
+    except Exception:
+        _dcache_bust(cache_key)
+        raise
 
-        # Bust order cache
-        kid_id = orders[0]['kindergarten_id'] if orders else None
-        _dcache_bust("ord_raw")
-        if kid_id:
-            _dcache_bust(f"ord_{kid_id}_")
 
-        # Notification trigger
+def _write_orders(orders: List[Dict]):
+    """Write queued orders to the sheet(s). Raises on failure so the queue
+    retries; rows already written are then rewritten in place. Notifications
+    are sent by the queue once the flush is done (_notify_orders)."""
+    wb = get_db_connection()
+    if not wb:
+        raise RuntimeError("No spreadsheet connection")
+
+    by_month: Dict[str, List[Dict]] = {}
+    undated = []
+    for order in orders:
+        ym = str(order.get("date", ""))[:7]
+        if _YEAR_MONTH_RE.match(ym):
+            by_month.setdefault(ym, []).append(order)
+        else:
+            undated.append(order)
+
+    with _orders_lock:
+        if ORDERS_LAYOUT == "monthly":
+            for order in undated:
+                print(f"[WARNING] Skipping order {order.get('order_id')}: invalid date {order.get('date')!r}")
+            for ym, month_orders in sorted(by_month.items()):
+                key, load = f"ord_p_{ym}", lambda: _get_partition_index(wb, ym)
+                # Index before sheet: a month without a sheet yet needs no read
+                loaded = _load_for_write(key, load)
+                _write_rows(_get_partition_sheet(wb, ym), month_orders, key, load, loaded)
+            return
+        ws = _worksheet(wb, "orders")
+        if _dcache_get("ord_raw") is not None or undated:
+            _write_rows(ws, orders, "ord_raw", lambda: _get_order_index(wb))
+            if by_month:
+                # Month windows loaded earlier do not know the rows appended now
+                _dcache_bust(*[f"ord_m_{ym}" for ym in by_month])
+            return
+        # Row numbers from the month windows (read only if not cached), not the whole sheet
+        for ym, month_orders in sorted(by_month.items()):
+            year, month = int(ym[:4]), int(ym[5:7])
+            _write_rows(ws, month_orders, f"ord_m_{ym}", lambda: _get_month_orders(wb, year, month))
+
+
+def _notify_orders(orders: List[Dict]):
+    """Admin notification for written orders, run by the queue after a flush."""
+    # Notification trigger: one per kindergarten per flush
+    by_kid: Dict[str, List[Dict]] = {}
+    for order in orders:
+        by_kid.setdefault(order.get("kindergarten_id"), []).append(order)
+    for kid_id, kid_orders in by_kid.items():
         try:
             from backend.notifications import send_admin_notification
-            kid_id = orders[0]['kindergarten_id']
-            # Determine if this is a monthly setup or daily change
-            is_bulk = len(orders) > 10
-            action = "マンスリー申請" if is_bulk else "日次注文変更"
-            
-            # Get Name
-            all_k = get_kindergartens()
-            k_name = next((k.name for k in all_k if k.kindergarten_id == kid_id), kid_id)
-            
-            details = f"件数: {len(orders)}件\n"
-            if not is_bulk:
-                 details += f"日付: {orders[0].get('date', '---')}\nクラス: {orders[0].get('class_name', '---')}"
-            
-            send_admin_notification(action, k_name, details)
+            with sheets_priority(PRIORITY_NOTIFICATION):
+                # Determine if this is a monthly setup or daily change
+                is_bulk = len(kid_orders) > 10
+                action = "マンスリー申請" if is_bulk else "日次注文変更"
+
+                # Get Name
+                k_name = _kindergarten_name(kid_id)
+
+                details = f"件数: {len(kid_orders)}件\n"
+                if not is_bulk:
+                    details += "\n".join(
+                        f"日付: {o.get('date', '---')}\nクラス: {o.get('class_name', '---')}" for o in kid_orders
+                    )
+
+                send_admin_notification(action, k_name, details)
         except Exception as ne:
             print(f"[ERROR] Notification failed: {ne}")
 
+
+ORDER_QUEUE_FILE = os.getenv("ORDER_QUEUE_FILE", os.path.join(os.path.dirname(__file__), '..', 'data', 'order_queue.jsonl'))
+ORDER_FLUSH_SECONDS = 2.0
+
+
+def _rejected_write(e: Exception) -> bool:
+    """A 4xx the sheet will keep returning for these rows; quota and auth errors
+    affect every write and are retried instead."""
+    return isinstance(e, gspread.exceptions.APIError) and 400 <= e.code < 500 and e.code not in (401, 403, 408, 429)
+
+
+_order_queue = WriteBehindQueue(_write_orders, ORDER_QUEUE_FILE, window=ORDER_FLUSH_SECONDS,
+                                on_written=_notify_orders, is_permanent=_rejected_write)
+
+def batch_save_orders(orders: List[Dict]) -> bool:
+    """
+    Save multiple orders efficiently.
+    If order_id exists, update. If not, append.
+    Orders are journaled to disk and applied to the cache immediately, then
+    written to the sheet by the write-behind queue, which merges saves that
+    arrive within ORDER_FLUSH_SECONDS (last write per order_id wins).
+    """
+    try:
+        rows = []
+        for order in orders:
+            # Add updated_at
+            order["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            rows.append({k: ("" if v is None else v) for k, v in order.items()})
+        saved = [OrderData(**r) for r in rows]
+
+        _order_queue.submit(rows)
+
+        # Read-your-writes: readers see queued orders before they reach the sheet.
+        # An index being loaded meanwhile picks them up when it is stored (_dcache_set)
+        months = sorted({o.date[:7] for o in saved})
+        for key in ["ord_raw"] + [f"ord_m_{m}" for m in months] + [f"ord_p_{m}" for m in months]:
+            index = _dcache_get(key)
+            if index is not None:
+                index.put(saved)
         return True
     except Exception as e:
         print(f"Error in batch_save_orders: {e}")
         return False
 
+def flush_order_queue() -> bool:
+    """Write all queued order saves now (shutdown, tests, admin tools)."""
+    return _order_queue.flush()
+
+def recover_order_queue() -> int:
+    """Replay order saves journaled by a previous process. Call once at startup."""
+    count = _order_queue.recover()
+    if count:
+        print(f"[QUEUE] Recovered {count} queued order saves")
+    return count
+
+def startup():
+    """Replay the queue journal, then serve from the last cache snapshot right
+    away (the queued saves are overlaid on its order indexes)."""
+    recover_order_queue()
+    load_cache_snapshot()
+
+def shutdown():
+    """Write out order saves still waiting in the write-behind queue."""
+    flush_order_queue()
+
 def update_kindergarten_classes(kindergarten_id: str, classes: List[Dict], scheduled_date: str = None) -> bool:
     """Batch update or replace classes for a kindergarten.
     
@@ -528,67 +1823,59 @@ def update_kindergarten_classes(kindergarten_id: str, classes: List[Dict], sched
     try:
         wb = get_db_connection()
         if not wb: return False
-        ws = wb.worksheet("classes")
-        all_rows = ws.get_all_values()
-        headers = all_rows[0]
-        
-        # Ensure effective_from header exists if missing (migration)
-        if "effective_from" not in headers:
-            headers.append("effective_from")
-            ws.batch_update([{'range': 'A1', 'values': [headers]}])
+        ws = _worksheet(wb, "classes")
+        with _classes_lock:
             all_rows = ws.get_all_values()
             headers = all_rows[0]
+        
+            # Ensure effective_from header exists if missing (migration)
+            if "effective_from" not in headers:
+                headers.append("effective_from")
+                ws.batch_update([{'range': 'A1', 'values': [headers]}])
+                all_rows = ws.get_all_values()
+                headers = all_rows[0]
+
+            kid_idx = headers.index("kindergarten_id")
+            ef_idx = headers.index("effective_from") if "effective_from" in headers else -1
+
+            if scheduled_date:
+                # === SCHEDULED MODE ===
+                # Remove only this kindergarten's rows with the same effective_from date.
+                # This preserves the current snapshot and other scheduled snapshots.
+                target_effective_date = scheduled_date
+            else:
+                # === IMMEDIATE MODE (existing behavior) ===
+                # Remove ALL rows for this kindergarten, use first of current month.
+                # Using month-start so the frontend (which queries with month-01) can always find these classes.
+                target_effective_date = datetime.now().strftime("%Y-%m-01")
 
-        kid_idx = headers.index("kindergarten_id")
-        ef_idx = headers.index("effective_from") if "effective_from" in headers else -1
-
-        if scheduled_date:
-            # === SCHEDULED MODE ===
-            # Keep all rows EXCEPT this kindergarten's rows with the same effective_from date.
-            # This preserves the current snapshot and other scheduled snapshots.
-            target_effective_date = scheduled_date
-            new_all_rows = [headers]
-            
-            for i, row in enumerate(all_rows):
-                if i == 0: continue
-                while len(row) < len(headers):
-                    row.append("")
-                # Remove only rows matching BOTH this kindergarten AND this effective_from date
-                is_same_kid = str(row[kid_idx]) == str(kindergarten_id)
-                is_same_date = ef_idx >= 0 and str(row[ef_idx]) == scheduled_date
-                if is_same_kid and is_same_date:
-                    continue  # Skip — will be replaced
-                new_all_rows.append(row)
-        else:
-            # === IMMEDIATE MODE (existing behavior) ===
-            # Remove ALL rows for this kindergarten, use first of current month.
-            # Using month-start so the frontend (which queries with month-01) can always find these classes.
-            target_effective_date = datetime.now().strftime("%Y-%m-01")
-            new_all_rows = [headers]
-            
+            to_delete = []
             for i, row in enumerate(all_rows):
                 if i == 0: continue
                 if str(row[kid_idx]) != str(kindergarten_id):
-                    while len(row) < len(headers):
-                        row.append("")
-                    new_all_rows.append(row)
-        
-        # Add the new/updated classes for THIS kindergarten and THIS date
-        for c in classes:
-            row_vals = []
-            for h in headers:
-                val = c.get(h, "")
-                if h == "kindergarten_id": val = kindergarten_id
-                if h == "effective_from": val = target_effective_date
-                row_vals.append(val)
-            new_all_rows.append(row_vals)
-            
-        # Overwrite the sheet
-        ws.clear()
-        if new_all_rows:
-            ws.batch_update([{'range': 'A1', 'values': new_all_rows}])
-        _dcache_bust("cls_raw")
+                    continue
+                # Scheduled: only rows matching BOTH this kindergarten AND this effective_from date
+                if scheduled_date and not (ef_idx < len(row) and str(row[ef_idx]) == scheduled_date):
+                    continue
+                to_delete.append(i)  # will be replaced
+
+            # Add the new/updated classes for THIS kindergarten and THIS date
+            new_rows = []
+            for c in classes:
+                row_vals = []
+                for h in headers:
+                    val = c.get(h, "")
+                    if h == "kindergarten_id": val = kindergarten_id
+                    if h == "effective_from": val = target_effective_date
+                    row_vals.append(val)
+                new_rows.append(row_vals)
+
+            # Touch only this kindergarten's rows; other kindergartens are left as they are
+            _edit_rows(ws, to_delete, new_rows)
+            _dcache_bust("cls_raw")
         return True
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         print(f"Error in update_kindergarten_classes: {e}")
         return False
@@ -598,45 +1885,48 @@ def update_class_counts(kindergarten_id: str, class_name: str, counts: Dict) ->
     try:
         wb = get_db_connection()
         if not wb: return False
-        ws = wb.worksheet("classes")
+        ws = _worksheet(wb, "classes")
         
-        records = ws.get_all_records()
-        headers = ws.row_values(1)
+        with _classes_lock:
+            records = ws.get_all_records()
+            headers = _sheet_headers(wb, "classes", records)
         
-        # Find row
-        row_idx = -1
-        for i, r in enumerate(records):
-            if str(r.get("kindergarten_id")) == str(kindergarten_id) and r.get("class_name") == class_name:
-                row_idx = i + 2
-                break
+            # Find row
+            row_idx = -1
+            for i, r in enumerate(records):
+                if str(r.get("kindergarten_id")) == str(kindergarten_id) and r.get("class_name") == class_name:
+                    row_idx = i + 2
+                    break
         
-        if row_idx == -1: return False
+            if row_idx == -1: return False
         
-        # Update cells
-        updates = []
-        for key, val in counts.items():
-            if key in headers:
-                col_idx = headers.index(key) + 1
-                updates.append({
-                    'range': gspread.utils.rowcol_to_a1(row_idx, col_idx),
-                    'values': [[val]]
-                })
+            # Update cells
+            updates = []
+            for key, val in counts.items():
+                if key in headers:
+                    col_idx = headers.index(key) + 1
+                    updates.append({
+                        'range': gspread.utils.rowcol_to_a1(row_idx, col_idx),
+                        'values': [[val]]
+                    })
         
-        if updates:
-            ws.batch_update(updates)
-        _dcache_bust("cls_raw")
+            if updates:
+                ws.batch_update(updates)
+            _dcache_bust("cls_raw")
 
         # Notification trigger
         try:
             from backend.notifications import send_admin_notification
-            all_k = get_kindergartens()
-            k_name = next((k.name for k in all_k if k.kindergarten_id == kindergarten_id), kindergarten_id)
-            details = f"クラス名: {class_name}\n更新項目: {list(counts.keys())}"
-            send_admin_notification("クラス人数更新", k_name, details)
+            with sheets_priority(PRIORITY_NOTIFICATION):
+                k_name = _kindergarten_name(kindergarten_id)
+                details = f"クラス名: {class_name}\n更新項目: {list(counts.keys())}"
+                send_admin_notification("クラス人数更新", k_name, details)
         except Exception as ne:
             print(f"[ERROR] Notification failed: {ne}")
 
         return True
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         print(f"Error in update_class_counts: {e}")
         return False
@@ -646,10 +1936,10 @@ def update_kindergarten_master(data: Dict) -> bool:
     try:
         wb = get_db_connection()
         if not wb: return False
-        ws = wb.worksheet("kindergartens")
+        ws = _worksheet(wb, "kindergartens")
         
         records = ws.get_all_records()
-        headers = ws.row_values(1)
+        headers = _sheet_headers(wb, "kindergartens", records)
         
         kid = data.get("kindergarten_id")
         if not kid: return False
@@ -663,21 +1953,7 @@ def update_kindergarten_master(data: Dict) -> bool:
         
         if row_idx == -1: return False
         
-        mapping = {
-            "name": "name",
-            "login_id": "login_id", "password": "password",
-            "service_mon": "mon", "service_tue": "tue", "service_wed": "wed",
-            "service_thu": "thu", "service_fri": "fri", "service_sat": "sat", "service_sun": "sun",
-            "has_soup": "has_soup", "has_no_rice": "has_no_rice", "curry_trigger": "curry_trigger",
-            "plan_type": "plan_type",
-            "contact_name": "contact_name", "contact_email": "contact_email",
-            "icon_url": "icon_url",
-            "classless_student_count": "classless_student_count",
-            "classless_allergy_count": "classless_allergy_count",
-            "classless_teacher_count": "classless_teacher_count",
-            "address": "address",
-            "area": "area",
-        }
+        mapping = KINDERGARTEN_COLUMNS
         
         updates = []
         for api_key, sheet_key in mapping.items():
@@ -738,6 +2014,7 @@ def update_kindergarten_master(data: Dict) -> bool:
             if new_col_updates:
                 ws.batch_update(new_col_updates)
             headers = headers + missing_cols
+            _set_sheet_headers(wb, "kindergartens", headers)
 
         if updates:
             ws.batch_update(updates)
@@ -745,15 +2022,17 @@ def update_kindergarten_master(data: Dict) -> bool:
 
         try:
             from backend.notifications import send_admin_notification
-            kid_id = data.get('kindergarten_id')
-            all_k = get_kindergartens()
-            k_name = next((k.name for k in all_k if k.kindergarten_id == kid_id), kid_id)
-            tracked_keys = set(mapping.keys()) | {"services"}
-            updated_keys = [k for k in data if k in tracked_keys]
-            send_admin_notification("園情報・設定更新", k_name, f"更新内容: {updated_keys}")
+            with sheets_priority(PRIORITY_NOTIFICATION):
+                kid_id = data.get('kindergarten_id')
+                k_name = _kindergarten_name(kid_id)
+                tracked_keys = set(mapping.keys()) | {"services"}
+                updated_keys = [k for k in data if k in tracked_keys]
+                send_admin_notification("園情報・設定更新", k_name, f"更新内容: {updated_keys}")
         except Exception as ne:
             print(f"[ERROR] Notification failed: {ne}")
         return True
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         print(f"Error in update_kindergarten_master: {e}")
         import traceback
@@ -766,51 +2045,90 @@ def get_system_settings() -> Dict:
         wb = get_db_connection()
         if not wb: return {}
         try:
-            ws = wb.worksheet("admin_settings")
-        except:
+            records = _get_sheet_records(wb, "admin_settings", "settings")
+        except gspread.exceptions.WorksheetNotFound:
             # Create if missing
             ws = wb.add_worksheet(title="admin_settings", rows=10, cols=2)
             ws.batch_update([{'range': 'A1', 'values': [["key", "value"], ["admin_emails", "admin@example.com"], ["reminder_days", "5,3"]]}])
-            
-        records = ws.get_all_records()
+            records = ws.get_all_records()
+            _dcache_set("settings", records)
         return {r["key"]: r["value"] for r in records}
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         print(f"Error in get_system_settings: {e}")
         return {}
 
-MONTHLY_COMMON_PREFIX = "monthly_common_"
 
 def get_monthly_common_items() -> List[Dict]:
     """Return all stored monthly common items as a list sorted by year_month desc."""
-    settings = get_system_settings()
-    items = []
-    for key, val in settings.items():
-        if key.startswith(MONTHLY_COMMON_PREFIX):
-            ym = key[len(MONTHLY_COMMON_PREFIX):]
-            if val:
-                items.append({"year_month": ym, "item": str(val)})
-    items.sort(key=lambda x: x["year_month"], reverse=True)
-    return items
+    return SystemSettings(**get_system_settings()).monthly_common_items()
 
-def update_monthly_common_item(item: str, year_month: str) -> bool:
-    """Upsert the monthly common item for a specific year_month."""
-    try:
-        wb = get_db_connection()
-        if not wb: return False
+_settings_lock = threading.Lock()
+
+
+def _plan_settings(records: List[Dict], values: Dict, delete: List[str]) -> tuple:
+    """(record indexes to delete, {0-based sheet row: [key, value]} to update,
+    [key, value] rows to append) for upserting values and deleting keys."""
+    rows = {str(r.get("key")): i for i, r in enumerate(records) if r.get("key") != ""}
+    dropped = sorted({rows[k] for k in delete if k in rows})
+    updates, appends = {}, {}
+    for key, value in values.items():
+        key, value = str(key), str(value)
+        if key in rows:
+            updates[rows[key] + 1] = [key, value]
+        else:
+            appends[key] = [key, value]
+    return dropped, updates, list(appends.values())
+
+
+def _write_settings(wb, values: Optional[Dict] = None, delete: List[str] = ()):
+    """Upsert and delete admin_settings keys in one write: existing keys are
+    overwritten in their own row, new keys appended, deleted keys' rows
+    removed. Other keys are never rewritten, so concurrent saves of different
+    settings do not clobber each other.
+
+    Rows are located through the cached records (record i is sheet row i + 2),
+    which are then updated to match instead of being read again. The key
+    cells of the rows to update or delete are checked first (one small
+    batch_get); if a hand edit or sort moved them, the sheet is read again.
+    """
+    with _settings_lock:
         try:
-            ws = wb.worksheet("admin_settings")
-        except:
+            ws = _worksheet(wb, "admin_settings")
+        except gspread.exceptions.WorksheetNotFound:
             ws = wb.add_worksheet(title="admin_settings", rows=20, cols=2)
             ws.batch_update([{'range': 'A1', 'values': [["key", "value"]]}])
+            _dcache_set("settings", [])
+        records = list(_get_sheet_records(wb, "admin_settings", "settings"))
+        dropped, updates, appends = _plan_settings(records, values or {}, delete)
+        targets = {i + 2: str(records[i]["key"]) for i in dropped + [r - 1 for r in updates]}
+        if targets and not _rows_hold_ids(ws, ["key"], targets, "key"):
+            print("[INFO] admin_settings rows moved, reloading")
+            records = _records_from_values(ws.get_all_values())
+            dropped, updates, appends = _plan_settings(records, values or {}, delete)
+        if not (updates or appends or dropped):
+            return
+        for row, (key, value) in updates.items():
+            records[row - 1] = {**records[row - 1], "key": key, "value": numericise_all([value])[0]}
+        records += [{"key": key, "value": numericise_all([value])[0]} for key, value in appends]
+        _edit_rows(ws, [i + 1 for i in dropped], appends, updates)
+        for i in reversed(dropped):
+            del records[i]
+        # Replace (not patch) the entry so a refresh that read the old rows is dropped
+        _dcache_bust("settings")
+        _dcache_set("settings", records, _sheet_loader(wb, "admin_settings", "settings"))
 
-        records = ws.get_all_records()
-        settings = {r["key"]: r["value"] for r in records if r.get("key")}
-        settings[f"{MONTHLY_COMMON_PREFIX}{year_month}"] = item
 
-        all_rows = [["key", "value"]] + [[k, str(v)] for k, v in settings.items()]
-        ws.clear()
-        ws.batch_update([{'range': 'A1', 'values': all_rows}])
+def update_monthly_common_item(item: str, year_month: str) -> bool:
+    """Upsert the monthly common item for a specific year_month."""
+    try:
+        wb = get_db_connection()
+        if not wb: return False
+        _write_settings(wb, {f"{MONTHLY_COMMON_PREFIX}{year_month}": item})
         return True
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         print(f"Error in update_monthly_common_item: {e}")
         return False
@@ -821,34 +2139,26 @@ def delete_monthly_common_item(year_month: str) -> bool:
         wb = get_db_connection()
         if not wb: return False
         try:
-            ws = wb.worksheet("admin_settings")
-        except:
+            _worksheet(wb, "admin_settings")
+        except gspread.exceptions.WorksheetNotFound:
             return True
-        records = ws.get_all_records()
-        settings = {r["key"]: r["value"] for r in records if r.get("key")}
-        settings.pop(f"{MONTHLY_COMMON_PREFIX}{year_month}", None)
-        all_rows = [["key", "value"]] + [[k, str(v)] for k, v in settings.items()]
-        ws.clear()
-        ws.batch_update([{'range': 'A1', 'values': all_rows}])
+        _write_settings(wb, delete=[f"{MONTHLY_COMMON_PREFIX}{year_month}"])
         return True
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         print(f"Error in delete_monthly_common_item: {e}")
         return False
 
 def update_system_settings(data: Dict) -> bool:
-    """Update system-wide settings."""
+    """Update the given system-wide settings; keys not in data are kept."""
     try:
         wb = get_db_connection()
         if not wb: return False
-        ws = wb.worksheet("admin_settings")
-        
-        all_rows = [["key", "value"]]
-        for k, v in data.items():
-            all_rows.append([k, str(v)])
-            
-        ws.clear()
-        ws.batch_update([{'range': 'A1', 'values': all_rows}])
+        _write_settings(wb, data)
         return True
+    except SheetsUnavailableError:
+        raise
     except Exception as e:
         print(f"Error in update_system_settings: {e}")
         return False
@@ -869,5 +2179,4 @@ def get_class_master() -> List[ClassMaster]:
     # This might need to be filtered in calling code or rewritten
     wb = get_db_connection()
     if not wb: return []
-    ws = wb.worksheet("classes")
-    return [ClassMaster(**r) for r in ws.get_all_records()]
+    return list(_get_class_index(wb).all)
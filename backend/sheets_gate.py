@@ -0,0 +1,162 @@
+"""Quota-aware gate for every Google Sheets API request.
+
+gspread sends all of its HTTP requests through GatedHTTPClient.request, which:
+
+- meters reads (GET) and writes (everything else) with per-minute token
+  buckets sized to the Sheets quotas (SHEETS_READ_QUOTA / SHEETS_WRITE_QUOTA),
+- serves interactive requests first: background cache refreshes may only take
+  a token while a reserve is left, and notification lookups keep back a larger
+  one, so they queue behind user-facing work,
+- retries 429/5xx responses and connection errors with jittered exponential
+  backoff; writes that are not idempotent (appends, row deletes/inserts) are
+  only retried on 429, since a 5xx or timeout may come after the server
+  applied them,
+- raises SheetsUnavailableError when the quota wait or the retries run out,
+  so callers can answer 503 instead of treating it as "no data".
+"""
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import requests
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+
+READ_QUOTA_PER_MINUTE = int(os.getenv("SHEETS_READ_QUOTA", "60"))
+WRITE_QUOTA_PER_MINUTE = int(os.getenv("SHEETS_WRITE_QUOTA", "60"))
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_REFRESH = 1
+PRIORITY_NOTIFICATION = 2
+
+# Share of each bucket a priority must leave untouched for the ones above it
+_RESERVE = {PRIORITY_INTERACTIVE: 0.0, PRIORITY_REFRESH: 0.25, PRIORITY_NOTIFICATION: 0.5}
+# How long a request may wait for a token before giving up
+_MAX_WAIT = {PRIORITY_INTERACTIVE: 20.0, PRIORITY_REFRESH: 60.0, PRIORITY_NOTIFICATION: 120.0}
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 0.5  # seconds
+BACKOFF_MAX = 32.0
+
+_priority: ContextVar[int] = ContextVar("sheets_priority", default=PRIORITY_INTERACTIVE)
+
+
+class SheetsUnavailableError(Exception):
+    """Google Sheets could not serve the request (quota exhausted or persistent errors)."""
+
+    def __init__(self, message: str, retry_after: int = 30):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@contextmanager
+def sheets_priority(level: int):
+    """Run the enclosed Sheets calls at the given priority (current thread only)."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Per-minute token bucket where lower priorities keep a reserve for higher ones."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority: int = PRIORITY_INTERACTIVE, timeout: float = None) -> bool:
+        needed = 1 + self.capacity * _RESERVE[priority]
+        deadline = time.monotonic() + (_MAX_WAIT[priority] if timeout is None else timeout)
+        with self._cond:
+            while True:
+                self._refill()
+                if self.tokens >= needed:
+                    self.tokens -= 1
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, (needed - self.tokens) / self.rate))
+
+
+_buckets = {
+    "read": TokenBucket(READ_QUOTA_PER_MINUTE),
+    "write": TokenBucket(WRITE_QUOTA_PER_MINUTE),
+}
+
+
+def _retryable(e: Exception, idempotent: bool = True) -> bool:
+    if isinstance(e, APIError):
+        return e.code == 429 or (idempotent and e.code >= 500)
+    return idempotent and isinstance(e, (requests.ConnectionError, requests.Timeout))
+
+
+# spreadsheets.batchUpdate requests that give the same result when replayed
+_IDEMPOTENT_REQUESTS = {"updateCells", "repeatCell", "updateSheetProperties", "updateDimensionProperties"}
+
+
+def _idempotent(method: str, endpoint: str, json_body=None) -> bool:
+    """Whether replaying the request cannot change the result: reads, values
+    updates/clears of fixed ranges, and batchUpdates made only of cell or
+    property updates. values:append and row deletes/inserts are not."""
+    if method.lower() in ("get", "put"):
+        return True
+    if "/values" in endpoint:
+        return endpoint.endswith((":batchUpdate", ":clear", ":batchClear"))
+    if endpoint.endswith(":batchUpdate"):
+        requests_ = (json_body or {}).get("requests", [])
+        return bool(requests_) and all(set(r) <= _IDEMPOTENT_REQUESTS for r in requests_)
+    return False
+
+
+def _backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def gated_call(kind: str, fn, *args, idempotent: bool = True, **kwargs):
+    """Run one Sheets request through the quota gate with retries.
+
+    A non-idempotent request is retried only on 429 (rejected before it ran);
+    other server or connection errors are raised as SheetsUnavailableError
+    for the caller (or the write queue) to recover from.
+    """
+    priority = _priority.get()
+    for attempt in range(MAX_ATTEMPTS):
+        if not _buckets[kind].acquire(priority):
+            raise SheetsUnavailableError(f"Sheets {kind} quota exhausted")
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if not _retryable(e, idempotent):
+                if _retryable(e):
+                    raise SheetsUnavailableError(f"Sheets {kind} failed and was not retried, "
+                                                 f"it may or may not have been applied: {e}") from e
+                raise
+            if attempt == MAX_ATTEMPTS - 1:
+                raise SheetsUnavailableError(f"Sheets {kind} failed after {MAX_ATTEMPTS} attempts: {e}") from e
+            delay = _backoff(attempt)
+            print(f"[SHEETS] {kind} request failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+class GatedHTTPClient(HTTPClient):
+    """gspread HTTP client that routes every request through the quota gate."""
+
+    def request(self, method: str, endpoint: str, *args, **kwargs):
+        kind = "read" if method.lower() == "get" else "write"
+        idempotent = _idempotent(method, endpoint, kwargs.get("json"))
+        return gated_call(kind, super().request, method, endpoint, *args, idempotent=idempotent, **kwargs)
@@ -0,0 +1,417 @@
+"""SQLite storage backend.
+
+Mirrors the behaviour of backend.sheets against a local database so the API can
+run with no network (local development, load tests). Select it with
+STORAGE_BACKEND=sqlite; the file defaults to data/lunch.db (SQLITE_PATH).
+Column names match the Google Sheets headers.
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+from backend import order_totals
+from backend.models import KindergartenMaster, ClassMaster, OrderData, SystemSettings, MONTHLY_COMMON_PREFIX
+from backend.schema import KINDERGARTEN_COLUMNS, CLASS_HEADERS, ORDER_HEADERS, BACKUP_HEADERS, kindergarten_from_record
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'lunch.db')
+
+KINDERGARTEN_HEADERS = ["kindergarten_id"] + list(KINDERGARTEN_COLUMNS.values()) + ["services"]
+# Flag/count columns keep numeric affinity so 0/1 read back as ints, like the sheet
+KINDERGARTEN_NUMERIC_DEFAULTS = {
+    "mon": 1, "tue": 1, "wed": 1, "thu": 1, "fri": 1, "sat": 0, "sun": 0,
+    "has_soup": 0, "has_no_rice": 0,
+    "classless_student_count": 0, "classless_allergy_count": 0, "classless_teacher_count": 0,
+}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS kindergartens (
+    kindergarten_id TEXT PRIMARY KEY,
+    {", ".join(f"{c} NUMERIC DEFAULT {KINDERGARTEN_NUMERIC_DEFAULTS[c]}" if c in KINDERGARTEN_NUMERIC_DEFAULTS
+               else f"{c} TEXT DEFAULT ''" for c in KINDERGARTEN_HEADERS[1:])}
+);
+CREATE INDEX IF NOT EXISTS idx_kindergartens_login ON kindergartens (login_id);
+
+CREATE TABLE IF NOT EXISTS classes (
+    kindergarten_id TEXT NOT NULL,
+    class_name TEXT NOT NULL,
+    grade TEXT DEFAULT '',
+    floor TEXT DEFAULT '',
+    default_student_count INTEGER DEFAULT 0,
+    default_allergy_count INTEGER DEFAULT 0,
+    default_teacher_count INTEGER DEFAULT 0,
+    effective_from TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_classes_kid_ef ON classes (kindergarten_id, effective_from);
+
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    kindergarten_id TEXT NOT NULL,
+    class_name TEXT NOT NULL,
+    meal_type TEXT DEFAULT '通常',
+    student_count INTEGER DEFAULT 0,
+    allergy_count INTEGER DEFAULT 0,
+    teacher_count INTEGER DEFAULT 0,
+    memo TEXT DEFAULT '',
+    updated_at TEXT DEFAULT '',
+    submitted_by TEXT DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_orders_kid_date ON orders (kindergarten_id, date);
+CREATE INDEX IF NOT EXISTS idx_orders_date ON orders (date);
+
+CREATE TABLE IF NOT EXISTS admin_settings (
+    key TEXT PRIMARY KEY,
+    value TEXT DEFAULT ''
+);
+
+CREATE TABLE IF NOT EXISTS orders_change_backup (
+    {", ".join(f"{c} TEXT" if c in ("kindergarten_id", "snapshot_date", "date", "class_name") else f"{c} INTEGER"
+               for c in BACKUP_HEADERS)}
+);
+CREATE INDEX IF NOT EXISTS idx_backup_kid_snap ON orders_change_backup (kindergarten_id, snapshot_date);
+"""
+
+
+def _month_range(year: int, month: int):
+    """[first, next-first) date strings for a month, for index range scans."""
+    ny, nm = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{year}-{month:02d}-01", f"{ny}-{nm:02d}-01"
+
+
+def _notify(action: str, kindergarten_name: str, details: str):
+    try:
+        from backend.notifications import send_admin_notification
+        send_admin_notification(action, kindergarten_name, details)
+    except Exception as ne:
+        print(f"[ERROR] Notification failed: {ne}")
+
+
+class SQLiteBackend:
+    """StorageBackend implementation on a single SQLite file."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or DEFAULT_PATH
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            if not self._conn.execute("SELECT 1 FROM admin_settings LIMIT 1").fetchone():
+                self._conn.executemany(
+                    "INSERT INTO admin_settings (key, value) VALUES (?, ?)",
+                    [("admin_emails", "admin@example.com"), ("reminder_days", "5,3")],
+                )
+
+    def _query(self, sql: str, params=()) -> List[Dict]:
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, params).fetchall()]
+
+    def _kindergarten_name(self, kindergarten_id: str) -> str:
+        rows = self._query("SELECT name FROM kindergartens WHERE kindergarten_id = ?", (kindergarten_id,))
+        return rows[0]["name"] if rows else kindergarten_id
+
+    # --- Kindergartens ---
+
+    def get_kindergartens(self) -> List[KindergartenMaster]:
+        results = []
+        for r in self._query("SELECT * FROM kindergartens ORDER BY rowid"):
+            if not r.get("kindergarten_id") or not r.get("name"):
+                continue
+            try:
+                results.append(kindergarten_from_record(r))
+            except Exception as row_err:
+                print(f"[WARNING] Skipping kindergarten {r.get('kindergarten_id')!r}: {row_err}")
+        return results
+
+    def _first_kindergarten(self, column: str, value: str) -> Optional[KindergartenMaster]:
+        for r in self._query(f"SELECT * FROM kindergartens WHERE {column} = ? AND name != '' ORDER BY rowid LIMIT 1",
+                             (str(value).strip(),)):
+            try:
+                return kindergarten_from_record(r)
+            except Exception as row_err:
+                print(f"[WARNING] Skipping kindergarten {r.get('kindergarten_id')!r}: {row_err}")
+        return None
+
+    def get_kindergarten(self, kindergarten_id: str) -> Optional[KindergartenMaster]:
+        return self._first_kindergarten("kindergarten_id", kindergarten_id)
+
+    def get_kindergarten_by_login(self, login_id: str) -> Optional[KindergartenMaster]:
+        return self._first_kindergarten("login_id", login_id) if str(login_id).strip() else None
+
+    def update_kindergarten_master(self, data: Dict) -> bool:
+        kid = data.get("kindergarten_id")
+        if not kid:
+            return False
+        values = {}
+        for api_key, column in KINDERGARTEN_COLUMNS.items():
+            if api_key in data:
+                val = data[api_key]
+                values[column] = 1 if val is True else 0 if val is False else val
+        if "services" in data:
+            values["services"] = ",".join(data["services"])
+        with self._lock, self._conn:
+            if not self._conn.execute("SELECT 1 FROM kindergartens WHERE kindergarten_id = ?", (kid,)).fetchone():
+                return False
+            if values:
+                assignments = ", ".join(f"{c} = ?" for c in values)
+                self._conn.execute(f"UPDATE kindergartens SET {assignments} WHERE kindergarten_id = ?",
+                                   list(values.values()) + [kid])
+        tracked_keys = set(KINDERGARTEN_COLUMNS) | {"services"}
+        _notify("園情報・設定更新", self._kindergarten_name(kid), f"更新内容: {[k for k in data if k in tracked_keys]}")
+        return True
+
+    # --- Classes ---
+
+    def get_classes_for_kindergarten(self, kindergarten_id: str, base_date: Optional[str] = None) -> List[ClassMaster]:
+        if base_date:
+            snap = self._query(
+                "SELECT MAX(effective_from) AS ef FROM classes WHERE kindergarten_id = ? AND effective_from <= ?",
+                (str(kindergarten_id), base_date))
+        else:
+            snap = self._query("SELECT MAX(effective_from) AS ef FROM classes WHERE kindergarten_id = ?",
+                               (str(kindergarten_id),))
+        if not snap or snap[0]["ef"] is None:
+            return []
+        rows = self._query(
+            "SELECT * FROM classes WHERE kindergarten_id = ? AND effective_from = ? ORDER BY rowid",
+            (str(kindergarten_id), snap[0]["ef"]))
+        # Deduplicate within the snapshot (last row wins, like the sheet backend)
+        grouped = {r["class_name"]: ClassMaster(**r) for r in rows}
+        return list(grouped.values())
+
+    def get_class_master(self) -> List[ClassMaster]:
+        return [ClassMaster(**r) for r in self._query("SELECT * FROM classes ORDER BY rowid")]
+
+    def get_pending_class_snapshots(self, kindergarten_id: str) -> List[Dict]:
+        today = datetime.now().strftime("%Y-%m-%d")
+        snapshots: Dict[str, List[Dict]] = {}
+        for r in self._query(
+                "SELECT * FROM classes WHERE kindergarten_id = ? AND effective_from > ? ORDER BY effective_from, rowid",
+                (str(kindergarten_id), today)):
+            snapshots.setdefault(r["effective_from"], []).append(ClassMaster(**r).model_dump())
+        return [{"date": d, "classes": cls} for d, cls in snapshots.items()]
+
+    def delete_pending_class_snapshot(self, kindergarten_id: str, date: str) -> bool:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM classes WHERE kindergarten_id = ? AND effective_from = ?",
+                               (str(kindergarten_id), date))
+        return True
+
+    def update_kindergarten_classes(self, kindergarten_id: str, classes: List[Dict], scheduled_date: str = None) -> bool:
+        with self._lock, self._conn:
+            if scheduled_date:
+                target_effective_date = scheduled_date
+                self._conn.execute("DELETE FROM classes WHERE kindergarten_id = ? AND effective_from = ?",
+                                   (str(kindergarten_id), scheduled_date))
+            else:
+                target_effective_date = datetime.now().strftime("%Y-%m-01")
+                self._conn.execute("DELETE FROM classes WHERE kindergarten_id = ?", (str(kindergarten_id),))
+            rows = []
+            for c in classes:
+                row = {h: c.get(h, "") for h in CLASS_HEADERS}
+                row["kindergarten_id"] = kindergarten_id
+                row["effective_from"] = target_effective_date
+                rows.append([row[h] for h in CLASS_HEADERS])
+            self._conn.executemany(
+                f"INSERT INTO classes ({', '.join(CLASS_HEADERS)}) VALUES ({', '.join('?' * len(CLASS_HEADERS))})",
+                rows)
+        return True
+
+    def update_class_counts(self, kindergarten_id: str, class_name: str, counts: Dict) -> bool:
+        values = {k: v for k, v in counts.items() if k in CLASS_HEADERS}
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT rowid FROM classes WHERE kindergarten_id = ? AND class_name = ? ORDER BY rowid LIMIT 1",
+                (str(kindergarten_id), class_name)).fetchone()
+            if not row:
+                return False
+            if values:
+                assignments = ", ".join(f"{c} = ?" for c in values)
+                self._conn.execute(f"UPDATE classes SET {assignments} WHERE rowid = ?", list(values.values()) + [row[0]])
+        _notify("クラス人数更新", self._kindergarten_name(kindergarten_id),
+                f"クラス名: {class_name}\n更新項目: {list(counts.keys())}")
+        return True
+
+    # --- Orders ---
+
+    def get_orders_for_month(self, kindergarten_id: str, year: int, month: int) -> List[OrderData]:
+        first, nxt = _month_range(year, month)
+        rows = self._query(
+            "SELECT * FROM orders WHERE kindergarten_id = ? AND date >= ? AND date < ? ORDER BY rowid",
+            (str(kindergarten_id), first, nxt))
+        return [OrderData(**r) for r in rows]
+
+    def get_orders_by_kindergarten(self, year: int, month: int) -> Dict[str, List[OrderData]]:
+        first, nxt = _month_range(year, month)
+        result: Dict[str, List[OrderData]] = {}
+        for r in self._query("SELECT * FROM orders WHERE date >= ? AND date < ? ORDER BY rowid", (first, nxt)):
+            result.setdefault(r["kindergarten_id"], []).append(OrderData(**r))
+        return result
+
+    def get_orders_for_date(self, date: str) -> List[OrderData]:
+        return [OrderData(**r) for r in self._query("SELECT * FROM orders WHERE date = ? ORDER BY rowid", (date,))]
+
+    def read_order_columns(self, columns: List[str], year: Optional[int] = None, month: Optional[int] = None) -> List[Dict]:
+        wanted = [h for h in dict.fromkeys(["order_id", "date"] + list(columns)) if h in ORDER_HEADERS]
+        sql = f"SELECT {', '.join(wanted)} FROM orders"
+        params = ()
+        if year and month:
+            sql += " WHERE date >= ? AND date < ?"
+            params = _month_range(year, month)
+        return self._query(sql + " ORDER BY rowid", params)
+
+    def get_order_totals(self, by: List[str], year: Optional[int] = None, month: Optional[int] = None,
+                         date: Optional[str] = None) -> List[Dict]:
+        by = order_totals.check_dimensions(by)
+        order_totals.check_period(year, month, date)
+        fields = ", ".join(order_totals.SOURCE_FIELDS + order_totals.COUNT_FIELDS)
+        if date:
+            rows = self._query(f"SELECT {fields} FROM orders WHERE date = ?", (date,))
+        elif year and month:
+            rows = self._query(f"SELECT {fields} FROM orders WHERE date >= ? AND date < ?", _month_range(year, month))
+        else:
+            rows = self._query(f"SELECT {fields} FROM orders")
+        return order_totals.totals_from_records(rows, by, self._areas(by))
+
+    def get_orders_with_totals(self, by: List[str], year: Optional[int] = None, month: Optional[int] = None,
+                               date: Optional[str] = None) -> Tuple[List[OrderData], List[Dict]]:
+        by = order_totals.check_dimensions(by)
+        order_totals.check_period(year, month, date)
+        if date:
+            rows = self._query("SELECT * FROM orders WHERE date = ? ORDER BY rowid", (date,))
+        elif month is not None:
+            rows = self._query("SELECT * FROM orders WHERE date >= ? AND date < ? ORDER BY rowid", _month_range(year, month))
+        else:
+            raise ValueError("Give a date, or year and month.")
+        # Totals from the rows listed, not a second query a save could land between
+        return [OrderData(**r) for r in rows], order_totals.totals_from_records(rows, by, self._areas(by))
+
+    def _areas(self, by: List[str]) -> Optional[Dict[str, str]]:
+        if "area" not in by:
+            return None
+        areas = {}
+        for k in self.get_kindergartens():
+            areas.setdefault(k.kindergarten_id, k.area)
+        return areas
+
+    def batch_save_orders(self, orders: List[Dict]) -> bool:
+        if not orders:
+            return True
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = []
+        for order in orders:
+            order["updated_at"] = now
+            rows.append(["" if order.get(h) is None else order.get(h, "") for h in ORDER_HEADERS])
+        updates = ", ".join(f"{h} = excluded.{h}" for h in ORDER_HEADERS[1:])
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO orders ({', '.join(ORDER_HEADERS)}) VALUES ({', '.join('?' * len(ORDER_HEADERS))}) "
+                f"ON CONFLICT(order_id) DO UPDATE SET {updates}",
+                rows)
+
+        kid_id = orders[0]['kindergarten_id']
+        is_bulk = len(orders) > 10
+        details = f"件数: {len(orders)}件\n"
+        if not is_bulk:
+            details += f"日付: {orders[0].get('date', '---')}\nクラス: {orders[0].get('class_name', '---')}"
+        _notify("マンスリー申請" if is_bulk else "日次注文変更", self._kindergarten_name(kid_id), details)
+        return True
+
+    # --- Class change backups ---
+
+    def backup_orders_for_class_change(self, kindergarten_id: str, snapshot_date: str,
+                                       orders_before: List[Dict], new_class_counts: Dict) -> bool:
+        rows = []
+        for order in orders_before:
+            class_name = str(order.get("class_name", ""))
+            applied = new_class_counts.get(class_name, {})
+            rows.append([
+                kindergarten_id, snapshot_date, order.get("date", ""), class_name,
+                int(order.get("student_count", 0)), int(order.get("allergy_count", 0)),
+                int(order.get("teacher_count", 0)),
+                int(applied.get("student_count", 0)), int(applied.get("allergy_count", 0)),
+                int(applied.get("teacher_count", 0)),
+            ])
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO orders_change_backup ({', '.join(BACKUP_HEADERS)}) "
+                f"VALUES ({', '.join('?' * len(BACKUP_HEADERS))})", rows)
+        return True
+
+    def restore_orders_from_class_change(self, kindergarten_id: str, snapshot_date: str) -> bool:
+        relevant = self._query(
+            "SELECT * FROM orders_change_backup WHERE kindergarten_id = ? AND snapshot_date = ?",
+            (str(kindergarten_id), str(snapshot_date)))
+        if not relevant:
+            return True
+        backup_map = {(r["date"], r["class_name"]): r for r in relevant}
+        current = self._query(
+            f"SELECT * FROM orders WHERE kindergarten_id = ? AND date IN ({', '.join('?' * len(relevant))})",
+            [str(kindergarten_id)] + [r["date"] for r in relevant])
+
+        orders_to_restore = []
+        for order in current:
+            bk = backup_map.get((order["date"], order["class_name"]))
+            if not bk:
+                continue
+            # Only restore if the order hasn't been manually changed
+            if (int(order["student_count"]), int(order["allergy_count"]), int(order["teacher_count"])) == \
+                    (int(bk["applied_student"]), int(bk["applied_allergy"]), int(bk["applied_teacher"])):
+                restored = OrderData(**order).model_dump()
+                restored["student_count"] = int(bk["orig_student"])
+                restored["allergy_count"] = int(bk["orig_allergy"])
+                restored["teacher_count"] = int(bk["orig_teacher"])
+                orders_to_restore.append(restored)
+        if orders_to_restore:
+            self.batch_save_orders(orders_to_restore)
+        return True
+
+    def delete_orders_backup(self, kindergarten_id: str, snapshot_date: str) -> bool:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM orders_change_backup WHERE kindergarten_id = ? AND snapshot_date = ?",
+                               (str(kindergarten_id), str(snapshot_date)))
+        return True
+
+    # --- System settings ---
+
+    def get_system_settings(self) -> Dict:
+        return {r["key"]: r["value"] for r in self._query("SELECT key, value FROM admin_settings ORDER BY rowid")}
+
+    def update_system_settings(self, data: Dict) -> bool:
+        # Same semantics as the sheet backend: upsert the given keys, keep the rest
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO admin_settings (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                [(k, str(v)) for k, v in data.items()])
+        return True
+
+    def get_monthly_common_items(self) -> List[Dict]:
+        return SystemSettings(**self.get_system_settings()).monthly_common_items()
+
+    def update_monthly_common_item(self, item: str, year_month: str) -> bool:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO admin_settings (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (f"{MONTHLY_COMMON_PREFIX}{year_month}", item))
+        return True
+
+    def delete_monthly_common_item(self, year_month: str) -> bool:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM admin_settings WHERE key = ?", (f"{MONTHLY_COMMON_PREFIX}{year_month}",))
+        return True
+
+    def prefetch_all(self) -> bool:
+        # Nothing to warm up: queries go straight to the local database
+        return True
+
+    def startup(self) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        pass
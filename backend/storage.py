@@ -0,0 +1,186 @@
+"""Storage backend selection.
+
+Callers go through the functions in this module, which delegate to the backend
+chosen by the STORAGE_BACKEND environment variable:
+
+- "sheets" (default): Google Sheets via backend.sheets
+- "sqlite": local SQLite database (SQLITE_PATH, default data/lunch.db) for
+  offline development and load tests
+"""
+import os
+import threading
+from typing import List, Dict, Optional, Protocol, Tuple
+from backend.models import KindergartenMaster, ClassMaster, OrderData, SystemSettings
+
+
+class StorageBackend(Protocol):
+    """Operations every persistence backend provides.
+
+    The backend.sheets module implements this directly with module-level
+    functions; SQLiteBackend implements it as a class.
+    """
+
+    def get_kindergartens(self) -> List[KindergartenMaster]: ...
+    def get_kindergarten(self, kindergarten_id: str) -> Optional[KindergartenMaster]: ...
+    def get_kindergarten_by_login(self, login_id: str) -> Optional[KindergartenMaster]: ...
+    def update_kindergarten_master(self, data: Dict) -> bool: ...
+
+    def get_classes_for_kindergarten(self, kindergarten_id: str, base_date: Optional[str] = None) -> List[ClassMaster]: ...
+    def get_class_master(self) -> List[ClassMaster]: ...
+    def get_pending_class_snapshots(self, kindergarten_id: str) -> List[Dict]: ...
+    def delete_pending_class_snapshot(self, kindergarten_id: str, date: str) -> bool: ...
+    def update_kindergarten_classes(self, kindergarten_id: str, classes: List[Dict], scheduled_date: str = None) -> bool: ...
+    def update_class_counts(self, kindergarten_id: str, class_name: str, counts: Dict) -> bool: ...
+
+    def get_orders_for_month(self, kindergarten_id: str, year: int, month: int) -> List[OrderData]: ...
+    def get_orders_by_kindergarten(self, year: int, month: int) -> Dict[str, List[OrderData]]: ...
+    def get_orders_for_date(self, date: str) -> List[OrderData]: ...
+    def read_order_columns(self, columns: List[str], year: Optional[int] = None, month: Optional[int] = None) -> List[Dict]: ...
+    def get_order_totals(self, by: List[str], year: Optional[int] = None, month: Optional[int] = None,
+                         date: Optional[str] = None) -> List[Dict]: ...
+    def get_orders_with_totals(self, by: List[str], year: Optional[int] = None, month: Optional[int] = None,
+                               date: Optional[str] = None) -> Tuple[List[OrderData], List[Dict]]: ...
+    def batch_save_orders(self, orders: List[Dict]) -> bool: ...
+
+    def backup_orders_for_class_change(self, kindergarten_id: str, snapshot_date: str,
+                                       orders_before: List[Dict], new_class_counts: Dict) -> bool: ...
+    def restore_orders_from_class_change(self, kindergarten_id: str, snapshot_date: str) -> bool: ...
+    def delete_orders_backup(self, kindergarten_id: str, snapshot_date: str) -> bool: ...
+
+    def get_system_settings(self) -> Dict: ...
+    def update_system_settings(self, data: Dict) -> bool: ...
+    def get_monthly_common_items(self) -> List[Dict]: ...
+    def update_monthly_common_item(self, item: str, year_month: str) -> bool: ...
+    def delete_monthly_common_item(self, year_month: str) -> bool: ...
+
+    def prefetch_all(self) -> bool: ...
+    def startup(self) -> None: ...
+    def shutdown(self) -> None: ...
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> StorageBackend:
+    """Return the configured storage backend (created once per process)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            kind = os.getenv("STORAGE_BACKEND", "sheets").strip().lower()
+            if kind == "sqlite":
+                from backend.sqlite_store import SQLiteBackend
+                _backend = SQLiteBackend(os.getenv("SQLITE_PATH") or None)
+            elif kind == "sheets":
+                from backend import sheets
+                _backend = sheets
+            else:
+                raise ValueError(f"Unknown STORAGE_BACKEND: {kind!r}")
+            print(f"[STORAGE] Using {kind} backend")
+        return _backend
+
+
+def set_backend(backend: Optional[StorageBackend]):
+    """Override the backend (tests, scripts). None re-reads STORAGE_BACKEND."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+# --- Delegating API (import these instead of backend.sheets) ---
+
+def get_kindergartens() -> List[KindergartenMaster]:
+    return get_backend().get_kindergartens()
+
+def get_kindergarten_master() -> List[KindergartenMaster]:
+    return get_backend().get_kindergartens()
+
+def get_kindergarten(kindergarten_id: str) -> Optional[KindergartenMaster]:
+    return get_backend().get_kindergarten(kindergarten_id)
+
+def get_kindergarten_by_login(login_id: str) -> Optional[KindergartenMaster]:
+    return get_backend().get_kindergarten_by_login(login_id)
+
+def update_kindergarten_master(data: Dict) -> bool:
+    return get_backend().update_kindergarten_master(data)
+
+def get_classes_for_kindergarten(kindergarten_id: str, base_date: Optional[str] = None) -> List[ClassMaster]:
+    return get_backend().get_classes_for_kindergarten(kindergarten_id, base_date)
+
+def get_class_master() -> List[ClassMaster]:
+    return get_backend().get_class_master()
+
+def get_pending_class_snapshots(kindergarten_id: str) -> List[Dict]:
+    return get_backend().get_pending_class_snapshots(kindergarten_id)
+
+def delete_pending_class_snapshot(kindergarten_id: str, date: str) -> bool:
+    return get_backend().delete_pending_class_snapshot(kindergarten_id, date)
+
+def update_kindergarten_classes(kindergarten_id: str, classes: List[Dict], scheduled_date: str = None) -> bool:
+    return get_backend().update_kindergarten_classes(kindergarten_id, classes, scheduled_date=scheduled_date)
+
+def update_class_counts(kindergarten_id: str, class_name: str, counts: Dict) -> bool:
+    return get_backend().update_class_counts(kindergarten_id, class_name, counts)
+
+def get_orders_for_month(kindergarten_id: str, year: int, month: int) -> List[OrderData]:
+    return get_backend().get_orders_for_month(kindergarten_id, year, month)
+
+def get_orders_by_kindergarten(year: int, month: int) -> Dict[str, List[OrderData]]:
+    return get_backend().get_orders_by_kindergarten(year, month)
+
+def get_orders_for_date(date: str) -> List[OrderData]:
+    return get_backend().get_orders_for_date(date)
+
+def read_order_columns(columns: List[str], year: Optional[int] = None, month: Optional[int] = None) -> List[Dict]:
+    return get_backend().read_order_columns(columns, year, month)
+
+def get_order_totals(by: List[str], year: Optional[int] = None, month: Optional[int] = None,
+                     date: Optional[str] = None) -> List[Dict]:
+    return get_backend().get_order_totals(by, year, month, date)
+
+def get_orders_with_totals(by: List[str], year: Optional[int] = None, month: Optional[int] = None,
+                           date: Optional[str] = None) -> Tuple[List[OrderData], List[Dict]]:
+    return get_backend().get_orders_with_totals(by, year, month, date)
+
+def batch_save_orders(orders: List[Dict]) -> bool:
+    return get_backend().batch_save_orders(orders)
+
+def backup_orders_for_class_change(kindergarten_id: str, snapshot_date: str,
+                                   orders_before: List[Dict], new_class_counts: Dict) -> bool:
+    return get_backend().backup_orders_for_class_change(kindergarten_id, snapshot_date, orders_before, new_class_counts)
+
+def restore_orders_from_class_change(kindergarten_id: str, snapshot_date: str) -> bool:
+    return get_backend().restore_orders_from_class_change(kindergarten_id, snapshot_date)
+
+def delete_orders_backup(kindergarten_id: str, snapshot_date: str) -> bool:
+    return get_backend().delete_orders_backup(kindergarten_id, snapshot_date)
+
+def get_system_settings() -> Dict:
+    return get_backend().get_system_settings()
+
+def get_settings() -> SystemSettings:
+    """get_system_settings() with admin emails, reminder days and templates parsed."""
+    return SystemSettings(**get_backend().get_system_settings())
+
+def update_system_settings(data: Dict) -> bool:
+    return get_backend().update_system_settings(data)
+
+def get_monthly_common_items() -> List[Dict]:
+    return get_backend().get_monthly_common_items()
+
+def update_monthly_common_item(item: str, year_month: str) -> bool:
+    return get_backend().update_monthly_common_item(item, year_month)
+
+def delete_monthly_common_item(year_month: str) -> bool:
+    return get_backend().delete_monthly_common_item(year_month)
+
+def prefetch_all() -> bool:
+    return get_backend().prefetch_all()
+
+def startup():
+    """Run once when the app starts, before requests are served."""
+    get_backend().startup()
+
+def shutdown():
+    """Run once when the app stops."""
+    get_backend().shutdown()
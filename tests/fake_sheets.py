@@ -0,0 +1,344 @@
+"""In-memory stand-in for the gspread Spreadsheet/Worksheet objects.
+
+Used to benchmark and regression-test backend.sheets without Google: every API
+call is counted (per method, and as a read or write), can be slowed down by a
+simulated latency, and is subject to per-minute read/write quotas that raise
+the same 429 APIError gspread raises.
+
+    wb = seeded_workbook(kindergartens=300, months=24)
+    with patch("backend.sheets.get_db_connection", return_value=wb):
+        ...
+    wb.calls["get_all_values"], wb.reads, wb.writes
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from datetime import date, timedelta
+from typing import List, Dict, Optional
+
+import requests
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range, numericise_all, rowcol_to_a1, to_records
+
+from backend.schema import CLASS_HEADERS, ORDER_HEADERS
+
+# Column order of the real 'kindergartens' sheet
+KINDERGARTEN_HEADERS = [
+    "kindergarten_id", "name", "mon", "tue", "wed", "thu", "fri", "sat", "sun", "services",
+    "login_id", "password", "has_soup", "has_no_rice", "curry_trigger", "contact_name", "contact_email",
+    "icon_url", "classless_student_count", "classless_allergy_count", "classless_teacher_count",
+    "plan_type", "address", "area",
+]
+
+def _cell(v) -> str:
+    """Store values the way Sheets renders them back (FORMATTED_VALUE)."""
+    if v is None:
+        return ""
+    if isinstance(v, bool):
+        return "TRUE" if v else "FALSE"
+    return str(v)
+
+
+def _api_error(code: int, status: str, message: str) -> APIError:
+    response = requests.Response()
+    response.status_code = code
+    response._content = json.dumps({
+        "error": {"code": code, "message": message, "status": status}
+    }).encode()
+    return APIError(response)
+
+
+def _trim(values: List[List[str]]) -> List[List[str]]:
+    rows = []
+    for row in values:
+        row = list(row)
+        while row and row[-1] == "":
+            row.pop()
+        rows.append(row)
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+def quota_error(message: str = "Quota exceeded") -> APIError:
+    """An APIError shaped like the one gspread raises for HTTP 429."""
+    return _api_error(429, "RESOURCE_EXHAUSTED", message)
+
+
+class FakeWorksheet:
+    def __init__(self, book: "FakeSpreadsheet", title: str, values: List[List], sheet_id: int):
+        self.spreadsheet = book
+        self.title = title
+        self.id = sheet_id
+        self._values = [[_cell(v) for v in row] for row in values]
+        self.col_count = max((len(r) for r in self._values), default=0)
+
+    # --- reads ---
+
+    def get_all_values(self, *args, **kwargs) -> List[List[str]]:
+        self.spreadsheet._call("get_all_values")
+        width = max((len(r) for r in self._values), default=0)
+        return [row + [""] * (width - len(row)) for row in self._values]
+
+    def get_all_records(self, *args, **kwargs) -> List[Dict]:
+        self.spreadsheet._call("get_all_records")
+        if not self._values:
+            return []
+        width = len(self._values[0])
+        rows = [(row + [""] * width)[:width] for row in self._values[1:]]
+        return to_records(self._values[0], [numericise_all(row) for row in rows])
+
+    def row_values(self, row: int, *args, **kwargs) -> List[str]:
+        self.spreadsheet._call("row_values")
+        values = self._values[row - 1] if row <= len(self._values) else []
+        while values and values[-1] == "":
+            values = values[:-1]
+        return list(values)
+
+    def col_values(self, col: int, *args, **kwargs) -> List[str]:
+        self.spreadsheet._call("col_values")
+        column = [row[col - 1] if col <= len(row) else "" for row in self._values]
+        while column and column[-1] == "":
+            column.pop()
+        return column
+
+    def batch_get(self, ranges: List[str], major_dimension: Optional[str] = None, **kwargs) -> List[List[List[str]]]:
+        """One request for several A1 ranges (open-ended ones like "B2:B" too).
+        Trailing empty cells and rows/columns are trimmed like the API does."""
+        self.spreadsheet._call("batch_get")
+        result = []
+        for name in ranges:
+            grid = a1_range_to_grid_range(name.split("!")[-1])
+            top, left = grid.get("startRowIndex", 0), grid.get("startColumnIndex", 0)
+            bottom = grid.get("endRowIndex", len(self._values))
+            right = grid.get("endColumnIndex", self.col_count)
+            block = [(row + [""] * right)[left:right] for row in self._values[top:bottom]]
+            if major_dimension == "COLUMNS":
+                block = [list(col) for col in zip(*block)]
+            result.append(_trim(block))
+        return result
+
+    # --- writes ---
+
+    def _write(self, range_name: str, values: List[List]):
+        grid = a1_range_to_grid_range(range_name.split("!")[-1])
+        top, left = grid.get("startRowIndex", 0), grid.get("startColumnIndex", 0)
+        for r, row in enumerate(values):
+            while len(self._values) <= top + r:
+                self._values.append([])
+            target = self._values[top + r]
+            for c, v in enumerate(row):
+                while len(target) <= left + c:
+                    target.append("")
+                target[left + c] = _cell(v)
+        self.col_count = max(self.col_count, max((len(r) for r in self._values), default=0))
+
+    def batch_update(self, data: List[Dict], **kwargs):
+        self.spreadsheet._call("batch_update", write=True)
+        for item in data:
+            self._write(item["range"], item["values"])
+        return {"totalUpdatedCells": sum(len(r) for item in data for r in item["values"])}
+
+    def update(self, range_name: str, values: List[List], **kwargs):
+        self.spreadsheet._call("update", write=True)
+        self._write(range_name, values)
+        return {}
+
+    def append_rows(self, values: List[List], **kwargs):
+        self.spreadsheet._call("append_rows", write=True)
+        # Sheets appends after the last non-empty row of the table
+        last = len(self._values)
+        while last > 0 and not any(self._values[last - 1]):
+            last -= 1
+        del self._values[last:]
+        start = last + 1
+        for row in values:
+            self._values.append([_cell(v) for v in row])
+        end = start + len(values) - 1
+        width = max((len(r) for r in values), default=1)
+        return {"updates": {"updatedRange": f"{self.title}!A{start}:{rowcol_to_a1(end, width)}",
+                            "updatedRows": len(values)}}
+
+    def clear(self):
+        self.spreadsheet._call("clear", write=True)
+        self._values = []
+        return {}
+
+    def resize(self, rows: Optional[int] = None, cols: Optional[int] = None):
+        self.spreadsheet._call("resize", write=True)
+        if cols is not None:
+            self.col_count = cols
+        return {}
+
+
+class FakeSpreadsheet:
+    """Counts calls, simulates latency and per-minute quotas."""
+
+    def __init__(self, sheets: Optional[Dict[str, List[List]]] = None, latency: float = 0.0,
+                 read_quota_per_minute: Optional[int] = None, write_quota_per_minute: Optional[int] = None):
+        self.id = "fake-spreadsheet"
+        self.latency = latency
+        self.read_quota_per_minute = read_quota_per_minute
+        self.write_quota_per_minute = write_quota_per_minute
+        self.calls: Counter = Counter()
+        self.reads = 0
+        self.writes = 0
+        self._recent = {"read": deque(), "write": deque()}
+        self._lock = threading.Lock()
+        self._sheets: Dict[str, FakeWorksheet] = {}
+        for title, values in (sheets or {}).items():
+            self._add(title, values)
+
+    def _add(self, title: str, values: List[List]) -> FakeWorksheet:
+        ws = FakeWorksheet(self, title, values, sheet_id=len(self._sheets) + 1)
+        self._sheets[title] = ws
+        return ws
+
+    def _call(self, method: str, write: bool = False):
+        kind = "write" if write else "read"
+        quota = self.write_quota_per_minute if write else self.read_quota_per_minute
+        with self._lock:
+            now = time.monotonic()
+            recent = self._recent[kind]
+            while recent and now - recent[0] >= 60:
+                recent.popleft()
+            if quota is not None and len(recent) >= quota:
+                self.calls["rejected_" + kind] += 1
+                raise quota_error(f"Quota exceeded for quota metric '{kind.title()} requests'")
+            recent.append(now)
+            self.calls[method] += 1
+            if write:
+                self.writes += 1
+            else:
+                self.reads += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def reset_counts(self):
+        with self._lock:
+            self.calls.clear()
+            self.reads = self.writes = 0
+            for recent in self._recent.values():
+                recent.clear()
+
+    def values(self, title: str) -> List[List[str]]:
+        """Current contents of a sheet (not counted as an API call)."""
+        return [list(r) for r in self._sheets[title]._values]
+
+    def values_batch_get(self, ranges: List[str], params: Optional[Dict] = None) -> Dict:
+        """Whole-sheet ranges only; trailing empty cells and rows are trimmed like the API does."""
+        self._call("values_batch_get")
+        value_ranges = []
+        for name in ranges:
+            title = name.split("!")[0].strip("'")
+            if title not in self._sheets:
+                raise _api_error(400, "INVALID_ARGUMENT", f"Unable to parse range: {name}")
+            values = _trim(self._sheets[title]._values)
+            entry = {"range": f"'{title}'!A1", "majorDimension": "ROWS"}
+            if values:
+                entry["values"] = values
+            value_ranges.append(entry)
+        return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+
+    def batch_update(self, body: Dict) -> Dict:
+        """spreadsheets.batchUpdate: updateCells, deleteDimension, insertDimension (rows) and appendCells."""
+        self._call("spreadsheet_batch_update", write=True)
+        by_id = {ws.id: ws for ws in self._sheets.values()}
+        replies = []
+        for request in body.get("requests", []):
+            (kind, params), = request.items()
+            if kind in ("deleteDimension", "insertDimension"):
+                rng = params["range"]
+                ws = by_id[rng["sheetId"]]
+                start, end = rng["startIndex"], rng["endIndex"]
+                if kind == "deleteDimension":
+                    del ws._values[start:end]
+                else:
+                    ws._values[start:start] = [[] for _ in range(end - start)]
+            elif kind == "updateCells":
+                ws = by_id[params["start"]["sheetId"]]
+                r, c = params["start"]["rowIndex"], params["start"].get("columnIndex", 0)
+                for row in params["rows"]:
+                    while len(ws._values) <= r:
+                        ws._values.append([])
+                    cells = ws._values[r]
+                    for i, cell in enumerate(row["values"]):
+                        while len(cells) <= c + i:
+                            cells.append("")
+                        cells[c + i] = _cell(next(iter(cell.get("userEnteredValue", {"": ""}).values())))
+                    r += 1
+            elif kind == "appendCells":
+                ws = by_id[params["sheetId"]]
+                last = len(ws._values)
+                while last > 0 and not any(ws._values[last - 1]):
+                    last -= 1
+                del ws._values[last:]
+                for row in params["rows"]:
+                    ws._values.append([_cell(next(iter(c.get("userEnteredValue", {"": ""}).values())))
+                                       for c in row["values"]])
+            else:
+                raise _api_error(400, "INVALID_ARGUMENT", f"Unsupported request in fake: {kind}")
+            replies.append({})
+        return {"spreadsheetId": self.id, "replies": replies}
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self._call("worksheet")
+        if title not in self._sheets:
+            raise WorksheetNotFound(title)
+        return self._sheets[title]
+
+    def worksheets(self) -> List[FakeWorksheet]:
+        self._call("worksheets")
+        return list(self._sheets.values())
+
+    def add_worksheet(self, title: str, rows: int = 100, cols: int = 26, index=None) -> FakeWorksheet:
+        self._call("add_worksheet", write=True)
+        return self._add(title, [])
+
+
+def seeded_workbook(kindergartens: int = 20, classes_per_kindergarten: int = 4, months: int = 3,
+                    start: date = date(2026, 1, 1), seed: int = 0, **kwargs) -> FakeSpreadsheet:
+    """A FakeSpreadsheet filled with synthetic kindergartens, classes and weekday orders.
+
+    Orders cover `months` months from `start`, one row per class per weekday.
+    Extra keyword arguments (latency, quotas) go to FakeSpreadsheet.
+    """
+    rng = random.Random(seed)
+    areas = ["北", "南", "東", "西"]
+    kg_rows, class_rows, order_rows = [KINDERGARTEN_HEADERS], [CLASS_HEADERS], [ORDER_HEADERS]
+    class_names = {}
+    for i in range(1, kindergartens + 1):
+        kid = f"K{i:03d}"
+        kg_rows.append([
+            kid, f"園{i}", 1, 1, 1, 1, 1, 0, 0, "通常,カレー", f"user{i}", f"pass{i}", 0, 0, "",
+            f"担当{i}", f"k{i}@example.com", "", 0, 0, 0, "", f"住所{i}", areas[i % len(areas)],
+        ])
+        class_names[kid] = []
+        for c in range(classes_per_kindergarten):
+            name = f"{c + 1}組"
+            class_names[kid].append(name)
+            class_rows.append([kid, name, "年長", "1F", rng.randint(10, 30), rng.randint(0, 3), 2,
+                               start.strftime("%Y-%m-01")])
+
+    year, month = start.year, start.month
+    end_year, end_month = year + (month - 1 + months) // 12, (month - 1 + months) % 12 + 1
+    day = date(year, month, 1)
+    end = date(end_year, end_month, 1)
+    while day < end:
+        if day.weekday() < 5:
+            ds = day.strftime("%Y-%m-%d")
+            for kid, names in class_names.items():
+                for name in names:
+                    order_rows.append([f"{ds}_{kid}_{name}", ds, kid, name, "通常",
+                                       rng.randint(10, 30), rng.randint(0, 3), 2, "", "", ""])
+        day += timedelta(days=1)
+
+    sheets = {
+        "kindergartens": kg_rows,
+        "classes": class_rows,
+        "orders": order_rows,
+        "admin_settings": [["key", "value"], ["admin_emails", "admin@example.com"], ["reminder_days", "5,3"]],
+    }
+    return FakeSpreadsheet(sheets, **kwargs)
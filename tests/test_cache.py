@@ -0,0 +1,75 @@
+import sys
+import os
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path so we can import backend
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend import sheets, api
+from backend.cache import Cache
+from tests.test_sheets_api_calls import SheetsApiCallTest
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = Cache("test", max_entries=3, max_age=60, namespace=lambda k: k.split("_")[0])
+
+    def test_lru_eviction(self):
+        for key in ("a_1", "a_2", "b_1"):
+            self.cache.store(key, key)
+        self.cache.lookup("a_1")  # now most recently used
+        self.cache.store("b_2", "b_2")
+        self.assertIsNone(self.cache.peek("a_2"))
+        self.assertIsNotNone(self.cache.peek("a_1"))
+        stats = self.cache.stats()
+        self.assertEqual(stats["entries"], 3)
+        self.assertEqual(stats["namespaces"]["a"]["evictions"], 1)
+        self.assertEqual(stats["namespaces"]["a"]["hits"], 1)
+
+    def test_tags_and_versions(self):
+        self.cache.store("kg", 1, tags={"kg"})
+        self.cache.store("kg:models", 2, tags={"kg"})
+        self.cache.store("cls", 3, tags={"cls"})
+        before = self.cache.version({"kg"})
+        self.assertEqual(self.cache.invalidate("kg"), 2)
+        self.assertNotEqual(self.cache.version({"kg"}), before)
+        self.assertIsNone(self.cache.lookup("kg:models"))
+        self.assertEqual(self.cache.lookup("cls").data, 3)
+        self.assertEqual(self.cache.stats()["namespaces"]["kg"]["invalidations"], 1)
+
+    def test_max_age(self):
+        self.cache.store("a_1", 1)
+        self.cache.store("a_2", 2, max_age=3600)
+        for key in ("a_1", "a_2"):
+            self.cache.peek(key).stored -= 120
+        self.assertIsNone(self.cache.lookup("a_1"))
+        self.assertEqual(self.cache.lookup("a_2").data, 2)
+        self.assertEqual(self.cache.stats()["namespaces"]["a"]["misses"], 1)
+
+
+class TestSheetsCacheStats(SheetsApiCallTest):
+
+    def test_month_windows_are_bounded(self):
+        with patch.object(sheets._cache, "max_entries", 4):
+            for month in (1, 2, 1, 2):
+                sheets.get_orders_by_kindergarten(2026, month)
+            for year in range(2020, 2024):
+                sheets.get_orders_by_kindergarten(year, 5)
+            self.assertLessEqual(sheets._cache.stats()["entries"], 4)
+
+    def test_admin_endpoint(self):
+        sheets.get_kindergartens()
+        sheets.get_kindergartens()
+        stats = api.get_cache_stats()["caches"]["sheets"]["namespaces"]
+        self.assertEqual((stats["kg"]["misses"], stats["kg"]["hits"]), (1, 1))
+        self.assertEqual(stats["kg"]["entries"], 1)
+        sheets.update_kindergarten_master({"kindergarten_id": "K001", "name": "新しい園"})
+        stats = api.get_cache_stats()["caches"]["sheets"]["namespaces"]
+        self.assertEqual(stats["kg"]["invalidations"], 1)
+        self.assertEqual(stats["kg:models"]["invalidations"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import sys
+import os
+import time
+import unittest
+from datetime import date, timedelta
+from unittest.mock import patch
+
+# Add parent directory to path so we can import backend
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend import sheets
+from fake_sheets import seeded_workbook
+
+
+def _cls(kid, name, ef, students=10):
+    return {"kindergarten_id": kid, "class_name": name, "grade": "", "floor": "",
+            "default_student_count": students, "default_allergy_count": 0,
+            "default_teacher_count": 1, "effective_from": ef}
+
+
+RECORDS = [
+    _cls("K001", "A", "2026-01-01"),
+    _cls("K001", "B", "2026-01-01"),
+    _cls("K001", "A", "2026-04-01", students=20),
+    _cls("K001", "A", "2026-04-01", students=21),  # duplicate row: last one wins
+    _cls("K002", "X", "2026-02-01"),
+    {"kindergarten_id": "K003", "class_name": None},  # broken row
+]
+
+
+class TestClassIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = sheets._ClassIndex(RECORDS)
+
+    def test_snapshot_lookup(self):
+        names = lambda cs: [c.class_name for c in cs]
+        self.assertEqual(names(self.index.at("K001", "2025-12-31")), [])
+        self.assertEqual(names(self.index.at("K001", "2026-01-01")), ["A", "B"])
+        self.assertEqual(names(self.index.at("K001", "2026-03-31")), ["A", "B"])
+        latest = self.index.at("K001")
+        self.assertEqual(names(latest), ["A"])
+        self.assertEqual(latest[0].default_student_count, 21)
+        self.assertEqual(names(self.index.at("K001", "")), ["A"])
+        self.assertEqual(self.index.at("K003"), [])
+
+    def test_pending_snapshots(self):
+        self.assertEqual([d for d, _ in self.index.after("K001", "2026-02-15")], ["2026-04-01"])
+        self.assertEqual(self.index.after("K002", "2026-02-15"), [])
+
+    def test_validated_once_per_classes_load(self):
+        wb = seeded_workbook(kindergartens=2)
+        sheets._dcache_bust()
+        with patch.object(sheets, "get_db_connection", return_value=wb):
+            with patch.object(sheets, "ClassMaster", wraps=sheets.ClassMaster) as validate:
+                first = sheets._get_class_index(wb)
+                self.assertIs(sheets._get_class_index(wb), first)
+                sheets.get_classes_for_kindergarten("K001", "2026-02-01")
+                self.assertEqual(len(sheets.get_class_master()), 8)
+                self.assertEqual(validate.call_count, 8)
+
+                sheets._dcache_bust("cls_raw")
+                self.assertIsNot(sheets._get_class_index(wb), first)
+                self.assertEqual(validate.call_count, 16)
+        self.assertEqual(wb.calls["get_all_records"], 2)
+
+    def test_month_of_expected_counts_is_fast(self):
+        wb = seeded_workbook(kindergartens=300, classes_per_kindergarten=6, months=1)
+        sheets._dcache_bust()
+        days = [(date(2026, 1, 1) + timedelta(days=i)).isoformat() for i in range(31)]
+        with patch.object(sheets, "get_db_connection", return_value=wb):
+            sheets.get_classes_for_kindergarten("K001")  # load the sheet and build the index
+            started = time.perf_counter()
+            expected = {
+                (f"K{k:03d}", d): sum(c.default_student_count for c in
+                                      sheets.get_classes_for_kindergarten(f"K{k:03d}", d))
+                for k in range(1, 301) for d in days
+            }
+            elapsed = time.perf_counter() - started
+        self.assertEqual(len(expected), 300 * 31)
+        self.assertTrue(all(expected.values()))
+        self.assertLess(elapsed, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,301 @@
+import sys
+import os
+import json
+import tempfile
+import tracemalloc
+import unittest
+from unittest.mock import DEFAULT, MagicMock, patch
+
+# Add parent directory to path so we can import backend
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gspread.utils import a1_range_to_grid_range, a1_to_rowcol
+
+from backend import sheets
+from fake_sheets import FakeSpreadsheet, _api_error
+
+
+def _order(oid, kid, date, cls="ひよこ組", student=10):
+    return {
+        "order_id": oid, "kindergarten_id": kid, "date": date, "class_name": cls,
+        "meal_type": "通常", "student_count": student, "allergy_count": 1,
+        "teacher_count": 2, "memo": "", "updated_at": "", "submitted_by": "",
+    }
+
+
+RECORDS = [
+    _order("o1", "K001", "2026-03-02"),
+    _order("o2", "K001", "2026-03-03"),
+    _order("o3", "K002", "2026-03-02"),
+    _order("o4", "K001", "2026-04-01"),
+]
+HEADERS = list(RECORDS[0].keys())
+
+
+def _values(records):
+    return [HEADERS] + [[str(r[h]) for h in HEADERS] for r in records]
+
+
+class TestOrderIndex(unittest.TestCase):
+
+    def setUp(self):
+        sheets._dcache_bust()
+
+    def test_partitions(self):
+        # A broken row is skipped but still counted for row addressing
+        index = sheets._OrderIndex(_values(RECORDS) + [["", "K003"]])
+        self.assertEqual(index.row_count, 5)
+        self.assertEqual(index.row_of(RECORDS[3]), 5)
+        self.assertEqual([o.order_id for o in index.for_month("K001", 2026, 3)], ["o1", "o2"])
+        self.assertEqual([o.order_id for o in index.for_month("K002", 2026, 3)], ["o3"])
+        self.assertEqual(index.for_month("K002", 2026, 4), [])
+        self.assertEqual(sorted(o.order_id for o in index.for_date("2026-03-02")), ["o1", "o3"])
+        by_kid = index.month_by_kindergarten(2026, 3)
+        self.assertEqual(sorted(by_kid), ["K001", "K002"])
+
+    def test_compact_storage(self):
+        usual = _order("2026-03-02_K001_ひよこ組", "K001", "2026-03-02")
+        index = sheets._OrderIndex(_values([usual] + RECORDS))
+        self.assertEqual(sorted(index.custom_ids), ["o1", "o2", "o3", "o4"])
+        # Repeated text is stored once
+        self.assertEqual(index.strings.values.count("ひよこ組"), 1)
+        order = index.for_date("2026-03-02")[0]
+        self.assertIsInstance(order, sheets.OrderData)
+        self.assertEqual(order.model_dump(), sheets.OrderData(**usual).model_dump())
+
+        # Replacing keeps the sheet row; a new order has none until appended
+        index.put([sheets.OrderData(**dict(usual, student_count=3)), sheets.OrderData(**_order("o9", "K003", "2026-03-05"))])
+        self.assertEqual(index.for_date("2026-03-02")[0].student_count, 3)
+        self.assertEqual(index.row_of(usual), 2)
+        self.assertIsNone(index.row_of({"order_id": "o9"}))
+        index.record_appended([_order("o9", "K003", "2026-03-05")])
+        self.assertEqual(index.row_of({"order_id": "o9"}), 7)
+        self.assertEqual(index.project(["student_count"], "2026-03")[0], {"student_count": 3})
+
+    def test_memory_per_order(self):
+        headers = sheets.ORDER_HEADERS
+        values = [headers] + [
+            [f"2026-03-{d:02d}_K{k:03d}_{c}組", f"2026-03-{d:02d}", f"K{k:03d}", f"{c}組", "通常",
+             "20", "1", "2", "", f"2026-02-20 09:{k % 60:02d}:00", f"user{k}"]
+            for d in range(1, 29) for k in range(100) for c in "ABC"
+        ]
+        tracemalloc.start()
+        try:
+            index = sheets._OrderIndex(values)
+            size, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(len(index.select("2026-03")), 8400)
+        self.assertLess(size / 8400, 80)  # bytes per order
+
+    def test_readers_share_one_month_read(self):
+        wb = FakeSpreadsheet({"orders": _values(RECORDS)})
+        with patch.object(sheets, "get_db_connection", return_value=wb):
+            self.assertEqual(len(sheets.get_orders_for_month("K001", 2026, 3)), 2)
+            self.assertEqual(len(sheets.get_orders_for_month("K002", 2026, 3)), 1)
+            self.assertEqual(len(sheets.get_orders_for_date("2026-03-02")), 2)
+            self.assertEqual(len(sheets.get_orders_by_kindergarten(2026, 4)["K001"]), 1)
+        # header + date column once, then one row window per month; never the whole sheet
+        self.assertEqual(wb.calls["row_values"], 1)
+        self.assertEqual(wb.calls["batch_get"], 3)
+        self.assertEqual(wb.calls["get_all_values"], 0)
+
+    def test_month_window(self):
+        index = sheets._OrderIndex(_values(RECORDS))
+        self.assertEqual(index.month_rows, {"2026-03": [2, 4], "2026-04": [5, 5]})
+
+    def test_read_order_columns(self):
+        wb = FakeSpreadsheet({"orders": _values(RECORDS)})
+        with patch.object(sheets, "get_db_connection", return_value=wb):
+            rows = sheets.read_order_columns(["kindergarten_id", "student_count"], 2026, 3)
+            self.assertEqual(sorted(r["order_id"] for r in rows), ["o1", "o2", "o3"])
+            self.assertEqual(set(rows[0]), {"order_id", "date", "kindergarten_id", "student_count"})
+            self.assertEqual(rows[0]["student_count"], 10)
+
+            sheets._get_order_index(wb)
+            wb.reset_counts()
+            rows = sheets.read_order_columns(["kindergarten_id"], 2026, 4)
+        self.assertEqual([r["order_id"] for r in rows], ["o4"])
+        self.assertEqual(wb.reads, 0)
+
+
+class TestOrderWriteThrough(unittest.TestCase):
+
+    def setUp(self):
+        sheets._dcache_bust()
+        self.ws = MagicMock()
+        self.ws.get_all_values.return_value = _values(RECORDS)
+        self.ws.append_rows.return_value = {"updates": {"updatedRange": "orders!A6:K6"}}
+        # order_id per sheet row, for the id check before updates
+        self.ids = {i + 2: r["order_id"] for i, r in enumerate(RECORDS)}
+        self.ws.append_rows.side_effect = self._append
+        self.ws.batch_get.side_effect = self._batch_get
+        self.wb = MagicMock()
+        self.wb.worksheet.side_effect = lambda name: self.ws if name == "orders" else MagicMock()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        p = patch.object(sheets._order_queue, "journal_path", os.path.join(tmp.name, "queue.jsonl"))
+        p.start()
+        self.addCleanup(p.stop)
+        self.addCleanup(self._drop_queue)
+
+    def _append(self, rows, *args, **kwargs):
+        start = a1_to_rowcol(self.ws.append_rows.return_value["updates"]["updatedRange"].split("!")[1].split(":")[0])[0]
+        for i, row in enumerate(rows):
+            self.ids[start + i] = row[0]
+        return DEFAULT
+
+    def _batch_get(self, ranges, **kwargs):
+        blocks = []
+        for name in ranges:
+            grid = a1_range_to_grid_range(name)
+            blocks.append([[self.ids.get(r + 1, "")] for r in range(grid["startRowIndex"], grid["endRowIndex"])])
+        return blocks
+
+    def _drop_queue(self):
+        queue = sheets._order_queue
+        if queue._timer is not None:
+            queue._timer.cancel()
+            queue._timer = None
+        queue._pending.clear()
+
+    def _save(self, orders):
+        with patch.object(sheets, "get_db_connection", return_value=self.wb), \
+                patch("backend.notifications.send_admin_notification"):
+            sheets._get_order_index(self.wb)  # flushes write through the full index when it is loaded
+            self.assertTrue(sheets.batch_save_orders(orders))
+            self.assertTrue(sheets.flush_order_queue())
+            return {o.order_id: o for o in sheets.get_orders_for_month("K001", 2026, 3)}
+
+    def test_save_updates_cache_without_refetch(self):
+        orders = self._save([
+            _order("o1", "K001", "2026-03-02", student=99),
+            _order("o5", "K001", "2026-03-04"),
+        ])
+        self.assertEqual(orders["o1"].student_count, 99)
+        self.assertIn("o5", orders)
+        self.assertEqual(self.ws.get_all_values.call_count, 1)
+        self.assertEqual(self.ws.batch_update.call_args[0][0][0]["range"], "A2:K2")
+
+    def test_single_update_is_one_write(self):
+        self._save([_order("o1", "K001", "2026-03-02")])
+        self.ws.get_all_values.reset_mock()
+        self._save([_order("o2", "K001", "2026-03-03", student=5)])
+        self.ws.get_all_values.assert_not_called()
+        self.assertEqual(self.ws.batch_update.call_args[0][0][0]["range"], "A3:K3")
+
+    def test_appended_rows_extend_row_map(self):
+        self._save([_order("o5", "K001", "2026-03-04")])
+        self.ws.append_rows.return_value = {"updates": {"updatedRange": "orders!A7:K7"}}
+        self._save([_order("o6", "K001", "2026-03-05")])
+        self._save([_order("o5", "K001", "2026-03-04", student=1)])
+        self.assertEqual(self.ws.batch_update.call_args[0][0][0]["range"], "A6:K6")
+        self.assertEqual(self.ws.get_all_values.call_count, 1)
+
+    def test_stale_row_map_is_rebuilt(self):
+        # Someone appended a row by hand since the cache was loaded
+        self.ws.append_rows.return_value = {"updates": {"updatedRange": "orders!A7:K7"}}
+        self._save([_order("o5", "K001", "2026-03-04")])
+        self.assertIsNone(sheets._dcache_get("ord_raw"))
+        sheets._get_order_index(self.wb)
+        self.assertEqual(self.ws.get_all_values.call_count, 2)
+
+
+    def test_moved_rows_are_found_again(self):
+        self._save([_order("o1", "K001", "2026-03-02")])
+        # o1's row deleted by hand: everything below moved up one row
+        self.ws.get_all_values.return_value = _values(RECORDS[1:])
+        self.ids = {i + 2: r["order_id"] for i, r in enumerate(RECORDS[1:])}
+        self.ws.append_rows.return_value = {"updates": {"updatedRange": "orders!A5:K5"}}
+        self._save([_order("o2", "K001", "2026-03-03", student=5)])
+        self.assertEqual(self.ws.batch_update.call_args[0][0][0]["range"], "A2:K2")
+        self.assertEqual(self.ws.get_all_values.call_count, 2)
+
+
+class TestWriteBehindQueue(TestOrderWriteThrough):
+
+    def test_saves_in_window_coalesce(self):
+        with patch.object(sheets, "get_db_connection", return_value=self.wb), \
+                patch("backend.notifications.send_admin_notification") as notify:
+            sheets._get_order_index(self.wb)
+            for n in range(5):
+                sheets.batch_save_orders([_order("o1", "K001", "2026-03-02", student=n)])
+            sheets.batch_save_orders([_order("o5", "K001", "2026-03-04")])
+            # Read-your-writes before anything reached the sheet
+            cached = {o.order_id: o for o in sheets.get_orders_for_month("K001", 2026, 3)}
+            self.assertEqual(cached["o1"].student_count, 4)
+            self.assertIn("o5", cached)
+            self.ws.batch_update.assert_not_called()
+
+            self.assertTrue(sheets.flush_order_queue())
+        self.assertEqual(self.ws.batch_update.call_count, 1)
+        self.assertEqual(self.ws.append_rows.call_count, 1)
+        self.assertEqual(self.ws.batch_update.call_args[0][0][0]["values"][0][5], 4)
+        self.assertEqual(notify.call_count, 1)
+
+    def test_failed_flush_stays_queued(self):
+        self.ws.batch_update.side_effect = Exception("boom")
+        with patch.object(sheets, "get_db_connection", return_value=self.wb), \
+                patch("backend.notifications.send_admin_notification"):
+            sheets.batch_save_orders([_order("o1", "K001", "2026-03-02", student=7)])
+            self.assertFalse(sheets.flush_order_queue())
+            self.assertEqual(len(sheets._order_queue.pending()), 1)
+            # Pending saves survive the cache reload triggered by the failure
+            cached = {o.order_id: o for o in sheets._get_order_index(self.wb).for_month("K001", 2026, 3)}
+            self.assertEqual(cached["o1"].student_count, 7)
+
+            self.ws.batch_update.side_effect = None
+            self.assertTrue(sheets.flush_order_queue())
+        self.assertEqual(sheets._order_queue.pending(), [])
+
+    def test_save_during_reload_is_kept(self):
+        def fetch():
+            index = sheets._build_order_index(_values(RECORDS))
+            # Saved after the queue was read for the new index, before it is stored
+            sheets.batch_save_orders([_order("o1", "K001", "2026-03-02", student=55)])
+            return index
+        sheets._dcache_bust()
+        sheets._load("ord_raw", fetch)
+        cached = {o.order_id: o for o in sheets._dcache_get("ord_raw").for_month("K001", 2026, 3)}
+        self.assertEqual(cached["o1"].student_count, 55)
+
+    def test_notifications_sent_after_flush(self):
+        queue = sheets._order_queue
+        with patch.object(sheets, "get_db_connection", return_value=self.wb), \
+                patch("backend.notifications.send_admin_notification") as notify:
+            notify.side_effect = lambda *a: self.assertFalse(queue._flush_lock.locked())
+            sheets._get_order_index(self.wb)
+            sheets.batch_save_orders([_order("o1", "K001", "2026-03-02", student=3)])
+            self.assertTrue(sheets.flush_order_queue())
+        self.assertEqual(notify.call_count, 1)
+
+    def test_rejected_rows_are_dead_lettered(self):
+        def writer(rows):
+            if any(r["order_id"] == "bad" for r in rows):
+                raise _api_error(400, "INVALID_ARGUMENT", "bad row")
+            written.extend(r["order_id"] for r in rows)
+
+        written = []
+        queue = sheets.WriteBehindQueue(writer, sheets._order_queue.journal_path, window=60,
+                                        is_permanent=sheets._rejected_write)
+        queue.submit([_order("o1", "K001", "2026-03-02"), _order("bad", "K001", "2026-03-02"),
+                      _order("o2", "K001", "2026-03-03")])
+        self.assertTrue(queue.flush())
+        self.assertEqual(written, ["o1", "o2"])
+        self.assertEqual(queue.pending(), [])
+        with open(queue.dead_letter_path, encoding="utf-8") as f:
+            dead = [json.loads(line) for line in f]
+        self.assertEqual([d["row"]["order_id"] for d in dead], ["bad"])
+        self.assertEqual(queue.recover(), 0)
+
+    def test_journal_is_replayed(self):
+        sheets.batch_save_orders([_order("o1", "K001", "2026-03-02", student=42)])
+        queue = sheets.WriteBehindQueue(MagicMock(), sheets._order_queue.journal_path, window=60)
+        self.assertEqual(queue.recover(), 1)
+        self.assertTrue(queue.flush())
+        queue.writer.assert_called_once()
+        self.assertEqual(queue.writer.call_args[0][0][0]["student_count"], 42)
+
+
+if __name__ == '__main__':
+    unittest.main()
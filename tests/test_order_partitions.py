@@ -0,0 +1,119 @@
+import sys
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+# Add parent directory to path so we can import backend
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend import sheets, storage, api
+from fake_sheets import FakeWorksheet, seeded_workbook
+from backend.scripts.split_orders_by_month import split_orders_by_month
+
+
+class TestMonthlyOrders(unittest.TestCase):
+    """ORDERS_LAYOUT=monthly on a workbook split by the migration script."""
+
+    def setUp(self):
+        sheets._dcache_bust()
+        storage.set_backend(sheets)
+        self.wb = seeded_workbook(kindergartens=5, classes_per_kindergarten=2, months=3)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patches = [
+            patch.object(sheets, "get_db_connection", return_value=self.wb),
+            patch.object(sheets, "ORDERS_LAYOUT", "monthly"),
+            patch.object(sheets._order_queue, "journal_path", os.path.join(tmp.name, "queue.jsonl")),
+            patch.object(sheets, "CACHE_SNAPSHOT_FILE", os.path.join(tmp.name, "sheets_cache.json")),
+            patch("backend.notifications.send_admin_notification"),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(storage.set_backend, None)
+        self.written = split_orders_by_month(self.wb)
+        self.wb.reset_counts()
+
+    def test_split(self):
+        flat = self.wb.values("orders")
+        self.assertEqual(sorted(self.written), ["orders_2026_01", "orders_2026_02", "orders_2026_03"])
+        self.assertEqual(sum(self.written.values()), len(flat) - 1)
+        feb = self.wb.values("orders_2026_02")
+        self.assertEqual(feb[0], flat[0])
+        self.assertTrue(all(row[1].startswith("2026-02") for row in feb[1:]))
+        # Re-running leaves existing month sheets alone
+        self.assertEqual(split_orders_by_month(self.wb), {})
+
+    def test_split_writes_counts_as_numbers(self):
+        wb = seeded_workbook(kindergartens=1, classes_per_kindergarten=1, months=1)
+        with patch.object(FakeWorksheet, "batch_update", autospec=True,
+                          side_effect=FakeWorksheet.batch_update) as batch_update:
+            split_orders_by_month(wb)
+        (_, data), _ = batch_update.call_args
+        headers, first = data[0]["values"][:2]
+        self.assertEqual(headers, sheets.ORDER_HEADERS)
+        self.assertIsInstance(first[headers.index("student_count")], int)
+        self.assertIsInstance(first[headers.index("date")], str)
+        self.assertEqual(wb.values("orders_2026_01")[1:], wb.values("orders")[1:])
+
+    def test_split_refuses_when_orders_changed(self):
+        wb = seeded_workbook(kindergartens=1, classes_per_kindergarten=1, months=1)
+        ws = wb.worksheet("orders")
+        late = list(ws.get_all_values()[1])
+        late[0] = "late"
+        add_worksheet = wb.add_worksheet
+        def add_during_split(*args, **kwargs):
+            ws.append_rows([late])  # an order saved while the script runs
+            return add_worksheet(*args, **kwargs)
+        with patch.object(wb, "add_worksheet", side_effect=add_during_split):
+            self.assertEqual(split_orders_by_month(wb), {})
+        self.assertEqual(split_orders_by_month(wb, overwrite=True), {"orders_2026_01": len(ws.get_all_values()) - 1})
+
+    def test_reads_one_month_sheet(self):
+        orders = api.get_calendar("K001", 2026, 2)["orders"]
+        self.assertEqual(len(orders), 2 * 20)  # 2 classes x 20 weekdays in Feb 2026
+        self.assertEqual(self.wb.calls["get_all_values"], 1)
+        self.assertEqual(len(sheets.get_orders_for_date("2026-02-02")), 10)
+        self.assertEqual(self.wb.calls["get_all_values"], 1)
+        self.assertEqual({r["kindergarten_id"] for r in sheets.read_order_columns(["kindergarten_id"], 2026, 3)},
+                         {"K001", "K002", "K003", "K004", "K005"})
+
+    def test_totals_across_month_sheets(self):
+        by_month = sheets.get_order_totals(["month"])
+        self.assertEqual([r["month"] for r in by_month], ["2026-01", "2026-02", "2026-03"])
+        feb, = [r for r in by_month if r["month"] == "2026-02"]
+        self.assertEqual(feb["total"], sum(r["total"] for r in sheets.get_order_totals(["kindergarten_id"], 2026, 2)))
+
+    def test_writes_are_routed_by_month(self):
+        order = sheets.get_orders_for_month("K002", 2026, 1)[3].model_dump()
+        order["student_count"] = 77
+        new = dict(order, order_id="2026-04-01_K002_1組", date="2026-04-01")
+        self.assertTrue(sheets.batch_save_orders([order, new]))
+        self.assertTrue(sheets.flush_order_queue())
+
+        jan = {row[0]: row for row in self.wb.values("orders_2026_01")}
+        self.assertEqual(jan[order["order_id"]][5], "77")
+        self.assertEqual(len(jan), self.written["orders_2026_01"] + 1)
+        april = self.wb.values("orders_2026_04")
+        self.assertEqual(april[0], sheets.ORDER_HEADERS)
+        self.assertEqual([row[0] for row in april[1:]], [new["order_id"]])
+        self.assertEqual(len(self.wb.values("orders")) - 1, sum(self.written.values()))
+
+        sheets._dcache_bust()
+        self.assertEqual(sheets.get_orders_for_month("K002", 2026, 4)[0].student_count, 77)
+
+    def test_prefetch_months_around_today(self):
+        with patch.object(sheets, "datetime") as dt:
+            dt.now.return_value = datetime(2026, 2, 10)
+            self.assertTrue(sheets.prefetch_all())
+        self.assertEqual(self.wb.calls["values_batch_get"], 1)
+        self.wb.reset_counts()
+        for month in (1, 2, 3):
+            sheets.get_orders_by_kindergarten(2026, month)
+        self.assertEqual(self.wb.reads, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
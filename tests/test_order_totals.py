@@ -0,0 +1,145 @@
+import sys
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+# Add parent directory to path so we can import backend
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend import sheets, storage, api
+from backend.order_totals import group_totals, totals_from_records, merge_totals, COUNT_FIELDS
+from tests.test_sheets_api_calls import SheetsApiCallTest
+
+
+def _reference(orders, key):
+    """Plain Python group-by to check the vectorised one against."""
+    out = {}
+    for o in orders:
+        t = out.setdefault(key(o), dict.fromkeys(COUNT_FIELDS + ("total",), 0))
+        for f in COUNT_FIELDS:
+            t[f] += o[f]
+            t["total"] += o[f]
+    return out
+
+
+RECORDS = [
+    {"date": "2026-03-02", "kindergarten_id": "K001", "class_name": "A", "meal_type": "通常",
+     "student_count": 10, "allergy_count": 1, "teacher_count": 2},
+    {"date": "2026-03-02", "kindergarten_id": "K002", "class_name": "A", "meal_type": "カレー",
+     "student_count": 5, "allergy_count": 0, "teacher_count": 1},
+    {"date": "2026-03-03", "kindergarten_id": "K001", "class_name": "B", "meal_type": "通常",
+     "student_count": 7, "allergy_count": "", "teacher_count": 1},
+    {"date": "2026-04-01", "kindergarten_id": "K002", "class_name": "A", "meal_type": "通常",
+     "student_count": 3, "allergy_count": 2, "teacher_count": 0},
+]
+AREAS = {"K001": "北", "K002": "南"}
+
+
+class TestGroupTotals(unittest.TestCase):
+
+    def test_dimensions(self):
+        by_kid = totals_from_records(RECORDS, ["kindergarten_id"])
+        self.assertEqual(by_kid, [
+            {"kindergarten_id": "K001", "student_count": 17, "allergy_count": 1, "teacher_count": 3, "total": 21},
+            {"kindergarten_id": "K002", "student_count": 8, "allergy_count": 2, "teacher_count": 1, "total": 11},
+        ])
+        by_month_area = totals_from_records(RECORDS, ["month", "area"], AREAS)
+        self.assertEqual([(r["month"], r["area"], r["total"]) for r in by_month_area],
+                         [("2026-03", "北", 21), ("2026-03", "南", 6), ("2026-04", "南", 5)])
+        grand, = totals_from_records(RECORDS, [])
+        self.assertEqual(grand["total"], 32)
+        self.assertEqual(totals_from_records([], ["date"]), [])
+        with self.assertRaises(ValueError):
+            totals_from_records(RECORDS, ["price"])
+
+    def test_merge(self):
+        by = ["meal_type"]
+        merged = merge_totals([totals_from_records(RECORDS[:2], by), totals_from_records(RECORDS[2:], by)], by)
+        self.assertEqual(merged, totals_from_records(RECORDS, by))
+
+    def test_years_of_orders_in_milliseconds(self):
+        rng = np.random.default_rng(0)
+        n = 1_000_000  # ~5 years x 300 kindergartens x 3 classes
+        labels = [f"2026-{m:02d}-{d:02d}" for m in range(1, 13) for d in range(1, 29)] + \
+                 [f"K{k:03d}" for k in range(300)] + ["A", "B", "C", "通常", "カレー"]
+        codes = {
+            "date": rng.integers(0, 336, n), "kindergarten_id": rng.integers(336, 636, n),
+            "class_name": rng.integers(636, 639, n), "meal_type": rng.integers(639, 641, n),
+        }
+        counts = {f: rng.integers(0, 30, n) for f in COUNT_FIELDS}
+        started = time.perf_counter()
+        rows = group_totals(labels, codes, counts, ["month", "kindergarten_id", "meal_type"])
+        self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertEqual(len(rows), 12 * 300 * 2)
+        self.assertEqual(sum(r["student_count"] for r in rows), int(counts["student_count"].sum()))
+
+
+class TestSheetsOrderTotals(SheetsApiCallTest):
+
+    def test_matches_orders(self):
+        orders = [o.model_dump() for os_ in sheets.get_orders_by_kindergarten(2026, 1).values() for o in os_]
+        areas = {k.kindergarten_id: k.area for k in sheets.get_kindergartens()}
+        expected = _reference(orders, lambda o: (areas[o["kindergarten_id"]], o["class_name"]))
+        rows = sheets.get_order_totals(["area", "class_name"], 2026, 1)
+        self.assertEqual({(r["area"], r["class_name"]): {f: r[f] for f in COUNT_FIELDS + ("total",)} for r in rows},
+                         expected)
+
+        day = [o.model_dump() for o in sheets.get_orders_for_date("2026-01-05")]
+        self.assertEqual({r["kindergarten_id"]: r["total"] for r in sheets.get_order_totals(["kindergarten_id"], date="2026-01-05")},
+                         {k: t["total"] for k, t in _reference(day, lambda o: o["kindergarten_id"]).items()})
+        months = [r["month"] for r in sheets.get_order_totals(["month"])]
+        self.assertEqual(months, ["2026-01", "2026-02"])
+
+    def test_queued_saves_are_counted(self):
+        order = sheets.get_orders_for_date("2026-01-05")[0].model_dump()
+        before, = sheets.get_order_totals([], date="2026-01-05")
+        sheets.batch_save_orders([dict(order, student_count=order["student_count"] + 100)])
+        after, = sheets.get_order_totals([], date="2026-01-05")
+        self.assertEqual(after["student_count"], before["student_count"] + 100)
+
+    def test_daily_list_totals(self):
+        data = api.get_daily_orders("2026-01-05")
+        for k in data["kindergartens"]:
+            self.assertEqual(k["totals"]["student"], sum(o["student_count"] for o in k["orders"]))
+        self.assertEqual(data["grand_total"], sum(k["totals"]["grand_total"] for k in data["kindergartens"]))
+        totals = api.get_admin_order_totals(by="area,meal_type", year=2026, month=1)["totals"]
+        self.assertEqual(sum(t["total"] for t in totals),
+                         sum(k["totals"]["grand_total"] for k in api.get_admin_orders(2026, 1)["data"]))
+        with self.assertRaises(api.HTTPException):
+            api.get_admin_order_totals(by="price")
+
+    def test_malformed_period_is_rejected(self):
+        for kwargs in ({"date": "2026-1"}, {"date": "2026-02-30"}, {"year": 2026}, {"year": 2026, "month": 13}):
+            with self.assertRaises(ValueError):
+                sheets.get_order_totals(["kindergarten_id"], **kwargs)
+            with self.assertRaises(api.HTTPException) as ctx:
+                api.get_admin_order_totals(**kwargs)
+            self.assertEqual(ctx.exception.status_code, 400)
+        with self.assertRaises(api.HTTPException) as ctx:
+            api.get_daily_orders("2026-1-5")
+        self.assertEqual(ctx.exception.status_code, 400)
+
+    def test_list_and_totals_read_the_index_once(self):
+        order = sheets.get_orders_for_date("2026-01-05")[0].model_dump()
+        index = sheets._get_month_orders(self.wb, 2026, 1)
+        totals = index.totals
+        saver = threading.Thread(target=sheets.batch_save_orders,
+                                 args=([dict(order, student_count=order["student_count"] + 100)],))
+        def save_in_between(*args, **kwargs):
+            # A save landing after the orders were listed waits for the lock
+            saver.start()
+            saver.join(0.1)
+            return totals(*args, **kwargs)
+        with patch.object(index, "totals", side_effect=save_in_between):
+            data = api.get_daily_orders("2026-01-05")
+        saver.join()
+        for k in data["kindergartens"]:
+            self.assertEqual(k["totals"]["student"], sum(o["student_count"] for o in k["orders"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
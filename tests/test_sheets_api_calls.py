@@ -0,0 +1,657 @@
+import sys
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path so we can import backend
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gspread.exceptions import APIError
+from backend import sheets, storage, api
+from fake_sheets import seeded_workbook
+
+
+class SheetsApiCallTest(unittest.TestCase):
+    """Base: backend.sheets wired to a seeded FakeSpreadsheet with a cold cache."""
+
+    SCALE = dict(kindergartens=30, classes_per_kindergarten=3, months=2)
+
+    def setUp(self):
+        sheets._dcache_bust()
+        storage.set_backend(sheets)
+        self.wb = seeded_workbook(**self.SCALE)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patches = [
+            patch.object(sheets, "get_db_connection", return_value=self.wb),
+            patch("backend.notifications.send_admin_notification"),
+            patch.object(sheets._order_queue, "journal_path", os.path.join(tmp.name, "queue.jsonl")),
+            patch.object(sheets, "CACHE_SNAPSHOT_FILE", os.path.join(tmp.name, "sheets_cache.json")),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(storage.set_backend, None)
+        self.addCleanup(self._drop_queue)
+
+    def _drop_queue(self):
+        # Saves a test left unflushed must not reach the next test's workbook
+        queue = sheets._order_queue
+        if queue._timer is not None:
+            queue._timer.cancel()
+            queue._timer = None
+        queue._pending.clear()
+
+
+class TestFakeWorkbook(SheetsApiCallTest):
+
+    def test_counts_and_quota(self):
+        wb = seeded_workbook(kindergartens=2, read_quota_per_minute=2)
+        ws = wb.worksheet("orders")
+        self.assertEqual(ws.get_all_values()[0][0], "order_id")
+        with self.assertRaises(APIError) as ctx:
+            ws.get_all_values()
+        self.assertEqual(ctx.exception.code, 429)
+        self.assertEqual(wb.reads, 2)
+        self.assertEqual(wb.calls["rejected_read"], 1)
+
+    def test_append_reports_range(self):
+        ws = self.wb.worksheet("orders")
+        rows = len(self.wb.values("orders"))
+        resp = ws.append_rows([["x"] * 11])
+        self.assertEqual(resp["updates"]["updatedRange"], f"orders!A{rows + 1}:K{rows + 1}")
+
+
+class TestEndpointCallCounts(SheetsApiCallTest):
+
+    def test_admin_month_view_reads_each_sheet_once(self):
+        data = api.get_admin_orders(2026, 1)["data"]
+        self.assertEqual(len(data), 30)
+        self.assertTrue(all(d["orders"] for d in data))
+        self.assertEqual(self.wb.calls["get_all_records"], 2)  # kindergartens + classes
+        # orders: header + date column, then January's row window only
+        self.assertEqual(self.wb.calls["row_values"], 1)
+        self.assertEqual(self.wb.calls["batch_get"], 2)
+        self.assertEqual(self.wb.calls["get_all_values"], 0)
+
+        self.wb.reset_counts()
+        api.get_admin_orders(2026, 1)
+        api.get_daily_orders("2026-01-05")
+        self.assertEqual(self.wb.reads, 0)
+
+    def test_warm_reads_skip_sheets(self):
+        api.get_admin_orders(2026, 1)
+        self.wb.reset_counts()
+        api.get_admin_orders(2026, 1)
+        self.assertEqual(self.wb.reads, 0)
+
+    def test_cold_calendar_reads_one_month(self):
+        orders = api.get_calendar("K001", 2026, 2)["orders"]
+        self.assertTrue(orders and all(o["date"].startswith("2026-02") for o in orders))
+        self.assertEqual(self.wb.calls["get_all_values"], 0)
+        self.assertEqual(self.wb.calls["batch_get"], 2)  # date column + February's rows
+
+    def test_single_order_update_is_one_write(self):
+        sheets.prefetch_all()
+        order = api.get_calendar("K001", 2026, 1)["orders"][0]
+        order["student_count"] = 99
+        self.wb.reset_counts()
+        self.assertTrue(sheets.batch_save_orders([order]))
+        self.assertTrue(sheets.flush_order_queue())
+        self.assertEqual(self.wb.calls["batch_update"], 1)
+        self.assertEqual(self.wb.writes, 1)
+        self.assertEqual(self.wb.calls["get_all_values"], 0)
+
+    def test_entries_carry_declared_tags(self):
+        sheets.get_kindergarten("K001")
+        sheets.get_orders_by_kindergarten(2026, 2)
+        self.assertEqual(sheets._cache.peek("ord_m_2026-02").tags, {"ord_m_2026-02", "ord_m"})
+        self.assertEqual(sheets._cache.peek("kg:models").tags, {"kg:models", "kg"})
+        self.assertEqual(sheets._cache.peek("ws:orders").tags, {"ws:orders"})
+        sheets._dcache_bust("kg")
+        self.assertIsNone(sheets._cache.peek("kg:models"))
+        self.assertIsNotNone(sheets._cache.peek("ord_m_2026-02"))
+
+    def test_flush_uses_month_window(self):
+        orders = api.get_calendar("K001", 2026, 2)["orders"]
+        sheets._dcache_bust("ord_m")
+        self.wb.reset_counts()
+        orders[0]["student_count"] = 98
+        self.assertTrue(sheets.batch_save_orders([orders[0]]))
+        self.assertTrue(sheets.flush_order_queue())
+        self.assertEqual(self.wb.calls["get_all_values"], 0)
+        self.assertEqual(self.wb.calls["batch_get"], 1)  # February's rows; just read, so not checked
+        self.assertEqual(self.wb.writes, 1)
+
+        # From the cached window: the id cells are checked, then one write
+        self.wb.reset_counts()
+        new = dict(orders[0], order_id="2026-02-28_K001_extra", date="2026-02-28", class_name="extra")
+        orders[1]["student_count"] = 97
+        self.assertTrue(sheets.batch_save_orders([orders[1], new]))
+        self.assertTrue(sheets.flush_order_queue())
+        self.assertEqual((self.wb.reads, self.wb.writes), (1, 2))  # update + append
+        new["student_count"] = 5
+        self.assertTrue(sheets.batch_save_orders([new]))
+        self.assertTrue(sheets.flush_order_queue())
+        self.assertEqual(self.wb.calls["append_rows"], 1)
+        rows = {row[0]: row for row in self.wb.values("orders")}
+        self.assertEqual([rows[o["order_id"]][5] for o in orders[:2]], ["98", "97"])
+        self.assertEqual(rows[new["order_id"]][5], "5")
+        self.assertEqual(len(rows), len(self.wb.values("orders")))  # no order written twice
+
+    def test_month_window_after_hand_deleted_row(self):
+        orders = api.get_calendar("K001", 2026, 2)["orders"]
+        self.wb._sheets["orders"]._values.pop(1)
+        orders[3]["student_count"] = 76
+        self.assertTrue(sheets.batch_save_orders([orders[3]]))
+        self.assertTrue(sheets.flush_order_queue())
+        self.assertEqual(self.wb.calls["get_all_values"], 0)
+        rows = [row for row in self.wb.values("orders") if row[0] == orders[3]["order_id"]]
+        self.assertEqual([row[5] for row in rows], ["76"])
+        self.assertEqual(sum(row[5] == "76" for row in self.wb.values("orders")), 1)
+
+
+class TestPrefetch(SheetsApiCallTest):
+
+    def test_prefetch_is_one_request(self):
+        self.assertTrue(sheets.prefetch_all())
+        self.assertEqual(self.wb.calls["values_batch_get"], 1)
+        self.assertEqual(self.wb.reads, 1)
+
+        self.wb.reset_counts()
+        api.get_admin_orders(2026, 1)
+        api.get_daily_orders("2026-01-05")
+        sheets.get_system_settings()
+        self.assertEqual(self.wb.reads, 0)
+
+    def test_prefetch_skips_missing_sheet(self):
+        del self.wb._sheets["admin_settings"]
+        self.assertTrue(sheets.prefetch_all())
+        self.assertEqual(self.wb.calls["values_batch_get"], 2)
+        self.wb.reset_counts()
+        self.assertTrue(sheets.get_kindergartens())
+        self.assertEqual(self.wb.reads, 0)
+        # The reader still creates the missing sheet with its defaults
+        self.assertIn("admin_emails", sheets.get_system_settings())
+
+    def test_prefetch_matches_per_sheet_reads(self):
+        cold = (sheets.get_kindergartens(), sheets.get_classes_for_kindergarten("K003"),
+                sheets.get_orders_by_kindergarten(2026, 2), sheets.get_system_settings())
+        sheets._dcache_bust()
+        self.assertTrue(sheets.prefetch_all())
+        warm = (sheets.get_kindergartens(), sheets.get_classes_for_kindergarten("K003"),
+                sheets.get_orders_by_kindergarten(2026, 2), sheets.get_system_settings())
+        self.assertEqual(cold, warm)
+
+
+class TestSystemSettings(SheetsApiCallTest):
+
+    def test_notifications_read_settings_once(self):
+        with patch("backend.notifications._send_email") as send:
+            from backend import notifications
+            for _ in range(3):
+                notifications.send_change_notification("変更", "園1", "K001", "A", "2026-01-05", "x")
+        self.assertEqual(send.call_count, 3)
+        self.assertEqual(self.wb.calls["get_all_records"], 1)
+
+    def test_writes_invalidate(self):
+        self.assertEqual(storage.get_settings().admin_emails, ["admin@example.com"])
+        self.assertTrue(sheets.update_system_settings({"admin_emails": "x@example.com", "reminder_days": 4}))
+        self.assertEqual(storage.get_settings().reminder_days, [4])
+        self.assertTrue(sheets.update_monthly_common_item("ふりかけ", "2026-03"))
+        self.assertEqual(sheets.get_monthly_common_items(), [{"year_month": "2026-03", "item": "ふりかけ"}])
+        self.assertTrue(sheets.delete_monthly_common_item("2026-03"))
+        self.assertEqual(sheets.get_monthly_common_items(), [])
+        self.assertEqual(storage.get_settings().admin_emails, ["x@example.com"])
+
+    def test_system_info_and_common_items_use_typed_settings(self):
+        sheets.update_system_settings({"admin_emails": "a@example.com, b@example.com", "reminder_days": 4,
+                                       "monthly_common_item": "のり", "monthly_common_year_month": "2026-02"})
+        sheets.update_monthly_common_item("ふりかけ", "2026-03")
+        sheets.update_monthly_common_item("ごま", "2026-04")
+        with patch("backend.drive.get_drive_service", return_value=None):
+            info = api.get_system_info()
+        self.assertEqual(info["admin_emails"], "a@example.com,b@example.com")
+        self.assertEqual(info["reminder_days"], "4")
+        self.assertEqual(info["monthly_common_year_month"], "2026-02")
+        # The single-item keys share the prefix but are not months
+        self.assertEqual(sheets.get_monthly_common_items(), [{"year_month": "2026-04", "item": "ごま"},
+                                                             {"year_month": "2026-03", "item": "ふりかけ"}])
+
+
+class TestSettingsUpserts(SheetsApiCallTest):
+
+    def setUp(self):
+        super().setUp()
+        sheets.get_system_settings()
+        self.wb.reset_counts()
+
+    def _sheet(self):
+        return {k: v for k, v in self.wb.values("admin_settings")[1:]}
+
+    def test_each_change_is_one_write(self):
+        self.assertTrue(sheets.update_monthly_common_item("ふりかけ", "2026-03"))
+        self.assertTrue(sheets.update_monthly_common_item("のり", "2026-03"))
+        self.assertTrue(sheets.update_system_settings({"reminder_days": "7,2", "admin_emails": "x@example.com"}))
+        self.assertTrue(sheets.delete_monthly_common_item("2026-03"))
+        self.assertEqual(self.wb.writes, 4)
+        self.assertEqual(self.wb.calls["spreadsheet_batch_update"], 4)
+        self.assertEqual(self.wb.calls["get_all_values"] + self.wb.calls["get_all_records"], 0)
+        self.assertEqual(self.wb.calls["batch_get"], 3)  # key cells of the rows updated/deleted
+        self.assertEqual(self._sheet(), {"admin_emails": "x@example.com", "reminder_days": "7,2"})
+
+    def test_saving_settings_keeps_other_keys(self):
+        sheets.update_monthly_common_item("ふりかけ", "2026-03")
+        sheets.update_system_settings({"admin_emails": "x@example.com"})
+        sheets.update_monthly_common_item("のり", "2026-04")
+        self.assertEqual(self._sheet(), {
+            "admin_emails": "x@example.com", "reminder_days": "5,3",
+            "monthly_common_2026-03": "ふりかけ", "monthly_common_2026-04": "のり",
+        })
+
+    def test_cache_matches_a_reread(self):
+        sheets.update_system_settings({"reminder_days": 4, "new_key": "a"})
+        sheets.update_monthly_common_item("ふりかけ", "2026-03")
+        sheets.delete_monthly_common_item("2026-03")
+        cached = sheets.get_system_settings()
+        sheets._dcache_bust("settings")
+        self.assertEqual(cached, sheets.get_system_settings())
+
+    def test_rows_sorted_by_hand_are_found(self):
+        sheets.update_monthly_common_item("ふりかけ", "2026-03")
+        sheets.update_monthly_common_item("のり", "2026-04")
+        # Sorted by hand after the cache was filled: keys are in other rows now
+        ws = self.wb.worksheet("admin_settings")
+        ws._values[1:] = sorted(ws._values[1:], reverse=True)
+        self.assertTrue(sheets.delete_monthly_common_item("2026-03"))
+        self.assertTrue(sheets.update_system_settings({"reminder_days": "1"}))
+        self.assertEqual(self._sheet(), {
+            "admin_emails": "admin@example.com", "reminder_days": "1", "monthly_common_2026-04": "のり",
+        })
+
+    def test_missing_sheet_is_created(self):
+        del self.wb._sheets["admin_settings"]
+        sheets._dcache_bust()
+        self.assertTrue(sheets.update_monthly_common_item("ふりかけ", "2026-03"))
+        self.assertEqual(self._sheet(), {"monthly_common_2026-03": "ふりかけ"})
+        self.assertEqual(sheets.get_monthly_common_items(), [{"year_month": "2026-03", "item": "ふりかけ"}])
+
+
+class TestKindergartenDirectory(SheetsApiCallTest):
+
+    def test_lookups_validate_once_per_load(self):
+        with patch.object(sheets, "kindergarten_from_record", wraps=sheets.kindergarten_from_record) as build:
+            self.assertEqual(sheets.get_kindergarten("K007").name, "園7")
+            self.assertEqual(sheets.get_kindergarten_by_login(" user12 ").kindergarten_id, "K012")
+            self.assertIsNone(sheets.get_kindergarten("K999"))
+            self.assertEqual(len(sheets.get_kindergartens()), 30)
+            self.assertEqual(build.call_count, 30)
+
+            sheets._dcache_bust("kg")
+            sheets.get_kindergarten("K001")
+            self.assertEqual(build.call_count, 60)
+
+            # A refresh reloads the records, so the next lookup revalidates once
+            sheets.prefetch_all()
+            sheets.get_kindergarten("K001")
+            sheets.get_kindergartens()
+            self.assertEqual(build.call_count, 90)
+
+    def test_login(self):
+        user = api.login(api.LoginRequest(login_id="user3", password="pass3"))
+        self.assertEqual(user["kindergarten_id"], "K003")
+        with self.assertRaises(api.HTTPException):
+            api.login(api.LoginRequest(login_id="user3", password="wrong"))
+
+
+class TestStaleWhileRevalidate(SheetsApiCallTest):
+
+    def _age(self, key, seconds):
+        sheets._cache.peek(key).stored -= seconds
+
+    def _wait_for_refresh(self):
+        deadline = time.time() + 5
+        while sheets._refreshing and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(sheets._refreshing)
+
+    def test_stale_entry_is_served_and_refreshed_once(self):
+        sheets.get_kindergartens()
+        self._age("kg", sheets._DATA_TTL + 1)
+        self.wb.reset_counts()
+        self.wb.latency = 0.2
+        started = time.perf_counter()
+        for _ in range(5):
+            self.assertEqual(len(sheets.get_kindergartens()), 30)
+        self.assertLess(time.perf_counter() - started, 0.2)
+        self._wait_for_refresh()
+        self.assertEqual(self.wb.calls["get_all_records"], 1)
+        self.assertLess(sheets._cache.peek("kg").age, sheets._DATA_TTL)
+
+    def test_past_hard_ttl_blocks(self):
+        api.get_admin_orders(2026, 1)
+        self._age("ord_m_2026-01", sheets._HARD_TTL + 1)
+        self.wb.reset_counts()
+        api.get_admin_orders(2026, 1)
+        self.assertEqual(self.wb.calls["batch_get"], 1)
+        self.assertFalse(sheets._refreshing)
+
+    def test_refresh_racing_a_write_is_dropped(self):
+        sheets.get_class_master()
+        self._age("cls_raw", sheets._DATA_TTL + 1)
+        self.wb.latency = 0.2
+        sheets.get_class_master()  # starts the refresh
+        sheets._dcache_bust("cls_raw")
+        self._wait_for_refresh()
+        self.assertIsNone(sheets._cache.peek("cls_raw"))
+
+
+class TestChangeDetection(SheetsApiCallTest):
+
+    def setUp(self):
+        super().setUp()
+        self.version = "1"
+        sheets._probe.update(version=None, checked=0.0)
+        self.addCleanup(sheets._probe.update, version=None, checked=0.0)
+        p = patch("backend.drive.get_file_version", side_effect=lambda file_id: self.version)
+        self.probe = p.start()
+        self.addCleanup(p.stop)
+
+    def _refresh(self, key):
+        sheets._cache.peek(key).stored -= sheets._DATA_TTL + 1
+        sheets._probe["checked"] = 0.0
+        sheets.get_kindergartens()
+        deadline = time.time() + 5
+        while sheets._refreshing and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_unchanged_sheet_is_not_reread(self):
+        sheets.prefetch_all()
+        self.wb.reset_counts()
+        renewals = sheets._cache.stats()["namespaces"]["kg"]["renewals"]
+        self._refresh("kg")
+        self.assertEqual(self.wb.reads, 0)
+        self.assertLess(sheets._cache.peek("kg").age, sheets._DATA_TTL)
+        self.assertEqual(sheets._cache.stats()["namespaces"]["kg"]["renewals"], renewals + 1)
+
+        self.version = "2"
+        self._refresh("kg")
+        self.assertEqual(self.wb.calls["get_all_records"], 1)
+        self.assertEqual(sheets._cache.peek("kg").source, "2")
+
+    def test_prefetch_skips_unchanged_download(self):
+        self.assertTrue(sheets.prefetch_all())
+        self.wb.reset_counts()
+        sheets._probe["checked"] = 0.0
+        self.assertTrue(sheets.prefetch_all())
+        self.assertEqual(self.wb.reads, 0)
+
+        self.version = "2"
+        sheets._probe["checked"] = 0.0
+        self.assertTrue(sheets.prefetch_all())
+        self.assertEqual(self.wb.calls["values_batch_get"], 1)
+
+    def test_probe_is_rate_limited(self):
+        for _ in range(3):
+            sheets.prefetch_all()
+        self.assertEqual(self.probe.call_count, 1)
+
+    def test_without_probe_refreshes_as_before(self):
+        self.version = None
+        sheets.prefetch_all()
+        self.wb.reset_counts()
+        self._refresh("kg")
+        self.assertEqual(self.wb.calls["get_all_records"], 1)
+
+
+class TestCacheSnapshot(SheetsApiCallTest):
+
+    def setUp(self):
+        super().setUp()
+        # The seeded orders are January and February 2026
+        p = patch.object(sheets, "_prefetch_months", return_value=["2025-12", "2026-01", "2026-02", "2026-03"])
+        p.start()
+        self.addCleanup(p.stop)
+
+    def _restart(self):
+        sheets._dcache_bust()
+        self.addCleanup(setattr, sheets, "_snapshot_restored", False)
+        self.addCleanup(sheets._snapshot_redacted.clear)
+        self.addCleanup(sheets._refreshing.clear)  # left by a patched-out _revalidate
+        p = patch.object(sheets, "_connect", return_value=self.wb)  # what _DeferredWorkbook connects to
+        p.start()
+        self.addCleanup(p.stop)
+        self.wb.reset_counts()
+        return sheets.load_cache_snapshot()
+
+    def test_restart_serves_from_snapshot(self):
+        self.assertTrue(sheets.prefetch_all())
+        warm = (sheets.get_kindergarten("K001").name, sheets.get_orders_by_kindergarten(2026, 1), sheets.get_system_settings())
+        self.assertEqual(self._restart(), 5)  # kindergartens, classes, settings, two order months
+        with patch.object(sheets, "_revalidate") as revalidate:
+            restored = (sheets.get_kindergarten("K001").name, sheets.get_orders_by_kindergarten(2026, 1), sheets.get_system_settings())
+            self.assertEqual(self.wb.reads, 0)
+            self.assertEqual(restored, warm)
+            # Restored entries are stale: the first read starts their revalidation
+            deadline = time.time() + 5
+            while revalidate.call_count < len(sheets._refreshing) and time.time() < deadline:
+                time.sleep(0.01)
+        self.assertTrue(revalidate.called)
+        for call in revalidate.call_args_list:
+            sheets._revalidate(*call.args)
+        self.assertFalse(sheets._refreshing)
+        self.assertEqual(self.wb.calls["get_all_records"], 2)  # kindergartens, settings
+        self.assertLess(sheets._cache.peek("kg").age, sheets._DATA_TTL)
+
+    def test_snapshot_is_private_and_has_no_passwords(self):
+        sheets.prefetch_all()
+        self.assertEqual(os.stat(sheets.CACHE_SNAPSHOT_FILE).st_mode & 0o777, 0o600)
+        with open(sheets.CACHE_SNAPSHOT_FILE, encoding="utf-8") as f:
+            text = f.read()
+        self.assertNotIn("password", text)
+        self.assertNotIn("pass1", text)
+
+    def test_snapshot_keeps_only_recent_order_months(self):
+        sheets.prefetch_all()
+        with patch.object(sheets, "_prefetch_months", return_value=["2026-02"]):
+            sheets.prefetch_all()
+        self._restart()
+        self.assertIsNone(sheets._cache.peek("ord_raw"))
+        self.assertIsNone(sheets._cache.peek("ord_m_2026-01"))
+        february = sheets._cache.peek("ord_m_2026-02").data
+        self.assertEqual(len(february.for_date("2026-02-02")), 90)
+        # The restored window still knows its sheet rows, so a save updates in place
+        rows = len(self.wb.values("orders"))
+        order = dict(february.for_date("2026-02-02")[0], memo="x")
+        self.assertTrue(sheets.batch_save_orders([order]))
+        self.assertTrue(sheets.flush_order_queue())
+        self.assertEqual(len(self.wb.values("orders")), rows)
+
+    def test_login_reads_passwords_after_restore(self):
+        sheets.prefetch_all()
+        self._restart()
+        with patch.object(sheets, "_revalidate"):
+            self.assertEqual(sheets.get_kindergarten("K001").password, "")
+            self.assertEqual(self.wb.reads, 0)
+            self.assertEqual(sheets.get_kindergarten_by_login("user1").password, "pass1")
+            self.assertEqual(sheets.get_kindergartens()[0].password, "pass1")
+        self.assertEqual(self.wb.calls["get_all_records"], 1)
+
+    def test_snapshot_of_other_spreadsheet_is_ignored(self):
+        with patch.dict(os.environ, {"SPREADSHEET_ID": "sheet-a"}):
+            sheets.prefetch_all()
+        with patch.dict(os.environ, {"SPREADSHEET_ID": "sheet-b"}):
+            self.assertEqual(self._restart(), 0)
+        self.assertIsNone(sheets._cache.peek("kg"))
+
+    def test_corrupt_snapshot_is_ignored(self):
+        with open(sheets.CACHE_SNAPSHOT_FILE, "w") as f:
+            f.write("{not json")
+        self.assertEqual(self._restart(), 0)
+
+    def test_deferred_workbook_connects_on_first_use(self):
+        sheets.prefetch_all()
+        self._restart()
+        wb = sheets._DeferredWorkbook()
+        self.assertEqual(sheets._connect.call_count, 0)
+        self.assertEqual(wb.worksheet("orders").title, "orders")
+        self.assertEqual(sheets._connect.call_count, 1)
+
+
+class TestSingleFlight(SheetsApiCallTest):
+
+    def _concurrently(self, fn, n=8):
+        results, errors = [], []
+        def run():
+            try:
+                results.append(fn())
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=run) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results, errors
+
+    def test_concurrent_misses_share_one_read(self):
+        self.wb.latency = 0.1
+        results, errors = self._concurrently(sheets.get_kindergartens)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(r == results[0] for r in results))
+        self.assertEqual(self.wb.calls["get_all_records"], 1)
+
+    def test_order_month_loads_coalesce(self):
+        self.wb.latency = 0.05
+        results, errors = self._concurrently(lambda: api.get_calendar("K001", 2026, 2)["orders"])
+        self.assertEqual(errors, [])
+        self.assertTrue(all(len(r) == len(results[0]) > 0 for r in results))
+        self.assertEqual(self.wb.calls["batch_get"], 2)  # date column + February's rows
+
+    def test_failure_is_shared(self):
+        def unavailable(title):
+            time.sleep(0.1)
+            raise sheets.SheetsUnavailableError("quota")
+        with patch.object(self.wb, "worksheet", side_effect=unavailable) as worksheet:
+            results, errors = self._concurrently(sheets.get_kindergartens)
+        self.assertEqual(len(errors), 8)
+        self.assertEqual(worksheet.call_count, 1)
+        self.assertEqual(sheets._flights, {})
+
+
+class TestHandleCache(SheetsApiCallTest):
+
+    SCALE = dict(kindergartens=4, classes_per_kindergarten=3, months=1)
+
+    def _class(self, kid):
+        return next(r for r in self.wb.values("classes")[1:] if r[0] == kid)
+
+    def test_repeat_updates_skip_metadata_and_headers(self):
+        name = self._class("K001")[1]
+        self.assertTrue(sheets.update_class_counts("K001", name, {"default_student_count": 10}))
+        self.wb.reset_counts()
+        self.assertTrue(sheets.update_class_counts("K001", name, {"default_student_count": 11}))
+        self.assertEqual(self.wb.calls["worksheet"], 0)
+        self.assertEqual(self.wb.calls["row_values"], 0)
+        self.assertEqual(self._class("K001")[4], "11")
+
+    def test_auto_created_column_updates_cached_headers(self):
+        for row in self.wb._sheets["kindergartens"]._values:
+            del row[-1]  # drop the "area" column
+        self.assertTrue(sheets.update_kindergarten_master({"kindergarten_id": "K002", "area": "北"}))
+        self.wb.reset_counts()
+        self.assertTrue(sheets.update_kindergarten_master({"kindergarten_id": "K002", "area": "南"}))
+        self.assertEqual(self.wb.calls["row_values"], 0)
+        header, *rows = self.wb.values("kindergartens")
+        self.assertEqual(header[-1], "area")
+        self.assertEqual(rows[1][-1], "南")
+
+    def test_manually_inserted_column_is_noticed(self):
+        name = self._class("K001")[1]
+        sheets.update_class_counts("K001", name, {"default_student_count": 10})
+        for row in self.wb._sheets["classes"]._values:
+            row.insert(2, "note" if row[0] == "kindergarten_id" else "")
+        self.assertTrue(sheets.update_class_counts("K001", name, {"default_student_count": 12}))
+        self.assertEqual(self._class("K001")[5], "12")
+        self.assertEqual(self._class("K001")[2], "")
+
+
+class TestTargetedRowEdits(SheetsApiCallTest):
+
+    SCALE = dict(kindergartens=4, classes_per_kindergarten=3, months=1)
+
+    def _rows(self, title, kid):
+        return [row for row in self.wb.values(title)[1:] if row[0] == kid]
+
+    def test_class_replace_touches_only_one_kindergarten(self):
+        before = self.wb.values("classes")
+        self.wb.reset_counts()
+        self.assertTrue(sheets.update_kindergarten_classes("K002", [{"class_name": "さくら組", "grade": "年長"}]))
+        self.assertEqual(self.wb.calls["spreadsheet_batch_update"], 1)
+        self.assertEqual(self.wb.calls["clear"], 0)
+        self.assertEqual(self.wb.writes, 1)
+
+        after = self.wb.values("classes")
+        self.assertEqual([r for r in after if r[0] != "K002"], [r for r in before if r[0] != "K002"])
+        k002, = self._rows("classes", "K002")
+        self.assertEqual(k002[1], "さくら組")
+
+    def test_update_after_hand_deleted_row(self):
+        sheets.prefetch_all()  # row map loaded before the edit
+        orders = [o.model_dump() for o in sheets.get_orders_for_month("K001", 2026, 1)]
+        deleted = self.wb._sheets["orders"]._values.pop(1)
+        before = self.wb.values("orders")
+        target = next(o for o in orders if o["order_id"] != deleted[0])
+        target["student_count"] = 77
+        self.assertTrue(sheets.batch_save_orders([target]))
+        self.assertTrue(sheets.flush_order_queue())
+        after = self.wb.values("orders")
+        changed = [(b, a) for b, a in zip(before, after) if b != a]
+        self.assertEqual(len(after), len(before))
+        self.assertEqual([(b[0], a[0], a[5]) for b, a in changed], [(target["order_id"], target["order_id"], "77")])
+
+    def test_scheduled_snapshot_and_delete(self):
+        sheets.update_kindergarten_classes("K003", [{"class_name": "A", "default_student_count": 9}], "2026-04-01")
+        sheets.update_kindergarten_classes("K003", [{"class_name": "B", "default_student_count": 8}], "2026-04-01")
+        scheduled = [r for r in self._rows("classes", "K003") if r[7] == "2026-04-01"]
+        self.assertEqual([(r[1], r[4]) for r in scheduled], [("B", "8")])
+        self.assertEqual(len(self._rows("classes", "K003")), 4)
+
+        self.assertTrue(sheets.delete_pending_class_snapshot("K003", "2026-04-01"))
+        self.assertEqual(len(self._rows("classes", "K003")), 3)
+        self.assertEqual(len(self.wb.values("classes")), 13)
+
+    def test_concurrent_class_edits_keep_their_rows(self):
+        sheets.update_kindergarten_classes("K004", [{"class_name": "予定", "default_student_count": 1}], "2026-04-01")
+        kids = ["K001", "K002", "K003"]
+        self.wb.latency = 0.02  # reads and writes of the threads would interleave
+        threads = [threading.Thread(target=sheets.update_kindergarten_classes,
+                                    args=(kid, [{"class_name": f"{kid}組"}])) for kid in kids]
+        threads.append(threading.Thread(target=sheets.delete_pending_class_snapshot, args=("K004", "2026-04-01")))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for kid in kids:
+            self.assertEqual([r[1] for r in self._rows("classes", kid)], [f"{kid}組"])
+        self.assertEqual(len(self._rows("classes", "K004")), 3)
+
+    def test_delete_backup_rows(self):
+        orders = [o.model_dump() for o in sheets.get_orders_for_month("K001", 2026, 1)]
+        sheets.backup_orders_for_class_change("K001", "2026-01-10", orders[:5], {})
+        sheets.backup_orders_for_class_change("K002", "2026-01-10", orders[5:7], {})
+        sheets.backup_orders_for_class_change("K001", "2026-01-20", orders[7:8], {})
+        self.wb.reset_counts()
+        self.assertTrue(sheets.delete_orders_backup("K001", "2026-01-10"))
+        self.assertEqual(self.wb.calls["spreadsheet_batch_update"], 1)
+        remaining = self.wb.values(sheets.ORDERS_BACKUP_SHEET)[1:]
+        self.assertEqual([(r[0], r[1]) for r in remaining],
+                         [("K002", "2026-01-10")] * 2 + [("K001", "2026-01-20")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import sys
+import os
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+# Add parent directory to path so we can import backend
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend import sheets
+
+
+class ConnectionTest(unittest.TestCase):
+    """_connect() with credential parsing and gspread stubbed out."""
+
+    def setUp(self):
+        self.wb = MagicMock(name="workbook")
+        self.creds = MagicMock(expiry=datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1))
+        self.client = MagicMock()
+        self.client.open_by_key.return_value = self.wb
+        patches = [
+            patch.dict(os.environ, {"SPREADSHEET_ID": "sheet-1", "GOOGLE_CREDENTIALS_JSON": "{}"}),
+            patch.object(sheets.ServiceAccountCredentials, "from_json_keyfile_dict"),
+            patch.object(sheets, "convert_credentials", return_value=self.creds),
+            patch.object(sheets, "AuthorizedSession"),
+            patch.object(sheets.gspread, "authorize", return_value=self.client),
+            patch.object(sheets, "_keep_token_fresh"),
+            patch.object(sheets, "_wb_instance", None),
+            patch.object(sheets, "_wb_creds", None),
+            patch.object(sheets, "_wb_failed_at", 0.0),
+            patch.object(sheets, "_wb_unavailable", False),
+            patch.object(sheets, "_snapshot_restored", False),
+            patch.dict(sheets._connection_stats, {"connects": 0, "connect_failures": 0}),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_connects_once(self):
+        def slow_open(spreadsheet_id):
+            time.sleep(0.05)
+            return self.wb
+        self.client.open_by_key.side_effect = slow_open
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(sheets.get_db_connection())) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertTrue(all(r is self.wb for r in results))
+        self.assertEqual(self.client.open_by_key.call_count, 1)
+        self.assertIs(sheets.get_db_connection(), self.wb)
+
+        stats = sheets.connection_stats()
+        self.assertEqual(stats["connects"], 1)
+        self.assertGreaterEqual(stats["last_connect_seconds"], 0.05)
+        self.assertTrue(stats["connected"])
+        self.assertAlmostEqual(stats["token_expires_in"], 3600, delta=5)
+
+    def test_pooled_session(self):
+        sheets.get_db_connection()
+        session = sheets.AuthorizedSession.return_value
+        adapter = session.mount.call_args[0][1]
+        self.assertEqual(adapter._pool_maxsize, sheets.SHEETS_HTTP_POOL_SIZE)
+        self.assertIs(sheets.gspread.authorize.call_args.kwargs["session"], session)
+
+    def test_failed_connect_is_not_retried_at_once(self):
+        self.client.open_by_key.side_effect = Exception("not found")
+        self.assertIsNone(sheets.get_db_connection())
+        self.assertIsNone(sheets.get_db_connection())
+        self.assertEqual(self.client.open_by_key.call_count, 1)
+        self.assertEqual(sheets.connection_stats()["connect_failures"], 1)
+
+        sheets._wb_failed_at -= sheets.CONNECT_RETRY_SECONDS
+        self.client.open_by_key.side_effect = None
+        self.assertIs(sheets.get_db_connection(), self.wb)
+
+    def test_unavailable_sheets_stays_a_503(self):
+        self.client.open_by_key.side_effect = sheets.SheetsUnavailableError("quota")
+        for _ in range(2):
+            with self.assertRaises(sheets.SheetsUnavailableError):
+                sheets.get_db_connection()
+        self.assertEqual(self.client.open_by_key.call_count, 1)
+
+
+class TokenRefreshTest(unittest.TestCase):
+
+    def test_refreshes_before_expiry(self):
+        creds = MagicMock(expiry=datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1))
+        # Stop the loop at its second wait
+        with patch.object(sheets.time, "sleep", side_effect=[None, StopIteration]) as sleep:
+            with self.assertRaises(StopIteration):
+                sheets._keep_token_fresh(creds)
+        self.assertEqual(creds.refresh.call_count, 1)
+        self.assertAlmostEqual(sleep.call_args_list[0][0][0], 3600 - sheets.TOKEN_REFRESH_MARGIN, delta=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
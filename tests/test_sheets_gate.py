@@ -0,0 +1,109 @@
+import sys
+import os
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add parent directory to path so we can import backend
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import requests
+from backend import sheets, sheets_gate
+from backend.sheets_gate import (
+    TokenBucket, GatedHTTPClient, SheetsUnavailableError,
+    PRIORITY_INTERACTIVE, PRIORITY_REFRESH, PRIORITY_NOTIFICATION,
+)
+
+
+def _response(status: int) -> requests.Response:
+    r = requests.Response()
+    r.status_code = status
+    r._content = json.dumps({"error": {"code": status, "message": "x", "status": "x"}}).encode()
+    return r
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_low_priority_keeps_reserve(self):
+        bucket = TokenBucket(8)
+        for _ in range(5):
+            self.assertTrue(bucket.acquire(PRIORITY_INTERACTIVE, timeout=0))
+        # 3 tokens left: notifications need half the bucket kept back, refreshes a quarter
+        self.assertFalse(bucket.acquire(PRIORITY_NOTIFICATION, timeout=0))
+        self.assertTrue(bucket.acquire(PRIORITY_REFRESH, timeout=0))
+        self.assertFalse(bucket.acquire(PRIORITY_REFRESH, timeout=0))
+        self.assertTrue(bucket.acquire(PRIORITY_INTERACTIVE, timeout=0))
+        self.assertTrue(bucket.acquire(PRIORITY_INTERACTIVE, timeout=0))
+        self.assertFalse(bucket.acquire(PRIORITY_INTERACTIVE, timeout=0))
+
+
+class TestGatedHTTPClient(unittest.TestCase):
+
+    def setUp(self):
+        p = patch.object(sheets_gate.time, "sleep")
+        p.start()
+        self.addCleanup(p.stop)
+
+    def test_retries_429_then_succeeds(self):
+        session = MagicMock()
+        session.request.side_effect = [_response(429), _response(503), _response(200)]
+        client = GatedHTTPClient(None, session=session)
+        self.assertEqual(client.request("get", "https://example").status_code, 200)
+        self.assertEqual(session.request.call_count, 3)
+
+    def test_gives_up_with_unavailable(self):
+        session = MagicMock()
+        session.request.return_value = _response(429)
+        client = GatedHTTPClient(None, session=session)
+        with self.assertRaises(SheetsUnavailableError):
+            client.request("post", "https://example")
+        self.assertEqual(session.request.call_count, sheets_gate.MAX_ATTEMPTS)
+
+    def test_client_errors_are_not_retried(self):
+        session = MagicMock()
+        session.request.return_value = _response(404)
+        client = GatedHTTPClient(None, session=session)
+        with self.assertRaises(Exception) as ctx:
+            client.request("get", "https://example")
+        self.assertNotIsInstance(ctx.exception, SheetsUnavailableError)
+        self.assertEqual(session.request.call_count, 1)
+
+    def test_non_idempotent_writes_retry_only_429(self):
+        base = "https://sheets.googleapis.com/v4/spreadsheets/x"
+        for endpoint, body in [(f"{base}/values/orders!A1:append", None),
+                               (f"{base}:batchUpdate", {"requests": [{"deleteDimension": {}}]}),
+                               (f"{base}:batchUpdate", {"requests": [{"updateCells": {}}, {"appendCells": {}}]})]:
+            session = MagicMock()
+            session.request.side_effect = [_response(429), _response(503), _response(200)]
+            client = GatedHTTPClient(None, session=session)
+            with self.assertRaises(SheetsUnavailableError):
+                client.request("post", endpoint, json=body)
+            self.assertEqual(session.request.call_count, 2)
+
+            session.request.side_effect = requests.Timeout("slow")
+            session.request.reset_mock()
+            with self.assertRaises(SheetsUnavailableError):
+                client.request("post", endpoint, json=body)
+            self.assertEqual(session.request.call_count, 1)
+
+    def test_idempotent_writes_are_retried(self):
+        base = "https://sheets.googleapis.com/v4/spreadsheets/x"
+        for method, endpoint, body in [("put", f"{base}/values/orders!A2", None),
+                                       ("post", f"{base}/values:batchUpdate", None),
+                                       ("post", f"{base}:batchUpdate", {"requests": [{"updateCells": {}}]})]:
+            session = MagicMock()
+            session.request.side_effect = [_response(503), requests.ConnectionError("reset"), _response(200)]
+            client = GatedHTTPClient(None, session=session)
+            self.assertEqual(client.request(method, endpoint, json=body).status_code, 200)
+
+    def test_unavailable_is_not_swallowed_as_empty(self):
+        sheets._dcache_bust()
+        wb = MagicMock()
+        wb.worksheet.side_effect = SheetsUnavailableError("quota")
+        with patch.object(sheets, "get_db_connection", return_value=wb):
+            with self.assertRaises(SheetsUnavailableError):
+                sheets.get_kindergartens()
+
+
+if __name__ == '__main__':
+    unittest.main()
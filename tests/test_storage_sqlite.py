@@ -0,0 +1,118 @@
+import sys
+import os
+import subprocess
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path so we can import backend
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend import storage
+from backend.sqlite_store import SQLiteBackend
+
+
+def _order(oid, kid, date, cls="ひよこ組", student=10):
+    return {
+        "order_id": oid, "kindergarten_id": kid, "date": date, "class_name": cls,
+        "meal_type": "通常", "student_count": student, "allergy_count": 1, "teacher_count": 2,
+    }
+
+
+class TestSQLiteBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.db = SQLiteBackend(":memory:")
+        with self.db._conn:
+            self.db._conn.execute(
+                "INSERT INTO kindergartens (kindergarten_id, name, login_id, password, sat, services) "
+                "VALUES ('K001', 'ひまわり幼稚園', 'hmw', 'pw', 1, '通常,カレー')")
+        storage.set_backend(self.db)
+        self.notify = patch("backend.notifications.send_admin_notification")
+        self.notify.start()
+
+    def tearDown(self):
+        self.notify.stop()
+        storage.set_backend(None)
+
+    def test_kindergartens(self):
+        k, = storage.get_kindergartens()
+        self.assertEqual(k.login_id, "hmw")
+        self.assertTrue(k.service_mon)
+        self.assertTrue(k.service_sat)
+        self.assertFalse(k.service_sun)
+        self.assertEqual(k.services, ["通常", "カレー"])
+        self.assertEqual(storage.get_kindergarten("K001").name, "ひまわり幼稚園")
+        self.assertEqual(storage.get_kindergarten_by_login("hmw").kindergarten_id, "K001")
+        self.assertIsNone(storage.get_kindergarten_by_login("nobody"))
+        self.assertTrue(storage.update_kindergarten_master({"kindergarten_id": "K001", "service_sat": False}))
+        self.assertFalse(storage.get_kindergartens()[0].service_sat)
+
+    def test_orders_upsert_and_month_queries(self):
+        storage.batch_save_orders([_order("o1", "K001", "2026-03-02"), _order("o2", "K001", "2026-04-01")])
+        storage.batch_save_orders([_order("o1", "K001", "2026-03-02", student=99)])
+        march = storage.get_orders_for_month("K001", 2026, 3)
+        self.assertEqual([(o.order_id, o.student_count) for o in march], [("o1", 99)])
+        self.assertEqual(len(storage.get_orders_by_kindergarten(2026, 4)["K001"]), 1)
+        self.assertEqual(storage.get_orders_for_date("2026-04-01")[0].order_id, "o2")
+        self.assertEqual(storage.read_order_columns(["student_count", "bogus"], 2026, 3),
+                         [{"order_id": "o1", "date": "2026-03-02", "student_count": 99}])
+        self.assertEqual([(t["month"], t["area"], t["total"]) for t in storage.get_order_totals(["month", "area"])],
+                         [("2026-03", "", 102), ("2026-04", "", 13)])
+        self.assertEqual(storage.get_order_totals(["kindergarten_id"], date="2026-04-01")[0]["student_count"], 10)
+        orders, totals = storage.get_orders_with_totals(["kindergarten_id"], 2026, 3)
+        self.assertEqual([o.order_id for o in orders], ["o1"])
+        self.assertEqual(totals[0]["student_count"], 99)
+        with self.assertRaises(ValueError):
+            storage.get_order_totals(["kindergarten_id"], date="2026-4-1")
+
+    def test_class_snapshots(self):
+        storage.update_kindergarten_classes("K001", [{"class_name": "A", "grade": "年長"}])
+        storage.update_kindergarten_classes("K001", [{"class_name": "B", "grade": "年長"}], scheduled_date="2999-04-01")
+        self.assertEqual([c.class_name for c in storage.get_classes_for_kindergarten("K001", "2999-03-31")], ["A"])
+        self.assertEqual([c.class_name for c in storage.get_classes_for_kindergarten("K001")], ["B"])
+        self.assertEqual(storage.get_pending_class_snapshots("K001")[0]["date"], "2999-04-01")
+        storage.delete_pending_class_snapshot("K001", "2999-04-01")
+        self.assertEqual(storage.get_pending_class_snapshots("K001"), [])
+
+    def test_settings(self):
+        self.assertEqual(storage.get_system_settings()["reminder_days"], "5,3")
+        storage.update_monthly_common_item("ふりかけ", "2026-03")
+        self.assertEqual(storage.get_monthly_common_items(), [{"year_month": "2026-03", "item": "ふりかけ"}])
+        storage.delete_monthly_common_item("2026-03")
+        self.assertEqual(storage.get_monthly_common_items(), [])
+
+    def test_settings_update_keeps_other_keys(self):
+        storage.update_monthly_common_item("ふりかけ", "2026-03")
+        storage.update_system_settings({"admin_emails": "x@example.com"})
+        settings = storage.get_system_settings()
+        self.assertEqual(settings["admin_emails"], "x@example.com")
+        self.assertEqual(settings["reminder_days"], "5,3")
+        self.assertEqual(len(storage.get_monthly_common_items()), 1)
+
+    def test_typed_settings(self):
+        self.assertEqual(storage.get_settings().reminder_days, [5, 3])
+        storage.update_system_settings({"admin_emails": "a@example.com, b@example.com,", "reminder_days": "7, x"})
+        settings = storage.get_settings()
+        self.assertEqual(settings.admin_emails, ["a@example.com", "b@example.com"])
+        self.assertEqual(settings.reminder_days, [5, 3])  # unparsable: default
+        self.assertEqual(settings.email_template_admin_subject, "")
+
+    def test_does_not_import_sheets(self):
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        code = "import sys, backend.sqlite_store; sys.exit('backend.sheets' in sys.modules)"
+        self.assertEqual(subprocess.run([sys.executable, "-c", code], cwd=root).returncode, 0)
+
+    def test_lifecycle_hooks_leave_sheets_alone(self):
+        from backend import sheets
+        with patch.object(sheets, "recover_order_queue") as recover, \
+                patch.object(sheets, "load_cache_snapshot") as restore, \
+                patch.object(sheets, "flush_order_queue") as flush:
+            storage.startup()
+            storage.shutdown()
+        recover.assert_not_called()
+        restore.assert_not_called()
+        flush.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()